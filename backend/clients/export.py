@@ -0,0 +1,126 @@
+"""
+Streaming export of a clinician's caseload.
+
+Every client, follow-up, lab result and medication becomes one flat row
+tagged with ``record_type``; a client's row is followed by its intake labs
+and medications, then each follow-up with its own. Clients are read with
+``iterator(chunk_size=...)`` (a server-side cursor on PostgreSQL) and their
+children are fetched one chunk of clients at a time, so memory stays flat
+however large the caseload is. Rows are written out as CSV or NDJSON in blocks.
+"""
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from .models import Client, FollowUp, LabResult, Medication
+
+COLUMNS = [
+    'record_type', 'client_id', 'client_name', 'follow_up_id', 'id', 'date',
+    'gender', 'date_of_birth', 'weight', 'height', 'physical_activity', 'ward_type',
+    'stress_factor', 'feeding_type', 'is_finished', 'notes',
+    'test_name', 'result', 'reference_range', 'interpretation',
+    'medication_name', 'dosage',
+]
+ASSESSMENT_FIELDS = ['weight', 'height', 'physical_activity', 'ward_type', 'stress_factor', 'feeding_type', 'is_finished']
+
+CHUNK_SIZE = 200
+# Rows joined into one chunk of the response body.
+BLOCK_ROWS = 500
+
+CLIENT_FIELDS = ['id', 'name', 'gender', 'date_of_birth', *ASSESSMENT_FIELDS]
+FOLLOW_UP_FIELDS = ['id', 'client_id', 'date', 'notes', *ASSESSMENT_FIELDS]
+LAB_FIELDS = ['id', 'client_id', 'follow_up_id', 'date', 'test_name', 'result', 'reference_range', 'interpretation']
+MEDICATION_FIELDS = ['id', 'client_id', 'follow_up_id', 'name', 'dosage', 'notes']
+
+
+def grouped(rows, *keys):
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[key] for key in keys), []).append(row)
+    return groups
+
+
+def export_rows(user, chunk_size=CHUNK_SIZE):
+    """Yield the caseload of ``user`` as flat row dicts."""
+    clients = (
+        Client.objects.filter(user=user).order_by('id')
+        .values(*CLIENT_FIELDS).iterator(chunk_size=chunk_size)
+    )
+    # Plain values rather than model instances: the export only copies
+    # columns, and building ~4 objects per row would dominate its cost.
+    while chunk := list(islice(clients, chunk_size)):
+        ids = [client['id'] for client in chunk]
+        follow_ups = grouped(
+            FollowUp.objects.filter(client_id__in=ids).order_by('date', 'id').values(*FOLLOW_UP_FIELDS),
+            'client_id',
+        )
+        labs = grouped(
+            LabResult.objects.filter(client_id__in=ids).order_by('date', 'id').values(*LAB_FIELDS),
+            'client_id', 'follow_up_id',
+        )
+        meds = grouped(
+            Medication.objects.filter(client_id__in=ids).order_by('id').values(*MEDICATION_FIELDS),
+            'client_id', 'follow_up_id',
+        )
+
+        for client in chunk:
+            client_id, name = client.pop('id'), client.pop('name')
+            common = {'client_id': client_id, 'client_name': name}
+            yield {'record_type': 'client', **common, 'id': client_id, **client}
+            for follow_up in [None, *follow_ups.get((client_id,), [])]:
+                follow_up_id = None
+                if follow_up is not None:
+                    follow_up_id = follow_up.pop('id')
+                    del follow_up['client_id']
+                    yield {'record_type': 'follow_up', **common, 'follow_up_id': follow_up_id, 'id': follow_up_id, **follow_up}
+                for lab in labs.get((client_id, follow_up_id), []):
+                    del lab['client_id']
+                    yield {'record_type': 'lab_result', **common, **lab}
+                for med in meds.get((client_id, follow_up_id), []):
+                    del med['client_id']
+                    med['medication_name'] = med.pop('name')
+                    yield {'record_type': 'medication', **common, **med}
+
+
+class Echo:
+    """File-like object whose ``write`` hands the line back to ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(Echo(), fieldnames=COLUMNS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, default=str, ensure_ascii=False) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
+
+
+def blocks(lines, size=BLOCK_ROWS):
+    """Join lines into blocks so the response is not written a row at a time."""
+    while block := ''.join(islice(lines, size)):
+        yield block
+
+
+async def async_blocks(lines, size=BLOCK_ROWS):
+    """
+    ``blocks`` for ASGI servers, which would otherwise read a synchronous
+    iterator to the end before sending anything. Each block is produced in
+    the thread that runs the ORM, so the cursor stays on one connection.
+    """
+    next_block = sync_to_async(lambda: ''.join(islice(lines, size)), thread_sensitive=True)
+    while block := await next_block():
+        yield block
@@ -0,0 +1,162 @@
+"""
+Bulk import of existing patients from CSV.
+
+One row per client, with the client's fields on its first row; the rows
+right after it with the same (or a blank) ``name`` only add more lab
+results or medications:
+
+    name,gender,weight,ward_type,...,lab_test_name,lab_result,lab_date,medication_name,...
+    Jane Doe,female,62,icu,...,Albumin,3.1,2025-01-04,furosemide,...
+    ,,,,...,HbA1c,7.2,2025-01-04,,...
+
+Files are read row by row and every client is validated with the field
+rules of ``ClientSerializer``. Names are unique across the whole table, so
+they are checked against one in-memory set rather than one query per row.
+Valid clients are written in batches, each batch in its own transaction
+(clients, then their labs, then their medications, one ``bulk_create``
+each). Invalid rows are reported and skipped.
+"""
+import csv
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .models import Client, LabResult, Medication
+from .serializers import ClientImportSerializer
+
+CLIENT_COLUMNS = (
+    'name', 'gender', 'date_of_birth', 'weight', 'height', 'physical_activity',
+    'ward_type', 'stress_factor', 'feeding_type', 'is_finished',
+)
+# CSV column -> nested field, per child list.
+CHILD_COLUMNS = {
+    'lab_results': {
+        'lab_test_name': 'test_name',
+        'lab_result': 'result',
+        'lab_reference_range': 'reference_range',
+        'lab_interpretation': 'interpretation',
+        'lab_date': 'date',
+    },
+    'medications': {
+        'medication_name': 'name',
+        'medication_dosage': 'dosage',
+        'medication_notes': 'notes',
+    },
+}
+
+BATCH_SIZE = 500
+SKIP, UPDATE = 'skip', 'update'
+
+
+def read_records(lines, delimiter=','):
+    """Yield ``(row number, client data)`` with the labs and medications nested."""
+    reader = csv.DictReader(lines, delimiter=delimiter)
+    if reader.fieldnames is None or 'name' not in [name.strip() for name in reader.fieldnames]:
+        raise ValueError('Missing column: name')
+    reader.fieldnames = [name.strip() for name in reader.fieldnames]
+
+    record, start = None, None
+    for row in reader:
+        # Blank cells mean "not given", so optional fields are left out.
+        row = {key: value.strip() for key, value in row.items() if key and value and value.strip()}
+        name = row.get('name')
+        if record is None or (name and name != record['name']):
+            if record is not None:
+                yield start, record
+            start = reader.line_num
+            record = {key: row[key] for key in CLIENT_COLUMNS if key in row}
+            record.setdefault('name', '')
+            record['lab_results'], record['medications'] = [], []
+        for field, columns in CHILD_COLUMNS.items():
+            child = {target: row[column] for column, target in columns.items() if column in row}
+            if child:
+                record[field].append(child)
+    if record is not None:
+        yield start, record
+
+
+def import_clients(records, user, on_duplicate=SKIP, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Create the clients in ``records`` (from ``read_records``) for ``user``.
+
+    A name already on ``user``'s caseload is skipped, or with
+    ``on_duplicate="update"`` has its client fields overwritten (labs and
+    medications are left alone). A name used by another clinician, or
+    repeated in the file, is an error. Returns the counts and a list of
+    ``{"row", "name", "errors"}``.
+    """
+    report = {'created': 0, 'updated': 0, 'skipped': 0, 'errors': []}
+    owners = dict(Client.objects.values_list('name', 'user_id'))
+    own = {}
+    seen = {}
+    validator = ClientImportSerializer()
+    to_create, to_update, update_fields = [], [], set()
+
+    def flush():
+        if not (to_create or to_update):
+            return
+        try:
+            with transaction.atomic():
+                Client.objects.bulk_create([client for _, client, _, _ in to_create])
+                labs, meds = [], []
+                for _, client, lab_results, medications in to_create:
+                    labs += [LabResult(client=client, **lab) for lab in lab_results]
+                    meds += [Medication(client=client, **med) for med in medications]
+                LabResult.objects.bulk_create(labs)
+                Medication.objects.bulk_create(meds)
+                if to_update and update_fields:
+                    Client.objects.bulk_update([client for _, client in to_update], update_fields)
+                if dry_run:
+                    transaction.set_rollback(True)
+        except IntegrityError as exc:
+            # e.g. a name taken by someone else since the import started
+            for row, client, *_ in to_create + to_update:
+                report['errors'].append({'row': row, 'name': client.name, 'errors': {'non_field_errors': [str(exc)]}})
+        else:
+            report['created'] += len(to_create)
+            report['updated'] += len(to_update)
+        to_create.clear()
+        to_update.clear()
+        update_fields.clear()
+
+    for row, data in records:
+        name = data.get('name', '')
+        try:
+            validated = validator.run_validation(data)
+        except serializers.ValidationError as exc:
+            report['errors'].append({'row': row, 'name': name, 'errors': exc.detail})
+            continue
+
+        name = validated['name']
+        if name in seen:
+            report['errors'].append({'row': row, 'name': name, 'errors': {'name': [f'Repeats the client on row {seen[name]}.']}})
+            continue
+        seen[name] = row
+
+        lab_results = validated.pop('lab_results', [])
+        medications = validated.pop('medications', [])
+        owner = owners.get(name)
+        if owner is None:
+            to_create.append((row, Client(user=user, **validated), lab_results, medications))
+        elif owner != user.pk:
+            report['errors'].append({'row': row, 'name': name, 'errors': {'name': ['A client with this name already exists.']}})
+        elif on_duplicate == UPDATE:
+            if not own:
+                own.update(Client.objects.filter(user=user).in_bulk(field_name='name'))
+            client = own[name]
+            for field, value in validated.items():
+                setattr(client, field, value)
+            update_fields.update(validated)
+            update_fields.discard('name')
+            to_update.append((row, client))
+        else:
+            report['skipped'] += 1
+
+        if len(to_create) + len(to_update) >= batch_size:
+            flush()
+    flush()
+    return report
+
+
+def import_file(lines, user, delimiter=',', **options):
+    return import_clients(read_records(lines, delimiter), user, **options)
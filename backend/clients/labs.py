@@ -0,0 +1,143 @@
+"""
+Lab results as a time series.
+
+``test_name`` and ``result`` are free text ("S. Albumin", "3.1 g/dL",
+"<0.5"). Every lab is also stored with the code of its analyte from
+``ANALYTES`` and the number read from its result (see
+``LabResult.normalize``), so a trend is an index range scan on
+``(client, analyte, date)`` and is aggregated in the database.
+"""
+import re
+from datetime import timedelta
+
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import Trunc
+
+# code -> (name, usual unit, other names used for the test)
+ANALYTES = {
+    "albumin": ("Albumin", "g/dL", ["alb", "serum albumin", "s albumin"]),
+    "prealbumin": ("Prealbumin", "mg/dL", ["pre albumin", "transthyretin", "ttr"]),
+    "total_protein": ("Total protein", "g/dL", ["protein", "tp", "serum protein"]),
+    "hemoglobin": ("Hemoglobin", "g/dL", ["hb", "hgb", "haemoglobin"]),
+    "hematocrit": ("Hematocrit", "%", ["hct", "haematocrit", "pcv"]),
+    "wbc": ("White blood cells", "10^3/uL", ["white blood cells", "white cell count", "tlc", "leukocytes"]),
+    "lymphocytes": ("Lymphocytes", "10^3/uL", ["lymph", "total lymphocyte count", "lymphocyte count"]),
+    "platelets": ("Platelets", "10^3/uL", ["plt", "platelet count"]),
+    "hba1c": ("HbA1c", "%", ["a1c", "hemoglobin a1c", "glycated hemoglobin", "glycosylated hemoglobin"]),
+    "glucose": ("Glucose", "mg/dL", [
+        "blood glucose", "blood sugar", "fbs", "fasting blood sugar", "fasting glucose",
+        "rbs", "random blood sugar", "random glucose", "fbg", "rbg",
+    ]),
+    "sodium": ("Sodium", "mmol/L", ["na", "serum sodium", "s sodium"]),
+    "potassium": ("Potassium", "mmol/L", ["k", "serum potassium", "s potassium"]),
+    "chloride": ("Chloride", "mmol/L", ["cl"]),
+    "bicarbonate": ("Bicarbonate", "mmol/L", ["hco3", "bicarb", "co2", "total co2"]),
+    "calcium": ("Calcium", "mg/dL", ["ca", "serum calcium", "total calcium"]),
+    "magnesium": ("Magnesium", "mg/dL", ["mg", "serum magnesium"]),
+    "phosphorus": ("Phosphorus", "mg/dL", ["phosphate", "phos", "po4", "serum phosphorus"]),
+    "urea": ("Urea", "mg/dL", ["bun", "blood urea nitrogen", "blood urea"]),
+    "creatinine": ("Creatinine", "mg/dL", ["cr", "creat", "scr", "serum creatinine"]),
+    "egfr": ("eGFR", "mL/min/1.73m2", ["gfr"]),
+    "uric_acid": ("Uric acid", "mg/dL", ["urate", "serum uric acid"]),
+    "alt": ("ALT", "U/L", ["sgpt", "alanine aminotransferase"]),
+    "ast": ("AST", "U/L", ["sgot", "aspartate aminotransferase"]),
+    "alp": ("Alkaline phosphatase", "U/L", ["alkaline phosphatase"]),
+    "bilirubin": ("Total bilirubin", "mg/dL", ["total bilirubin", "tbil", "t bil", "serum bilirubin"]),
+    "crp": ("C-reactive protein", "mg/L", ["c reactive protein", "hs crp"]),
+    "cholesterol": ("Total cholesterol", "mg/dL", ["total cholesterol", "tc", "serum cholesterol"]),
+    "ldl": ("LDL cholesterol", "mg/dL", ["ldl c", "ldl cholesterol"]),
+    "hdl": ("HDL cholesterol", "mg/dL", ["hdl c", "hdl cholesterol"]),
+    "triglycerides": ("Triglycerides", "mg/dL", ["tg", "trigs", "triglyceride"]),
+    "ferritin": ("Ferritin", "ng/mL", ["serum ferritin"]),
+    "iron": ("Iron", "ug/dL", ["serum iron", "fe"]),
+    "tibc": ("TIBC", "ug/dL", ["total iron binding capacity"]),
+    "transferrin": ("Transferrin", "mg/dL", []),
+    "vitamin_b12": ("Vitamin B12", "pg/mL", ["b12", "vit b12", "cobalamin"]),
+    "folate": ("Folate", "ng/mL", ["folic acid", "serum folate"]),
+    "vitamin_d": ("Vitamin D", "ng/mL", ["25 oh vitamin d", "25 oh d", "vit d", "25 hydroxy vitamin d"]),
+    "zinc": ("Zinc", "ug/dL", ["zn", "serum zinc"]),
+    "tsh": ("TSH", "mIU/L", ["thyroid stimulating hormone"]),
+    "inr": ("INR", "", ["pt inr"]),
+    "lactate": ("Lactate", "mmol/L", ["lactic acid"]),
+}
+
+NAME_RE = re.compile(r"[^a-z0-9]+")
+ALIASES = {
+    NAME_RE.sub(" ", name.lower()).strip(): code
+    for code, (name, _, others) in ANALYTES.items()
+    for name in [code.replace("_", " "), name, *others]
+}
+# "3.1", "< 0.5", "1,250", "7.2 %", "135 mmol/L": the leading number.
+VALUE_RE = re.compile(r"^\s*(?:[<>]=?|[≤≥])?\s*(-?\d{1,3}(?:,\d{3})+(?:\.\d+)?|-?\d*\.?\d+)")
+
+# Coarser buckets are used until the series fits in the requested points.
+RESOLUTIONS = ["day", "week", "month", "quarter", "year"]
+# Months per bucket for the resolutions Trunc aligns to the calendar.
+MONTHS = {"month": 1, "quarter": 3, "year": 12}
+MAX_POINTS = 1000
+
+
+def analyte_for(test_name):
+    """The ``ANALYTES`` code of a free-text test name, or ``""``."""
+    return ALIASES.get(NAME_RE.sub(" ", (test_name or "").lower()).strip(), "")
+
+
+def parse_value(result):
+    """The number a result starts with, or ``None`` ("positive", "see report")."""
+    match = VALUE_RE.match(result or "")
+    if match is None:
+        return None
+    return float(match[1].replace(",", ""))
+
+
+def bucket_count(first, last, resolution):
+    """How many ``Trunc(resolution)`` buckets ``first``..``last`` touches."""
+    if resolution == "day":
+        return (last - first).days + 1
+    if resolution == "week":
+        # Weeks start on Monday, as in Trunc("week").
+        first, last = (day - timedelta(days=day.weekday()) for day in (first, last))
+        return (last - first).days // 7 + 1
+    first, last = ((day.year * 12 + day.month - 1) // MONTHS[resolution] for day in (first, last))
+    return last - first + 1
+
+
+def resolution_for(first, last, points):
+    """The finest bucket that keeps ``first``..``last`` within ``points`` buckets."""
+    for name in RESOLUTIONS:
+        if bucket_count(first, last, name) <= points:
+            return name
+    return RESOLUTIONS[-1]
+
+
+def trends(labs, points=120, since=None, until=None):
+    """
+    Downsampled series per analyte of the ``labs`` queryset: the mean,
+    min, max and count of the numeric results in each bucket, oldest first.
+    Two queries, both range scans of the ``(client, analyte, date)`` index.
+    """
+    labs = labs.exclude(analyte="").filter(value__isnull=False)
+    if since:
+        labs = labs.filter(date__gte=since)
+    if until:
+        labs = labs.filter(date__lte=until)
+    span = labs.aggregate(first=Min("date"), last=Max("date"))
+    if span["first"] is None:
+        return {"resolution": None, "series": []}
+
+    resolution = resolution_for(span["first"], span["last"], points)
+    rows = (
+        labs.values("analyte", bucket=Trunc("date", resolution))
+        .annotate(mean=Avg("value"), min=Min("value"), max=Max("value"), count=Count("id"))
+        .order_by("analyte", "bucket")
+    )
+    series = {}
+    for row in rows:
+        code = row.pop("analyte")
+        if code not in series:
+            name, unit, _ = ANALYTES.get(code, (code, "", []))
+            series[code] = {"analyte": code, "name": name, "unit": unit, "points": []}
+        row["date"] = row.pop("bucket")
+        row["mean"] = round(row["mean"], 3)
+        series[code]["points"].append(row)
+    return {"resolution": resolution, "series": list(series.values())}
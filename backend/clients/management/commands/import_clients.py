@@ -0,0 +1,49 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from clients import importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Import existing patients (with labs and medications) from a CSV file "
+        "onto a clinician's caseload. See clients.importer for the layout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--user", required=True, help="Email of the clinician who owns the clients.")
+        parser.add_argument("--on-duplicate", choices=[importer.SKIP, importer.UPDATE], default=importer.SKIP)
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--encoding", default="utf-8-sig")
+        parser.add_argument("--batch-size", type=int, default=importer.BATCH_SIZE)
+        parser.add_argument("--errors", help="Write the per-row error report to this JSON file.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and write, then roll back.")
+
+    def handle(self, *args, path, user, on_duplicate, delimiter, encoding, batch_size, errors, dry_run, **options):
+        try:
+            owner = get_user_model().objects.get(email=user)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {user}")
+        try:
+            with open(path, newline="", encoding=encoding) as handle:
+                report = importer.import_file(
+                    handle, owner, delimiter=delimiter.replace("\\t", "\t"),
+                    on_duplicate=on_duplicate, batch_size=batch_size, dry_run=dry_run,
+                )
+        except (OSError, UnicodeDecodeError, ValueError) as exc:
+            raise CommandError(f"{path}: {exc}")
+
+        for error in report["errors"][:20]:
+            self.stderr.write(f"row {error['row']} ({error['name']}): {json.dumps(error['errors'])}")
+        if len(report["errors"]) > 20:
+            self.stderr.write(f"... {len(report['errors']) - 20} more")
+        if errors:
+            with open(errors, "w", encoding="utf-8") as out:
+                json.dump(report["errors"], out, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} created, {report['updated']} updated, {report['skipped']} skipped, "
+            f"{len(report['errors'])} rejected{' (dry run)' if dry_run else ''}"
+        ))
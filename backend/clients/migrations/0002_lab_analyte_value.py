@@ -0,0 +1,116 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:01
+
+import re
+
+from django.db import migrations, models
+
+# A frozen copy of the analyte table and parser in clients.labs, so this
+# migration keeps giving the same results when the live table changes.
+
+# code -> (name, usual unit, other names used for the test)
+ANALYTES = {
+    "albumin": ("Albumin", "g/dL", ["alb", "serum albumin", "s albumin"]),
+    "prealbumin": ("Prealbumin", "mg/dL", ["pre albumin", "transthyretin", "ttr"]),
+    "total_protein": ("Total protein", "g/dL", ["protein", "tp", "serum protein"]),
+    "hemoglobin": ("Hemoglobin", "g/dL", ["hb", "hgb", "haemoglobin"]),
+    "hematocrit": ("Hematocrit", "%", ["hct", "haematocrit", "pcv"]),
+    "wbc": ("White blood cells", "10^3/uL", ["white blood cells", "white cell count", "tlc", "leukocytes"]),
+    "lymphocytes": ("Lymphocytes", "10^3/uL", ["lymph", "total lymphocyte count", "lymphocyte count"]),
+    "platelets": ("Platelets", "10^3/uL", ["plt", "platelet count"]),
+    "hba1c": ("HbA1c", "%", ["a1c", "hemoglobin a1c", "glycated hemoglobin", "glycosylated hemoglobin"]),
+    "glucose": ("Glucose", "mg/dL", [
+        "blood glucose", "blood sugar", "fbs", "fasting blood sugar", "fasting glucose",
+        "rbs", "random blood sugar", "random glucose", "fbg", "rbg",
+    ]),
+    "sodium": ("Sodium", "mmol/L", ["na", "serum sodium", "s sodium"]),
+    "potassium": ("Potassium", "mmol/L", ["k", "serum potassium", "s potassium"]),
+    "chloride": ("Chloride", "mmol/L", ["cl"]),
+    "bicarbonate": ("Bicarbonate", "mmol/L", ["hco3", "bicarb", "co2", "total co2"]),
+    "calcium": ("Calcium", "mg/dL", ["ca", "serum calcium", "total calcium"]),
+    "magnesium": ("Magnesium", "mg/dL", ["mg", "serum magnesium"]),
+    "phosphorus": ("Phosphorus", "mg/dL", ["phosphate", "phos", "po4", "serum phosphorus"]),
+    "urea": ("Urea", "mg/dL", ["bun", "blood urea nitrogen", "blood urea"]),
+    "creatinine": ("Creatinine", "mg/dL", ["cr", "creat", "scr", "serum creatinine"]),
+    "egfr": ("eGFR", "mL/min/1.73m2", ["gfr"]),
+    "uric_acid": ("Uric acid", "mg/dL", ["urate", "serum uric acid"]),
+    "alt": ("ALT", "U/L", ["sgpt", "alanine aminotransferase"]),
+    "ast": ("AST", "U/L", ["sgot", "aspartate aminotransferase"]),
+    "alp": ("Alkaline phosphatase", "U/L", ["alkaline phosphatase"]),
+    "bilirubin": ("Total bilirubin", "mg/dL", ["total bilirubin", "tbil", "t bil", "serum bilirubin"]),
+    "crp": ("C-reactive protein", "mg/L", ["c reactive protein", "hs crp"]),
+    "cholesterol": ("Total cholesterol", "mg/dL", ["total cholesterol", "tc", "serum cholesterol"]),
+    "ldl": ("LDL cholesterol", "mg/dL", ["ldl c", "ldl cholesterol"]),
+    "hdl": ("HDL cholesterol", "mg/dL", ["hdl c", "hdl cholesterol"]),
+    "triglycerides": ("Triglycerides", "mg/dL", ["tg", "trigs", "triglyceride"]),
+    "ferritin": ("Ferritin", "ng/mL", ["serum ferritin"]),
+    "iron": ("Iron", "ug/dL", ["serum iron", "fe"]),
+    "tibc": ("TIBC", "ug/dL", ["total iron binding capacity"]),
+    "transferrin": ("Transferrin", "mg/dL", []),
+    "vitamin_b12": ("Vitamin B12", "pg/mL", ["b12", "vit b12", "cobalamin"]),
+    "folate": ("Folate", "ng/mL", ["folic acid", "serum folate"]),
+    "vitamin_d": ("Vitamin D", "ng/mL", ["25 oh vitamin d", "25 oh d", "vit d", "25 hydroxy vitamin d"]),
+    "zinc": ("Zinc", "ug/dL", ["zn", "serum zinc"]),
+    "tsh": ("TSH", "mIU/L", ["thyroid stimulating hormone"]),
+    "inr": ("INR", "", ["pt inr"]),
+    "lactate": ("Lactate", "mmol/L", ["lactic acid"]),
+}
+
+NAME_RE = re.compile(r"[^a-z0-9]+")
+ALIASES = {
+    NAME_RE.sub(" ", name.lower()).strip(): code
+    for code, (name, _, others) in ANALYTES.items()
+    for name in [code.replace("_", " "), name, *others]
+}
+# "3.1", "< 0.5", "1,250", "7.2 %", "135 mmol/L": the leading number.
+VALUE_RE = re.compile(r"^\s*(?:[<>]=?|[≤≥])?\s*(-?\d{1,3}(?:,\d{3})+(?:\.\d+)?|-?\d*\.?\d+)")
+
+
+def analyte_for(test_name):
+    """The ``ANALYTES`` code of a free-text test name, or ``""``."""
+    return ALIASES.get(NAME_RE.sub(" ", (test_name or "").lower()).strip(), "")
+
+
+def parse_value(result):
+    """The number a result starts with, or ``None`` ("positive", "see report")."""
+    match = VALUE_RE.match(result or "")
+    if match is None:
+        return None
+    return float(match[1].replace(",", ""))
+
+
+def normalize_labs(apps, schema_editor):
+    LabResult = apps.get_model('clients', 'LabResult')
+    # Results repeat a lot, so one UPDATE per distinct (analyte, value) is far
+    # cheaper than a bulk_update of every row.
+    groups = {}
+    for pk, test_name, result in LabResult.objects.values_list('id', 'test_name', 'result').iterator(chunk_size=2000):
+        groups.setdefault((analyte_for(test_name), parse_value(result)), []).append(pk)
+    for (analyte, value), ids in groups.items():
+        if analyte or value is not None:
+            for start in range(0, len(ids), 900):
+                LabResult.objects.filter(id__in=ids[start:start + 900]).update(analyte=analyte, value=value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labresult',
+            name='analyte',
+            field=models.CharField(blank=True, default='', editable=False, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='labresult',
+            name='value',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='labresult',
+            index=models.Index(fields=['client', 'analyte', 'date'], name='lab_client_analyte_date_idx'),
+        ),
+        migrations.RunPython(normalize_labs, migrations.RunPython.noop),
+    ]
@@ -96,6 +96,25 @@ class Client(models.Model):
     def __str__(self):
         return self.name
 
+class LabResultQuerySet(models.QuerySet):
+    """Keeps ``analyte`` and ``value`` in step on bulk writes, which skip ``save()``."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.normalize()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = set(fields)
+        if fields & {'test_name', 'result'}:
+            objs = list(objs)
+            for obj in objs:
+                obj.normalize()
+            fields |= {'analyte', 'value'}
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
 class LabResult(models.Model):
     
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="lab_results")
@@ -106,6 +125,28 @@ class LabResult(models.Model):
     interpretation = models.TextField(blank=True, null=True)
     file = models.FileField(upload_to='lab_reports/', blank=True, null=True)
     date = models.DateField()
+    # Derived from test_name / result (see clients.labs).
+    analyte = models.CharField(max_length=30, blank=True, default='', editable=False)
+    value = models.FloatField(blank=True, null=True, editable=False)
+
+    objects = LabResultQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['client', 'analyte', 'date'], name='lab_client_analyte_date_idx')]
+
+    def normalize(self):
+        from .labs import analyte_for, parse_value
+
+        self.analyte = analyte_for(self.test_name)
+        self.value = parse_value(self.result)
+
+    def save(self, *args, **kwargs):
+        self.normalize()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'test_name', 'result'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'analyte', 'value'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.test_name} - {self.client.name}"
 
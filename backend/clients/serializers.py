@@ -1,5 +1,9 @@
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 from .models import Client, LabResult, Medication,Appointment,FollowUp
+from . import labs
 
 
 # class MealPlanSerializer(serializers.ModelSerializer):
@@ -9,12 +13,86 @@ from .models import Client, LabResult, Medication,Appointment,FollowUp
 
 
 
+def sync_children(field_name, model, existing, items, removable=lambda obj: True, **parent):
+    """
+    Make the rows in ``existing`` match the nested ``items`` of an update:
+    items with an ``id`` update that row (only if something changed), items
+    without one are created with ``parent``, and ``removable`` rows whose id
+    was not sent are deleted. At most one delete, one bulk update and one
+    bulk insert.
+    """
+    existing = {obj.pk: obj for obj in existing}
+    to_create, to_update, changed_fields = [], [], set()
+    for item in items:
+        item = dict(item)
+        item.pop('client', None)
+        item.pop('follow_up', None)
+        pk = item.pop('id', None)
+        if pk is None:
+            to_create.append(model(**parent, **item))
+            continue
+        obj = existing.pop(pk, None)
+        if obj is None:
+            raise serializers.ValidationError({field_name: [f'Unknown or repeated id {pk}.']})
+        changed = {name: value for name, value in item.items() if getattr(obj, name) != value}
+        for name, value in changed.items():
+            setattr(obj, name, value)
+            field = model._meta.get_field(name)
+            if isinstance(field, models.FileField):
+                # bulk_update skips pre_save, which is what stores an upload.
+                field.pre_save(obj, False)
+        if changed:
+            to_update.append(obj)
+            changed_fields.update(changed)
+
+    to_delete = [pk for pk, obj in existing.items() if removable(obj)]
+    if to_delete:
+        model.objects.filter(id__in=to_delete).delete()
+    if to_update:
+        model.objects.bulk_update(to_update, changed_fields)
+    if to_create:
+        model.objects.bulk_create(to_create)
+
+
+def create_children(instance, name, model, items, **parent):
+    """
+    Insert the nested ``items`` of a create with one ``bulk_create`` and
+    cache them on ``instance.<name>``, so serializing the new record does
+    not query them back.
+    """
+    objs = []
+    for item in items:
+        item = dict(item)
+        item.pop('client', None)
+        item.pop('follow_up', None)
+        item.pop('id', None)
+        objs.append(model(**parent, **item))
+    model.objects.bulk_create(objs)
+    cache_children(instance, name, objs)
+
+
+def cache_children(instance, name, objs):
+    """Store ``objs`` as the prefetched result of the ``instance.<name>`` relation."""
+    manager = getattr(instance, name)
+    queryset = manager.get_queryset()
+    queryset._result_cache = list(objs)
+    queryset._prefetch_done = True
+    if not hasattr(instance, '_prefetched_objects_cache'):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[manager.field.remote_field.cache_name] = queryset
+
+
 class BiochemicalSerializer(serializers.ModelSerializer):
+    # Writable so nested updates can tell existing rows from new ones.
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = LabResult
-        fields = ['id','test_name', 'result', 'reference_range', 'interpretation', 'file', 'date']
+        fields = ['id','test_name', 'result', 'reference_range', 'interpretation', 'file', 'date', 'analyte', 'value']
 
 class MedicationSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = Medication
         exclude = ('client', 'follow_up')
@@ -27,55 +105,37 @@ class FollowUpSerializer(serializers.ModelSerializer):
         model = FollowUp
         exclude = ('client',)    
    
+    @transaction.atomic
     def create(self, validated_data):
-        print('-'*50)
-        print(validated_data)
-        print('-'*50)
         lab_results_data = validated_data.pop('lab_results', [])
         meds_data = validated_data.pop('medications', [])
-        print('-'*50)
-        print('lab:', lab_results_data)
-        print('med:', meds_data)
-        print('-'*50)
-        
+
         client = self.context['client']  
         follow_up = FollowUp.objects.create(client=client, **validated_data)
 
-        for lab in lab_results_data:
-            # إزالة follow_up و client إذا كانا موجودين
-            lab.pop('follow_up', None)
-            lab.pop('client', None)
-            LabResult.objects.create(client=client, follow_up=follow_up, **lab)
-
-        for med in meds_data:
-            # إزالة follow_up و client إذا كانا موجودين
-            med.pop('follow_up', None)
-            med.pop('client', None)
-            Medication.objects.create(client=client, follow_up=follow_up, **med)
+        # كل نوع بـ bulk_create واحد
+        create_children(follow_up, 'lab_results', LabResult, lab_results_data, client=client, follow_up=follow_up)
+        create_children(follow_up, 'medications', Medication, meds_data, client=client, follow_up=follow_up)
 
         return follow_up
+    @transaction.atomic
     def update(self, instance, validated_data):
-        lab_results_data = validated_data.pop('lab_results', [])
-        meds_data = validated_data.pop('medications', [])
+        lab_results_data = validated_data.pop('lab_results', None)
+        meds_data = validated_data.pop('medications', None)
 
         # تحديث بيانات المتابعة الأساسية
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
 
-        # حذف التحاليل السابقة وإعادة إنشائها
-        instance.lab_results.all().delete()
-        for lab_data in lab_results_data:
-            lab_data.pop('follow_up', None)
-            lab_data.pop('client', None)
-            LabResult.objects.create(client=instance.client, follow_up=instance, **lab_data)
-
-        # حذف الأدوية السابقة وإعادة إنشائها
-        instance.medications.all().delete()
-        for med_data in meds_data:
-            med_data.pop('follow_up', None)
-            med_data.pop('client', None)
-            Medication.objects.create(client=instance.client, follow_up=instance, **med_data)
+        # التحاليل والأدوية: تعديل الموجود بالـ id، إضافة الجديد، حذف ما لم يُرسل
+        # (لو الحقل مش موجود في الطلب نسيبه زي ما هو)
+        if lab_results_data is not None:
+            sync_children('lab_results', LabResult, instance.lab_results.all(), lab_results_data,
+                          client=instance.client, follow_up=instance)
+        if meds_data is not None:
+            sync_children('medications', Medication, instance.medications.all(), meds_data,
+                          client=instance.client, follow_up=instance)
 
         return instance
 
@@ -92,6 +152,21 @@ class ClientSerializer(serializers.ModelSerializer):
             'stress_factor','feeding_type','lab_results','medications','follow_ups','is_finished'
         ]
 
+    @staticmethod
+    def prefetch(queryset):
+        """Load the nested labs, medications and follow-ups (with their own
+        labs and medications) in six queries however many clients there are."""
+        follow_ups = FollowUp.objects.order_by('id').prefetch_related(
+            Prefetch('lab_results', queryset=LabResult.objects.order_by('id')),
+            Prefetch('medications', queryset=Medication.objects.order_by('id')),
+        )
+        return queryset.prefetch_related(
+            Prefetch('lab_results', queryset=LabResult.objects.order_by('id')),
+            Prefetch('medications', queryset=Medication.objects.order_by('id')),
+            Prefetch('follow_ups', queryset=follow_ups),
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         
         lab_results_data = validated_data.pop('lab_results', [])
@@ -100,38 +175,96 @@ class ClientSerializer(serializers.ModelSerializer):
         user   = self.context['request'].user
         client = Client.objects.create(user=user, **validated_data)
 
-        # أضف التحاليل
-        for lab in lab_results_data:
-            LabResult.objects.create(client=client, **lab)
-
-        # أضف الأدوية
-        for med in meds_data:
-            Medication.objects.create(client=client, **med)
+        # أضف التحاليل والأدوية (كل نوع في query واحدة)
+        create_children(client, 'lab_results', LabResult, lab_results_data, client=client)
+        create_children(client, 'medications', Medication, meds_data, client=client)
+        # عميل جديد: مفيش متابعات
+        cache_children(client, 'follow_ups', [])
 
         return client
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        lab_results_data = validated_data.pop('lab_results', [])
-        meds_data = validated_data.pop('medications', [])
+        lab_results_data = validated_data.pop('lab_results', None)
+        meds_data = validated_data.pop('medications', None)
 
         # تحديث بيانات العميل الأساسية
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
 
-        # استراتيجية بسيطة وفعالة: احذف كل التحاليل القديمة وأنشئ الجديدة
-        instance.lab_results.all().delete()
-        for lab_data in lab_results_data:
-            LabResult.objects.create(client=instance, **lab_data)
+        # lab_results/medications here include the follow-ups' rows: those can
+        # be edited by id, but only rows outside any follow-up are deleted
+        # when left out (follow-up rows belong to the follow-up endpoint).
+        def outside_follow_ups(obj):
+            return obj.follow_up_id is None
 
-        # نفس الشيء للأدوية
-        instance.medications.all().delete() 
-        for med_data in meds_data:
-            Medication.objects.create(client=instance, **med_data)
+        if lab_results_data is not None:
+            sync_children('lab_results', LabResult, instance.lab_results.all(), lab_results_data,
+                          removable=outside_follow_ups, client=instance)
+        if meds_data is not None:
+            sync_children('medications', Medication, instance.medications.all(), meds_data,
+                          removable=outside_follow_ups, client=instance)
 
         return instance
 
 
+class ClientImportSerializer(ClientSerializer):
+    """ClientSerializer's field rules for bulk imports, which check name uniqueness themselves."""
+    class Meta(ClientSerializer.Meta):
+        extra_kwargs = {'name': {'validators': []}}
+
+
+class ClientSummarySerializer(serializers.ModelSerializer):
+    """One row of the client list screen; the extra fields come from ``ClientSummarySerializer.annotate``."""
+    latest_weight = serializers.FloatField(read_only=True, allow_null=True)
+    latest_follow_up_date = serializers.DateField(read_only=True, allow_null=True)
+    lab_count = serializers.IntegerField(read_only=True)
+    last_lab_date = serializers.DateField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Client
+        fields = [
+            'id','name','gender','ward_type','feeding_type','is_finished',
+            'latest_weight','latest_follow_up_date','lab_count','last_lab_date'
+        ]
+        read_only_fields = fields
+
+    @staticmethod
+    def annotate(queryset):
+        """Add the summary columns as correlated subqueries, one query in all."""
+        follow_ups = FollowUp.objects.filter(client=OuterRef('pk')).order_by(F('date').desc(nulls_last=True), '-id')
+        labs = LabResult.objects.filter(client=OuterRef('pk'))
+        return queryset.annotate(
+            latest_follow_up_date=Subquery(follow_ups.values('date')[:1]),
+            # The newest follow-up weight, else the weight taken at intake.
+            latest_weight=Coalesce(
+                Subquery(follow_ups.filter(weight__isnull=False).values('weight')[:1]),
+                F('weight'),
+            ),
+            lab_count=Coalesce(
+                Subquery(labs.order_by().values('client').annotate(count=Count('id')).values('count')),
+                0,
+            ),
+            last_lab_date=Subquery(labs.order_by('-date').values('date')[:1]),
+        )
+
+
+class LabTrendQuerySerializer(serializers.Serializer):
+    """Query parameters of the lab trends endpoint."""
+    analyte = serializers.CharField(required=False, help_text='Comma-separated analyte codes; all by default')
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    points = serializers.IntegerField(required=False, default=120, min_value=2, max_value=labs.MAX_POINTS)
+
+    def validate_analyte(self, value):
+        codes = [code.strip() for code in value.split(',') if code.strip()]
+        unknown = [code for code in codes if code not in labs.ANALYTES]
+        if unknown:
+            raise serializers.ValidationError(f'Unknown analyte(s): {", ".join(unknown)}.')
+        return codes
+
+
 class ClientNameSerializer(serializers.ModelSerializer):
     class Meta:
         model = Client
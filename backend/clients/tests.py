@@ -1,3 +1,360 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from nutrition.interactions import alias_index
+from nutrition.models import Drug, DrugCategory
+from subscriptions.models import SubscriptionPlan, SubscriptionUsage, UserSubscription
+
+from . import labs
+from .models import Client, FollowUp, LabResult, Medication
+
+
+class ClinicianAPIMixin:
+    """A clinician signed in to ``self.api``, and factories for their records."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.add_user('dietitian@example.com')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def add_user(self, email):
+        return get_user_model().objects.create(email=email)
+
+    def add_client(self, name, user=None, **fields):
+        fields.setdefault('physical_activity', 'light')
+        return Client.objects.create(user=user or self.user, name=name, **fields)
+
+    def add_clients(self, count, follow_ups=2):
+        for i in range(count):
+            client = self.add_client(f'client {Client.objects.count()}', physical_activity='sedentary')
+            LabResult.objects.create(client=client, test_name='Albumin', result='3.5', date=date(2025, 1, 1))
+            Medication.objects.create(client=client, name='metformin')
+            for _ in range(follow_ups):
+                follow_up = FollowUp.objects.create(client=client, date=date(2025, 2, 1))
+                LabResult.objects.create(client=client, follow_up=follow_up, test_name='HbA1c', result='7.1', date=date(2025, 2, 1))
+                Medication.objects.create(client=client, follow_up=follow_up, name='insulin')
+
+
+class ClientListQueryCountTests(ClinicianAPIMixin, TestCase):
+    def test_list_query_count_does_not_grow_with_clients(self):
+        self.add_clients(3)
+        # Client page + labs + meds + follow-ups + follow-up labs + follow-up meds.
+        with self.assertNumQueries(6):
+            response = self.api.get('/api/clients/')
+        self.assertEqual(len(response.data), 3)
+
+        self.add_clients(20)
+        with self.assertNumQueries(6):
+            response = self.api.get('/api/clients/')
+        self.assertEqual(len(response.data), 23)
+
+    def test_list_nests_follow_up_children(self):
+        self.add_clients(1)
+        client = self.api.get('/api/clients/').data[0]
+        self.assertEqual(len(client['lab_results']), 3)
+        self.assertEqual(len(client['follow_ups']), 2)
+        self.assertEqual([m['name'] for m in client['follow_ups'][0]['medications']], ['insulin'])
+
+
+class ClientSummaryListTests(ClinicianAPIMixin, TestCase):
+    def test_summary_is_one_query_with_latest_values(self):
+        client = self.add_client('summary', weight=80)
+        self.add_client('no history', weight=60)
+        LabResult.objects.create(client=client, test_name='Albumin', date=date(2025, 1, 1))
+        first = FollowUp.objects.create(client=client, date=date(2025, 2, 1), weight=78)
+        FollowUp.objects.create(client=client, date=date(2025, 3, 1))
+        LabResult.objects.create(client=client, follow_up=first, test_name='HbA1c', date=date(2025, 2, 1))
+
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/clients/', {'view': 'summary'})
+        rows = {row['name']: row for row in response.data}
+        self.assertNotIn('follow_ups', rows['summary'])
+        self.assertEqual(rows['summary']['latest_follow_up_date'], '2025-03-01')
+        self.assertEqual(rows['summary']['latest_weight'], 78)
+        self.assertEqual(rows['summary']['lab_count'], 2)
+        self.assertEqual(rows['summary']['last_lab_date'], '2025-02-01')
+        self.assertEqual(rows['no history']['latest_weight'], 60)
+        self.assertEqual(rows['no history']['lab_count'], 0)
+        self.assertIsNone(rows['no history']['last_lab_date'])
+
+
+class NestedUpdateTests(ClinicianAPIMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_record = self.add_client('nested')
+        self.follow_up = FollowUp.objects.create(client=self.client_record, date=date(2025, 2, 1))
+        self.kept = LabResult.objects.create(client=self.client_record, follow_up=self.follow_up, test_name='HbA1c', result='7.1', date=date(2025, 2, 1))
+        self.dropped = LabResult.objects.create(client=self.client_record, follow_up=self.follow_up, test_name='Albumin', result='3.5', date=date(2025, 2, 1))
+        self.url = f'/api/clients/{self.client_record.id}/follow-up/{self.follow_up.id}/'
+
+    def test_follow_up_update_diffs_children_by_id(self):
+        payload = {
+            'date': '2025-02-01',
+            'notes': 'edited',
+            'lab_results': [
+                {'id': self.kept.id, 'test_name': 'HbA1c', 'result': '6.8', 'date': '2025-02-01'},
+                {'test_name': 'Ferritin', 'result': '40', 'date': '2025-02-01'},
+            ],
+        }
+        response = self.api.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        labs = {lab.test_name: lab for lab in self.follow_up.lab_results.all()}
+        self.assertEqual(set(labs), {'HbA1c', 'Ferritin'})
+        self.assertEqual(labs['HbA1c'].id, self.kept.id)
+        self.assertEqual(labs['HbA1c'].result, '6.8')
+        self.assertFalse(LabResult.objects.filter(id=self.dropped.id).exists())
+
+    def test_children_left_out_of_a_patch_are_untouched(self):
+        response = self.api.patch(self.url, {'notes': 'only notes'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.follow_up.lab_results.count(), 2)
+
+    def test_unknown_child_id_is_rejected(self):
+        other = self.add_client('other')
+        foreign = LabResult.objects.create(client=other, test_name='K', date=date(2025, 1, 1))
+        payload = {'notes': 'x', 'lab_results': [{'id': foreign.id, 'test_name': 'K', 'date': '2025-01-01'}]}
+        response = self.api.patch(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.follow_up.lab_results.count(), 2)
+        self.follow_up.refresh_from_db()
+        self.assertIsNone(self.follow_up.notes)
+
+    def test_client_update_keeps_follow_up_rows(self):
+        intake = LabResult.objects.create(client=self.client_record, test_name='Albumin', date=date(2025, 1, 1))
+        payload = {'name': 'nested', 'physical_activity': 'light', 'lab_results': [], 'medications': []}
+        response = self.api.put(f'/api/clients/{self.client_record.id}/', payload, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(LabResult.objects.filter(id=intake.id).exists())
+        self.assertEqual(self.follow_up.lab_results.count(), 2)
+
+
+class NestedCreateTests(ClinicianAPIMixin, TestCase):
+    def test_intake_children_are_bulk_created_and_not_queried_back(self):
+        payload = {
+            'name': 'intake',
+            'physical_activity': 'moderate',
+            'lab_results': [{'test_name': f'test {i}', 'result': str(i), 'date': '2025-01-01'} for i in range(40)],
+            'medications': [{'name': 'metformin'}, {'name': 'lasix'}],
+        }
+        # Name uniqueness check, then client + labs + medications, plus the
+        # savepoint pair of the create transaction inside the test's own.
+        with self.assertNumQueries(6):
+            response = self.api.post('/api/clients/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['lab_results']), 40)
+        self.assertTrue(all(lab['id'] for lab in response.data['lab_results']))
+        self.assertEqual(LabResult.objects.filter(client_id=response.data['id']).count(), 40)
+        self.assertEqual(response.data['follow_ups'], [])
+
+    def test_follow_up_children_are_linked_to_both_parents(self):
+        client = self.add_client('follow')
+        payload = {
+            'date': '2025-03-01',
+            'lab_results': [{'test_name': 'K', 'result': '4.1', 'date': '2025-03-01'}],
+            'medications': [{'name': 'insulin'}],
+        }
+        response = self.api.post(f'/api/clients/{client.id}/follow-up/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        lab = LabResult.objects.get(id=response.data['lab_results'][0]['id'])
+        self.assertEqual((lab.client_id, lab.follow_up_id), (client.id, response.data['id']))
+        self.assertEqual(Medication.objects.get(follow_up_id=response.data['id']).client_id, client.id)
+
+
+class ClientImportTests(ClinicianAPIMixin, TestCase):
+    def upload(self, text, **data):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        data['file'] = SimpleUploadedFile('clients.csv', text.encode(), content_type='text/csv')
+        return self.api.post('/api/clients/import/', data, format='multipart')
+
+    def test_import_creates_clients_with_children_and_reports_bad_rows(self):
+        self.add_client('existing')
+        self.add_client('taken', user=self.add_user('other@example.com'))
+        response = self.upload(
+            'name,weight,physical_activity,ward_type,lab_test_name,lab_result,lab_date,medication_name\n'
+            'Jane,62,light,icu,Albumin,3.1,2025-01-04,furosemide\n'
+            ',,,,HbA1c,7.2,2025-01-04,\n'
+            'Bad,heavy,light,,,,,\n'
+            'existing,70,light,,,,,\n'
+            'taken,70,light,,,,,\n'
+            'Jane,61,light,,,,,\n'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['created'], response.data['skipped']), (1, 1))
+        self.assertEqual([error['name'] for error in response.data['errors']], ['Bad', 'taken', 'Jane'])
+
+        jane = Client.objects.get(name='Jane')
+        self.assertEqual((jane.user, jane.weight, jane.ward_type), (self.user, 62, 'icu'))
+        self.assertEqual(sorted(jane.lab_results.values_list('test_name', flat=True)), ['Albumin', 'HbA1c'])
+        self.assertEqual(list(jane.medications.values_list('name', flat=True)), ['furosemide'])
+
+    def test_update_mode_overwrites_own_clients(self):
+        self.add_client('existing', weight=80)
+        response = self.upload('name,weight,physical_activity\nexisting,75,light\n', on_duplicate='update')
+        self.assertEqual(response.data['updated'], 1, response.data)
+        self.assertEqual(Client.objects.get(name='existing').weight, 75)
+
+
+class ClientExportTests(ClinicianAPIMixin, TestCase):
+    def test_csv_rows_are_grouped_under_their_client_and_follow_up(self):
+        import csv
+
+        self.add_clients(2, follow_ups=1)
+        self.add_client('not mine', user=self.add_user('other@example.com'))
+        response = self.api.get('/api/clients/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(
+            [(row['record_type'], row['client_name'], row['follow_up_id'] != '') for row in rows],
+            [
+                ('client', 'client 0', False), ('lab_result', 'client 0', False), ('medication', 'client 0', False),
+                ('follow_up', 'client 0', True), ('lab_result', 'client 0', True), ('medication', 'client 0', True),
+                ('client', 'client 1', False), ('lab_result', 'client 1', False), ('medication', 'client 1', False),
+                ('follow_up', 'client 1', True), ('lab_result', 'client 1', True), ('medication', 'client 1', True),
+            ],
+        )
+        self.assertEqual(rows[4]['test_name'], 'HbA1c')
+
+    def test_ndjson_and_unknown_format(self):
+        import json
+
+        self.add_clients(1, follow_ups=0)
+        response = self.api.get('/api/clients/export/', {'file_format': 'ndjson'})
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['record_type'] for record in records], ['client', 'lab_result', 'medication'])
+        self.assertEqual(records[2]['medication_name'], 'metformin')
+        self.assertEqual(self.api.get('/api/clients/export/', {'file_format': 'xlsx'}).status_code, 400)
+
+
+class LabTrendTests(ClinicianAPIMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_record = self.add_client('icu patient', physical_activity='sedentary')
+
+    def test_test_name_and_result_are_normalized_on_every_write_path(self):
+        response = self.api.post('/api/clients/', {
+            'name': 'new', 'physical_activity': 'light',
+            'lab_results': [
+                {'test_name': 'S. Albumin', 'result': '3.1 g/dL', 'date': '2025-01-01'},
+                {'test_name': 'Urine culture', 'result': 'negative', 'date': '2025-01-01'},
+            ],
+        }, format='json')
+        self.assertEqual(
+            [(lab['analyte'], lab['value']) for lab in response.data['lab_results']],
+            [('albumin', 3.1), ('', None)],
+        )
+
+        lab_id = response.data['lab_results'][0]['id']
+        self.api.patch(f"/api/clients/{response.data['id']}/", {
+            'lab_results': [{'id': lab_id, 'test_name': 'K', 'result': '<3.5', 'date': '2025-01-01'}],
+        }, format='json')
+        lab = LabResult.objects.get(id=lab_id)
+        self.assertEqual((lab.analyte, lab.value), ('potassium', 3.5))
+
+        lab.result = '1,250'
+        lab.save(update_fields=['result'])
+        lab.refresh_from_db()
+        self.assertEqual(lab.value, 1250)
+
+    def test_trends_are_bucketed_to_fit_the_requested_points(self):
+        start = date(2025, 1, 1)
+        for day in range(90):
+            for result in ('3.0', '3.4'):
+                LabResult.objects.create(client=self.client_record, test_name='Albumin', result=result,
+                                         date=start + timedelta(days=day))
+        LabResult.objects.create(client=self.client_record, test_name='HbA1c', result='7.1', date=start)
+
+        url = f'/api/clients/{self.client_record.id}/lab-trends/'
+        with self.assertNumQueries(3):  # client + span + buckets
+            response = self.api.get(url, {'analyte': 'albumin'})
+        self.assertEqual(response.data['resolution'], 'day')
+        [series] = response.data['series']
+        self.assertEqual((series['analyte'], series['unit'], len(series['points'])), ('albumin', 'g/dL', 90))
+        self.assertEqual(series['points'][0], {'date': start, 'mean': 3.2, 'min': 3.0, 'max': 3.4, 'count': 2})
+
+        response = self.api.get(url, {'points': 20})
+        self.assertEqual(response.data['resolution'], 'week')
+        self.assertEqual([series['analyte'] for series in response.data['series']], ['albumin', 'hba1c'])
+        self.assertLessEqual(len(response.data['series'][0]['points']), 20)
+
+        self.assertEqual(self.api.get(url, {'analyte': 'albumin,unobtainium'}).status_code, 400)
+        other = self.add_client('other', user=self.add_user('o@example.com'))
+        self.assertEqual(self.api.get(f'/api/clients/{other.id}/lab-trends/').status_code, 404)
+
+
+    def test_resolution_counts_calendar_buckets(self):
+        # Sunday to the Monday after next: 8 days, but three Monday-based weeks.
+        self.assertEqual(labs.bucket_count(date(2025, 1, 5), date(2025, 1, 13), 'week'), 3)
+        self.assertEqual(labs.resolution_for(date(2025, 1, 5), date(2025, 1, 13), 2), 'month')
+        # 31 days, but three calendar months and two quarters.
+        self.assertEqual(labs.bucket_count(date(2025, 1, 31), date(2025, 3, 3), 'month'), 3)
+        self.assertEqual(labs.resolution_for(date(2025, 1, 31), date(2025, 3, 3), 2), 'quarter')
+        self.assertEqual(labs.resolution_for(date(2024, 12, 31), date(2025, 1, 1), 2), 'day')
+
+        for day, result in [(date(2025, 1, 5), '3.0'), (date(2025, 1, 13), '3.2')]:
+            LabResult.objects.create(client=self.client_record, test_name='Albumin', result=result, date=day)
+        response = self.api.get(f'/api/clients/{self.client_record.id}/lab-trends/', {'points': 2})
+        self.assertEqual(response.data['resolution'], 'month')
+        self.assertEqual(len(response.data['series'][0]['points']), 1)
+
+
+class DrugInteractionTests(ClinicianAPIMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        category = DrugCategory.objects.create(name='Antidiabetics')
+        self.metformin = Drug.objects.create(
+            category=category, name='Metformin (Glucophage)',
+            nutritional_implications='May lower vitamin B12 absorption.',
+        )
+        self.client_a = self.add_client('a', physical_activity='sedentary')
+        self.follow_up = FollowUp.objects.create(client=self.client_a, date=date(2025, 2, 1))
+        Medication.objects.create(client=self.client_a, name='Glucophage 500mg tab')
+        Medication.objects.create(client=self.client_a, follow_up=self.follow_up, name='insulin glargine')
+        finished = self.add_client('b', physical_activity='sedentary', is_finished=True)
+        Medication.objects.create(client=finished, name='metformin XR')
+
+    def tearDown(self):
+        alias_index.invalidate()
+
+    def test_client_report_lists_matches_and_implications(self):
+        response = self.api.get(f'/api/clients/{self.client_a.id}/drug-interactions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['client'], self.client_a.id)
+        self.assertEqual([m['matched_alias'] for m in response.data['medications']], ['glucophage', None])
+        self.assertEqual(response.data['unmatched'], ['insulin glargine'])
+        self.assertEqual([i['drug_id'] for i in response.data['implications']], [self.metformin.id])
+
+    def test_follow_up_report_covers_only_its_medications(self):
+        response = self.api.get(f'/api/clients/{self.client_a.id}/follow-up/{self.follow_up.id}/drug-interactions/')
+        self.assertEqual((response.data['client'], response.data['follow_up']), (self.client_a.id, self.follow_up.id))
+        self.assertEqual([m['name'] for m in response.data['medications']], ['insulin glargine'])
+        self.assertEqual(response.data['implications'], [])
+
+    def test_caseload_skips_finished_clients_unless_asked(self):
+        response = self.api.get('/api/clients/drug-interactions/')
+        self.assertEqual([row['name'] for row in response.data], ['a'])
+        response = self.api.get('/api/clients/drug-interactions/', {'include_finished': 'true'})
+        self.assertEqual([row['name'] for row in response.data], ['a', 'b'])
+        self.assertEqual(response.data[1]['implications'][0]['drug_id'], self.metformin.id)
+
+    def test_other_clinicians_clients_are_not_found(self):
+        self.api.force_authenticate(self.add_user('other@example.com'))
+        self.assertEqual(self.api.get(f'/api/clients/{self.client_a.id}/drug-interactions/').status_code, 404)
+        self.assertEqual(self.api.get('/api/clients/drug-interactions/').data, [])
 
-# Create your tests here.
+    def test_each_screened_owner_counts_as_a_check(self):
+        plan = SubscriptionPlan.objects.create(name='Basic', price=10)
+        UserSubscription.objects.create(
+            user=self.user, plan=plan, status='active',
+            current_period_start=timezone.now(), current_period_end=timezone.now() + timedelta(days=30),
+        )
+        self.api.get(f'/api/clients/{self.client_a.id}/drug-interactions/')
+        self.api.get('/api/clients/drug-interactions/', {'include_finished': 'true'})
+        self.assertEqual(SubscriptionUsage.objects.get().drug_interaction_checks, 3)
@@ -3,9 +3,15 @@ from . import views
 
 urlpatterns = [
     path('', views.ClientListCreateAPIView.as_view(), name='client-list-create'),
+    path('export/', views.ClientExportAPIView.as_view(), name='ClientExportAPIView'),
+    path('import/', views.ClientImportAPIView.as_view(), name='ClientImportAPIView'),
     path('<int:id>/', views.ClientRetrieveUpdateDestroyAPIView.as_view(), name='client-retrieve-update-destroy'),
     path('<int:id>/follow-up/', views.FollowUpListCreateAPIView.as_view(), name='FollowUpListCreateAPIView'),
     path('<int:id>/follow-up/<int:pk>/', views.FollowUpRetrieveUpdateDestroyAPIView.as_view(), name='FollowUpRetrieveUpdateDestroyAPIView'),
+    path('<int:id>/lab-trends/', views.ClientLabTrendsAPIView.as_view(), name='ClientLabTrendsAPIView'),
+    path('<int:id>/drug-interactions/', views.ClientDrugInteractionsAPIView.as_view(), name='ClientDrugInteractionsAPIView'),
+    path('<int:id>/follow-up/<int:pk>/drug-interactions/', views.FollowUpDrugInteractionsAPIView.as_view(), name='FollowUpDrugInteractionsAPIView'),
+    path('drug-interactions/', views.CaseloadDrugInteractionsAPIView.as_view(), name='CaseloadDrugInteractionsAPIView'),
     path('appointment/', views.AppointmentListCreateAPIView.as_view(), name='appointment-list-create'),
     path('appointment/<int:id>/', views.AppointmentRetrieveUpdateDestroyAPIView.as_view(), name='appointment-retrieve-update-destroy'),
     path('choices/', views.get_client_choices, name='client-choices'),  
@@ -1,12 +1,22 @@
+import io
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from drf_spectacular.utils import extend_schema
-from .models import Client,Appointment,FollowUp
-from .serializers import ClientSerializer,AppointmentSerializer,FollowUpSerializer
+from rest_framework.parsers import MultiPartParser
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from nutrition.interactions import screen
+from subscriptions.models import SubscriptionUsage
+from .models import Client,Appointment,FollowUp,LabResult,Medication
+from . import export, importer, labs
+from .serializers import ClientSerializer,ClientSummarySerializer,AppointmentSerializer,FollowUpSerializer,LabTrendQuerySerializer
 
 
 
@@ -30,6 +40,7 @@ def get_client_choices(request):
         'stress_factor': dict(Client._meta.get_field('stress_factor').choices),
         'feeding_type': dict(Client._meta.get_field('feeding_type').choices),
         'gender': dict(Client._meta.get_field('gender').choices),
+        'lab_analyte': {code: name for code, (name, unit, aliases) in labs.ANALYTES.items()},
     }
     return Response(choices)
 @api_view(['GET'])
@@ -44,13 +55,103 @@ class ClientListCreateAPIView(generics.ListCreateAPIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @extend_schema(parameters=[
+        OpenApiParameter(
+            'view', str, enum=['full', 'summary'],
+            description='summary: one flat row per client (latest weight and follow-up, lab count) without the nested history',
+        ),
+    ])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def is_summary(self):
+        return self.request.method == 'GET' and self.request.query_params.get('view') == 'summary'
+
+    def get_serializer_class(self):
+        return ClientSummarySerializer if self.is_summary() else ClientSerializer
+
     def get_queryset(self):
-        return Client.objects.filter(user=self.request.user)
+        queryset = Client.objects.filter(user=self.request.user)
+        if self.is_summary():
+            return ClientSummarySerializer.annotate(queryset)
+        return ClientSerializer.prefetch(queryset)
 
     
     def perform_create(self, serializer):
         serializer.save()   
 
+class ClientImportAPIView(generics.GenericAPIView):
+    """
+    Bulk import of a CSV export onto the caseload (see ``clients.importer``
+    for the layout). The file is read row by row; the response counts what
+    was created, updated or skipped and lists every rejected row.
+    Very large files are better loaded with ``manage.py import_clients``.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    @extend_schema(
+        request={'multipart/form-data': {
+            'type': 'object',
+            'properties': {
+                'file': {'type': 'string', 'format': 'binary'},
+                'on_duplicate': {'type': 'string', 'enum': [importer.SKIP, importer.UPDATE]},
+                'dry_run': {'type': 'boolean'},
+            },
+            'required': ['file'],
+        }},
+        responses=OpenApiTypes.OBJECT,
+    )
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        on_duplicate = request.data.get('on_duplicate', importer.SKIP)
+        if on_duplicate not in (importer.SKIP, importer.UPDATE):
+            return Response({'on_duplicate': [f'Choose {importer.SKIP} or {importer.UPDATE}.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            report = importer.import_file(lines, request.user, on_duplicate=on_duplicate, dry_run=dry_run)
+        except (UnicodeDecodeError, ValueError) as exc:
+            return Response({'file': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        report['dry_run'] = dry_run
+        return Response(report, status=status.HTTP_200_OK if dry_run or report['created'] == 0 else status.HTTP_201_CREATED)
+
+
+class ClientExportAPIView(generics.GenericAPIView):
+    """
+    The whole caseload as flat client / follow-up / lab / medication rows,
+    streamed as CSV (default) or NDJSON (``?file_format=ndjson``).
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[OpenApiParameter('file_format', str, enum=list(export.FORMATS))],
+        responses={(200, 'text/csv'): OpenApiTypes.STR, (200, 'application/x-ndjson'): OpenApiTypes.STR},
+    )
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in export.FORMATS:
+            return Response({'file_format': [f'Choose one of {", ".join(export.FORMATS)}.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        render, content_type = export.FORMATS[file_format]
+        lines = render(export.export_rows(request.user))
+        if isinstance(request._request, ASGIRequest):
+            content = export.async_blocks(lines)
+        else:
+            content = export.blocks(lines)
+        filename = f'caseload-{timezone.localdate():%Y%m%d}.{file_format}'
+        return StreamingHttpResponse(content, content_type=content_type, headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store',
+        })
+
+
 class ClientRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ClientSerializer
     authentication_classes = [TokenAuthentication]
@@ -59,7 +160,7 @@ class ClientRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     lookup_url_kwarg = 'id'
 
     def get_queryset(self):
-        return Client.objects.prefetch_related('follow_ups').filter(user=self.request.user)     
+        return ClientSerializer.prefetch(Client.objects.filter(user=self.request.user))
 
 
 class FollowUpListCreateAPIView(generics.ListCreateAPIView):
@@ -94,6 +195,28 @@ class FollowUpListCreateAPIView(generics.ListCreateAPIView):
         print(client)
         print('-'*50)
         serializer.save()
+class ClientLabTrendsAPIView(generics.GenericAPIView):
+    """
+    A client's numeric lab results per analyte, bucketed by day, week,
+    month, quarter or year so each series has at most ``points`` points.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(parameters=[LabTrendQuerySerializer], responses=OpenApiTypes.OBJECT)
+    def get(self, request, id):
+        client = get_object_or_404(Client, id=id, user=request.user)
+        query = LabTrendQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        queryset = LabResult.objects.filter(client=client)
+        if params.get('analyte'):
+            queryset = queryset.filter(analyte__in=params['analyte'])
+        report = labs.trends(queryset, params['points'], params.get('since'), params.get('until'))
+        return Response({'client': client.id, **report})
+
+
 class FollowUpRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = FollowUpSerializer
     authentication_classes = [TokenAuthentication]
@@ -157,4 +280,64 @@ class AppointmentRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIV
     def perform_update(self, serializer):
         serializer.save()
 
-    
\ No newline at end of file
+    
+
+class DrugInteractionMixin:
+    """Screens medications against the drug catalog and counts the checks."""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def screen_medications(self, medications, owner_field, owners):
+        by_owner = {owner: [] for owner in owners}
+        rows = medications.order_by('id').values_list(owner_field, 'id', 'name', 'dosage')
+        for owner, med_id, name, dosage in rows:
+            by_owner[owner].append((med_id, name, dosage))
+        report = screen(by_owner)
+        SubscriptionUsage.increment(self.request.user, 'drug_interaction_checks', len(by_owner))
+        return report
+
+
+class ClientDrugInteractionsAPIView(DrugInteractionMixin, generics.GenericAPIView):
+    """Nutritional implications of every medication on a client's record."""
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request, id):
+        client = get_object_or_404(Client, id=id, user=request.user)
+        report = self.screen_medications(Medication.objects.filter(client=client), 'client_id', [client.id])
+        return Response({'client': client.id, **report[client.id]})
+
+
+class FollowUpDrugInteractionsAPIView(DrugInteractionMixin, generics.GenericAPIView):
+    """Nutritional implications of the medications recorded at one follow-up."""
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request, id, pk):
+        follow_up = get_object_or_404(FollowUp, id=pk, client_id=id, client__user=request.user)
+        report = self.screen_medications(
+            Medication.objects.filter(follow_up=follow_up), 'follow_up_id', [follow_up.id]
+        )
+        return Response({'client': id, 'follow_up': follow_up.id, **report[follow_up.id]})
+
+
+class CaseloadDrugInteractionsAPIView(DrugInteractionMixin, generics.GenericAPIView):
+    """
+    Screening for all of the clinician's clients at once. Finished clients
+    are left out unless ``?include_finished=true``.
+    """
+
+    @extend_schema(
+        parameters=[OpenApiParameter('include_finished', bool)],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        clients = Client.objects.filter(user=request.user)
+        if request.query_params.get('include_finished') != 'true':
+            clients = clients.filter(is_finished=False)
+        names = dict(clients.values_list('id', 'name'))
+        report = self.screen_medications(
+            Medication.objects.filter(client_id__in=list(names)), 'client_id', names
+        )
+        return Response([
+            {'client': client_id, 'name': names[client_id], **report[client_id]}
+            for client_id in sorted(report)
+        ])
@@ -27,6 +27,8 @@ echo "Makemigrations..."
 python manage.py makemigrations 
 echo "Applying migrations..."
 python manage.py migrate
+echo "Ensuring calculation partitions..."
+python manage.py calculation_partitions ensure
 
 echo "Starting server..."
 exec daphne -b 0.0.0.0 -p 8000 project.asgi:application
\ No newline at end of file
@@ -21,10 +21,21 @@ class CalculationAdmin(admin.ModelAdmin):
 class DrugCategoryAdmin(admin.ModelAdmin):
     list_display = ("id","name")
    
+class DrugNutrientFlagInline(admin.TabularInline):
+    model = DrugNutrientFlag
+    extra = 0
+    readonly_fields = ("kind", "tag", "quantity", "unit")
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Drug)
 class DrugAdmin(admin.ModelAdmin):
     list_display = ("id","name", "category")
     search_fields = ("name", "category__name")
+    list_filter = ("flags__tag",)
+    inlines = [DrugNutrientFlagInline]
 
 
 
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class NutritionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'nutrition'
+
+    def ready(self):
+        from . import registry, signals  # noqa: F401
+
+        registry.load_functions()
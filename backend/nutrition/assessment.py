@@ -0,0 +1,111 @@
+"""
+Assessment panel: several equations evaluated as one dependency graph.
+
+Each node names the inputs or other nodes it needs, so shared intermediates
+such as the Hamwi IBW are computed once and reused by %IBW, adjusted body
+weight and the NRI instead of every equation recomputing them. A node whose
+inputs are missing, or whose dependency failed, is reported as skipped.
+"""
+from datetime import date
+from graphlib import TopologicalSorter
+
+from clients.models import PHYSICAL_ACTIVITY_FACTORS, STRESS_FACTOR_VALUES
+
+from . import registry, schemas, utils
+
+
+class Node:
+    def __init__(self, name, func, requires, arguments=None):
+        self.name = name
+        self.func = func
+        self.requires = requires
+        # Parameter name to pass each requirement as, when it differs.
+        self.arguments = arguments or {}
+
+
+def _value(result):
+    """The number a dependent node consumes from a node's result."""
+    return result["value"] if isinstance(result, dict) else result
+
+
+PANEL = [
+    Node("height_cm", lambda height_m: round(height_m * 100, 1), ["height_m"]),
+    Node("bmi", lambda weight_kg, height_m: utils.bmi(weight_kg=weight_kg, height_m=height_m),
+         ["weight_kg", "height_m"]),
+    Node("ibw", utils.ibw_hamwi, ["gender", "height_cm"]),
+    Node("percent_ibw", utils.percent_ibw_from_ibw, ["weight_kg", "ibw"]),
+    Node("adjusted_body_weight", utils.adjusted_body_weight_from_ibw, ["weight_kg", "ibw"]),
+    Node("nutrition_risk_index", utils.nutrition_risk_index_from_ibw,
+         ["albumin_g_dl", "weight_kg", "ibw"]),
+    Node("bmr", lambda gender, weight_kg, height_cm, age: {
+        "value": round(utils.mifflin_st_jeor_kcal(gender, weight_kg, height_cm, age), 1),
+        "unit": "kcal/day",
+        "equation": "mifflin_st_jeor",
+    }, ["gender", "weight_kg", "height_cm", "age"]),
+    Node("energy", utils.total_energy_expenditure, ["bmr", "physical_factor", "stress_factor"],
+         arguments={"bmr": "hbe_kcal"}),
+    Node("fluids", utils.baseline_fluid_standard, ["weight_kg"]),
+]
+
+
+def evaluate(nodes, inputs):
+    """Evaluate ``nodes`` in dependency order; each node runs at most once."""
+    by_name = {node.name: node for node in nodes}
+    graph = {node.name: [r for r in node.requires if r in by_name] for node in nodes}
+    values = {k: v for k, v in inputs.items() if v is not None}
+    results = {}
+
+    for name in TopologicalSorter(graph).static_order():
+        node = by_name[name]
+        missing = [r for r in node.requires if r not in values]
+        if missing:
+            results[name] = {"skipped": f"Missing {', '.join(missing)}"}
+            continue
+        kwargs = {node.arguments.get(r, r): _value(values[r]) for r in node.requires}
+        try:
+            result = node.func(**kwargs)
+        except registry.EVALUATION_ERRORS as e:
+            results[name] = {"error": str(e)}
+            continue
+        results[name] = values[name] = result
+    return {node.name: results[node.name] for node in nodes}
+
+
+def age_in_years(date_of_birth, today=None):
+    today = today or date.today()
+    return today.year - date_of_birth.year - (
+        (today.month, today.day) < (date_of_birth.month, date_of_birth.day)
+    )
+
+
+def client_inputs(client):
+    """Panel inputs from a client, its latest follow-up and latest albumin."""
+    follow_up = client.follow_ups.exclude(date=None).order_by("-date", "-id").first()
+
+    def latest(field):
+        value = getattr(follow_up, field, None) if follow_up else None
+        return value if value not in (None, "") else getattr(client, field)
+
+    physical_activity = latest("physical_activity")
+    stress_factor = latest("stress_factor")
+    albumin = (
+        client.lab_results.filter(test_name__icontains="albumin")
+        .exclude(test_name__icontains="prealbumin")
+        .order_by("-date", "-id")
+        .values_list("result", flat=True)
+        .first()
+    )
+    try:
+        albumin = schemas._number(albumin) if albumin is not None else None
+    except ValueError:
+        albumin = None
+
+    return {
+        "gender": client.gender,
+        "age": age_in_years(client.date_of_birth) if client.date_of_birth else None,
+        "weight_kg": latest("weight"),
+        "height_m": latest("height"),
+        "albumin_g_dl": albumin,
+        "physical_factor": PHYSICAL_ACTIVITY_FACTORS.get(physical_activity, 1.0),
+        "stress_factor": STRESS_FACTOR_VALUES.get(stress_factor, 1.0),
+    }
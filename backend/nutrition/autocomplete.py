@@ -0,0 +1,72 @@
+"""
+In-process prefix index for drug-name autocomplete.
+
+Every drug name is normalised (lower case, punctuation to spaces) and
+indexed under each of its word-start suffixes, so "aug", "clavul" and
+"amoxicillin clav" all find "amoxicillin/clavulanic acid (Augmentin)".
+Brand names in parentheses are indexed on their own as well. A lookup
+bisects one sorted array for both ends of the prefix range and ranks every
+match in it, however short the prefix. The index is built on first use and
+rebuilt when the catalog version moves (see ``catalog.CatalogIndex``),
+including after imports run in another process.
+"""
+import re
+from bisect import bisect_left
+
+from .catalog import CatalogIndex
+
+NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+BRAND_RE = re.compile(r"\(([^)]*)\)")
+
+# Where the prefix matched, best first.
+NAME_START, BRAND_START, WORD_START = 0, 1, 2
+
+# Sorts after any character a normalised key can continue with.
+MAX_CHAR = "\U0010ffff"
+
+
+def normalize(text):
+    return NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def index_keys(name):
+    """``(key, kind)`` pairs a drug name is found under."""
+    normalized = normalize(name)
+    words = normalized.split()
+    keys = [(normalized, NAME_START)]
+    keys += [(" ".join(words[i:]), WORD_START) for i in range(1, len(words))]
+    for brand in BRAND_RE.findall(name):
+        brand = normalize(brand)
+        if brand:
+            keys.append((brand, BRAND_START))
+    return keys
+
+
+class DrugNameIndex(CatalogIndex):
+    def build(self):
+        from .models import Drug
+
+        names, entries = {}, []
+        for pk, name in Drug.objects.values_list("id", "name"):
+            names[pk] = name
+            entries += [(key, kind, pk) for key, kind in index_keys(name)]
+        entries.sort()
+        return [entry[0] for entry in entries], entries, names
+
+    def search(self, prefix, limit=10):
+        """Up to ``limit`` ``(id, name)`` pairs whose name has a word starting with ``prefix``."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        keys, entries, names = self._loaded()
+        best = {}
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + MAX_CHAR, start)
+        for _, kind, pk in entries[start:end]:
+            if kind < best.get(pk, WORD_START + 1):
+                best[pk] = kind
+        ranked = sorted(best, key=lambda pk: (best[pk], len(names[pk]), names[pk].lower()))
+        return [(pk, names[pk]) for pk in ranked[:limit]]
+
+
+drug_index = DrugNameIndex()
@@ -0,0 +1,240 @@
+"""
+Micro-benchmarks for the seeded equations.
+
+Inputs are drawn from plausible clinical ranges (``DISTRIBUTIONS``) for
+every field of the equation's compiled input schema, so each function is
+timed on the kind of payload it really receives. Every equation is timed
+on up to four paths:
+
+``scalar``      the function itself, one call per row
+``vectorized``  the NumPy kernel over all rows at once, when one exists
+``batch``       ``POST calculations/batch/`` with all rows in one request
+``api_create``  ``POST calculations/`` through the DRF test client, one row
+                per request, with durable writes (the row is inserted before
+                the response) whatever the writer is configured to do
+
+Each path reports ops/sec (rows per second) and p50/p99 latency of one
+call in microseconds. ``compare`` checks a run against a saved baseline.
+"""
+import random
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.test import override_settings
+
+from . import registry
+from .writer import calculation_writer
+from .utils import ACTIVITY_FACTORS, STRESS_FACTORS
+
+# (low, mode, high) of a triangular distribution per parameter name.
+DISTRIBUTIONS = {
+    "age": (1, 45, 90),
+    "age_years": (18, 50, 90),
+    "age_months": (0, 8, 24),
+    "weight_kg": (3, 72, 180),
+    "weight": (3, 72, 180),
+    "weight_lb": (7, 160, 400),
+    "usual_weight_kg": (3, 75, 180),
+    "current_weight_kg": (3, 72, 180),
+    "prepregnancy_weight_kg": (40, 65, 120),
+    "weight_current": (0.8, 2.5, 12),
+    "weight_t1": (0.8, 4, 10),
+    "weight_t2": (1, 5, 12),
+    "height_cm": (50, 168, 205),
+    "height_m": (0.5, 1.68, 2.05),
+    "height_in": (20, 66, 81),
+    "height_in_inches": (50, 66, 81),
+    "height_t1": (40, 60, 90),
+    "height_t2": (45, 65, 95),
+    "time1_day": (0, 0, 10),
+    "time2_day": (20, 30, 60),
+    "time1_week": (0, 0, 2),
+    "time2_week": (3, 4, 12),
+    "waist_cm": (50, 90, 150),
+    "demi_span_cm": (60, 80, 100),
+    "knee_height_cm": (40, 52, 65),
+    "percent_amputation": (1, 6, 16),
+    "percent_body_fat": (8, 28, 50),
+    "factor": (20, 22, 25),
+    "albumin": (1.5, 3.8, 5.2),
+    "albumin_g_dl": (1.5, 3.8, 5.2),
+    "prealbumin": (5, 22, 40),
+    "transferrin": (100, 250, 400),
+    "triceps_skin_fold": (3, 15, 40),
+    "delayed_skin_hypersensitivity": (0, 1, 2),
+    "c_reactive_protein": (0.1, 5, 200),
+    "alpha_1_acid_glycoprotein": (30, 90, 200),
+    "percent_lymphocytes": (5, 25, 50),
+    "wbc_10e3": (2, 7, 20),
+    "sodium_mmol_l": (140, 150, 170),
+    "protein_intake_g": (20, 80, 200),
+    "urine_urea_n_g": (2, 10, 25),
+    "total_daily_dose_iu": (5, 40, 150),
+    "hbe_kcal": (800, 1500, 2800),
+    "mifflin_kcal": (800, 1500, 2800),
+    "physical_factor": (1.0, 1.2, 1.9),
+    "tmax_c": (36, 37.5, 40.5),
+    "ve_l_min": (5, 9, 20),
+    "tbsa_percentage": (1, 20, 80),
+    "calorie_requirement": (1200, 2000, 3200),
+    "calories": (1200, 2000, 3200),
+    "carb_pct": (40, 50, 60),
+    "protein_pct": (10, 20, 30),
+    "fat_pct": (20, 30, 35),
+    "min_factor": (20, 25, 30),
+    "max_factor": (30, 35, 40),
+    "gestational_age_weeks": (24, 32, 37),
+    "chronological_age_weeks": (1, 20, 104),
+    "gestation_week": (1, 20, 40),
+}
+
+CHOICES = {
+    "gender": ["male", "female"],
+    "insulin_type": ["rapid", "short"],
+    "classification": ["paraplegia", "tetraplegia", "quadriplegia"],
+    "physical_activity": list(ACTIVITY_FACTORS),
+    "stress_factor": list(STRESS_FACTORS),
+}
+
+# Exceptions an equation may raise for an unlucky row; counted, not fatal.
+ROW_ERRORS = registry.EVALUATION_ERRORS
+
+
+def _value(field, rng):
+    if field.choices:
+        return rng.choice(field.choices)
+    if field.type == "boolean":
+        return rng.random() < 0.5
+    if field.type == "string":
+        return rng.choice(CHOICES.get(field.name, ["none"]))
+    low, mode, high = DISTRIBUTIONS.get(field.name, (1, 50, 100))
+    value = rng.triangular(low, high, mode)
+    return round(value) if field.type == "integer" else round(value, 2)
+
+
+def generate_inputs(schema, count, rng):
+    """``count`` input dicts for ``schema``; optional fields are filled when a
+    distribution is known for them."""
+    fields = [
+        field for field in schema.fields.values()
+        if field.required or field.choices or field.name in DISTRIBUTIONS or field.name in CHOICES
+    ]
+    return [{field.name: _value(field, rng) for field in fields} for _ in range(count)]
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(timings, ops):
+    """ops/sec and p50/p99 (microseconds) from per-call timings in ns."""
+    ordered = sorted(timings)
+    total = sum(ordered) or 1
+    return {
+        "ops_per_sec": round(ops * 1e9 / total, 1),
+        "p50_us": round(_percentile(ordered, 0.50) / 1000, 2),
+        "p99_us": round(_percentile(ordered, 0.99) / 1000, 2),
+        "samples": len(ordered),
+    }
+
+
+def bench_scalar(entry, rows):
+    timings, errors = [], 0
+    clock = time.perf_counter_ns
+    for inputs in rows:
+        start = clock()
+        try:
+            entry.func(**inputs)
+        except ROW_ERRORS:
+            errors += 1
+        timings.append(clock() - start)
+    return {**summarize(timings, len(rows)), "errors": errors}
+
+
+def bench_vectorized(entry, rows, repeat):
+    columns = {name: np.array([row[name] for row in rows]) for name in rows[0]}
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        entry.kernel(**columns)
+        timings.append(time.perf_counter_ns() - start)
+    return summarize(timings, len(rows) * repeat)
+
+
+def bench_batch(client, entry, rows, repeat):
+    payload = {"items": [{"equation": entry.id, "inputs": inputs} for inputs in rows]}
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        response = client.post("/api/nutritions/calculations/batch/", payload, format="json")
+        timings.append(time.perf_counter_ns() - start)
+        # Generated rows can fail validation (207); only all-failed is wrong.
+        if response.status_code not in (201, 207):
+            raise CommandError(
+                f"{entry.code}: batch endpoint returned {response.status_code}: "
+                f"{response.content[:500].decode(errors='replace')}"
+            )
+    return summarize(timings, len(rows) * repeat)
+
+
+def bench_api_create(client, entry, rows):
+    # Buffered writes would time an append to a list while the flush thread
+    # competes for the GIL and the database; drain it and time the insert.
+    calculation_writer.flush()
+    timings, errors = [], 0
+    with override_settings(NUTRITION_CALCULATION_WRITER={
+        **getattr(settings, "NUTRITION_CALCULATION_WRITER", {}), "DURABLE": True,
+    }):
+        for inputs in rows:
+            start = time.perf_counter_ns()
+            response = client.post(
+                "/api/nutritions/calculations/", {"equation": entry.id, "inputs": inputs}, format="json",
+            )
+            timings.append(time.perf_counter_ns() - start)
+            if response.status_code >= 400:
+                errors += 1
+    return {**summarize(timings, len(rows)), "errors": errors, "mode": "durable"}
+
+
+def run(client, codes=None, rows=2000, api_rows=100, repeat=5, seed=0, log=None):
+    """Benchmark every registered equation (or only ``codes``)."""
+    results = {}
+    for entry in sorted(registry.all_equations(), key=lambda e: e.code):
+        if codes and entry.code not in codes:
+            continue
+        # Seeded per equation so a filtered run sees the same rows.
+        rng = random.Random(f"{seed}:{entry.code}")
+        inputs = generate_inputs(entry.schema, rows, rng)
+        paths = {"scalar": bench_scalar(entry, inputs)}
+        if entry.kernel is not None:
+            paths["vectorized"] = bench_vectorized(entry, inputs, repeat)
+        if api_rows:
+            paths["batch"] = bench_batch(client, entry, inputs[:api_rows], repeat)
+            paths["api_create"] = bench_api_create(client, entry, inputs[:api_rows])
+        results[entry.code] = paths
+        if log:
+            log(entry.code, paths)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Regressions of ``results`` against ``baseline``.
+
+    A path regresses when its ops/sec fell by more than ``threshold`` (a
+    fraction). Paths measured in a different write mode than the baseline
+    are not compared. Returns ``(code, path, baseline_ops, current_ops)``
+    tuples.
+    """
+    regressions = []
+    for code, paths in results.items():
+        for path, current in paths.items():
+            previous = baseline.get(code, {}).get(path)
+            if not previous or not previous.get("ops_per_sec"):
+                continue
+            if previous.get("mode") != current.get("mode"):
+                continue
+            if current["ops_per_sec"] < previous["ops_per_sec"] * (1 - threshold):
+                regressions.append((code, path, previous["ops_per_sec"], current["ops_per_sec"]))
+    return regressions
@@ -0,0 +1,131 @@
+"""
+Memoization of equation results.
+
+Every function behind ``Equation.function_path`` is pure, so a result only
+depends on ``(equation code, function path, equation version, inputs)``;
+the path is part of the key so repointing an equation at another function
+of the same module does not serve the old function's results. Results are kept in
+a small in-process LRU in front of the shared Django cache (django-redis in
+production). Both tiers store the JSON text of the result, so callers always
+get a fresh object back.
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "ALIAS": "default",
+    "MAX_SIZE": 4096,
+    "TIMEOUT": 60 * 60 * 24,
+    "KEY_PREFIX": "nutrition:result",
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "NUTRITION_RESULT_CACHE", {})}
+
+
+def canonical_inputs(inputs):
+    """Serialize inputs so that equal payloads give equal text."""
+    return json.dumps(inputs, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class ResultCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.local_hits = 0
+            self.shared_hits = 0
+            self.misses = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self):
+        config = _config()
+        with self._lock:
+            local_hits, shared_hits, misses = self.local_hits, self.shared_hits, self.misses
+            local_size = len(self._local)
+        lookups = local_hits + shared_hits + misses
+        hits = local_hits + shared_hits
+        return {
+            "enabled": config["ENABLED"],
+            "local_hits": local_hits,
+            "shared_hits": shared_hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "local_size": local_size,
+            "local_max_size": config["MAX_SIZE"],
+        }
+
+    def key(self, entry, inputs):
+        digest = hashlib.sha256(canonical_inputs(inputs).encode()).hexdigest()
+        return f"{_config()['KEY_PREFIX']}:{entry.code}:{entry.function_path}:{entry.version}:{digest}"
+
+    def _get_local(self, key):
+        with self._lock:
+            try:
+                self._local.move_to_end(key)
+                return self._local[key]
+            except KeyError:
+                return None
+
+    def _set_local(self, key, value, max_size):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > max_size:
+                self._local.popitem(last=False)
+
+    def evaluate(self, entry, inputs):
+        """Return ``entry.func(**inputs)``, from cache when possible."""
+        config = _config()
+        if not config["ENABLED"]:
+            return entry.func(**inputs)
+
+        key = self.key(entry, inputs)
+        cached = self._get_local(key)
+        if cached is not None:
+            self._count("local_hits")
+            return json.loads(cached)
+
+        shared = caches[config["ALIAS"]]
+        try:
+            cached = shared.get(key)
+        except Exception:
+            logger.warning("Shared result cache unavailable", exc_info=True)
+            cached = None
+        if cached is not None:
+            self._count("shared_hits")
+            self._set_local(key, cached, config["MAX_SIZE"])
+            return json.loads(cached)
+
+        self._count("misses")
+        result = entry.func(**inputs)
+        text = json.dumps(result)
+        self._set_local(key, text, config["MAX_SIZE"])
+        try:
+            shared.set(key, text, config["TIMEOUT"])
+        except Exception:
+            logger.warning("Shared result cache unavailable", exc_info=True)
+        return result
+
+
+result_cache = ResultCache()
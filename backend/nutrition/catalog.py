@@ -0,0 +1,191 @@
+"""
+Versioned snapshots of the drug catalog.
+
+Every save or delete of a ``Drug`` or ``DrugCategory`` appends a
+``DrugCatalogChange`` row (see ``nutrition.signals``); the id of the newest
+row is the catalog version. The full category -> drugs JSON for a version
+is serialized once, compressed with gzip (and brotli when installed) and
+kept in the cache under that version, so serving it is a cache read. A
+client that already holds version N can ask for the changes since N
+instead of the whole catalog.
+"""
+import gzip
+import json
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+KEY_PREFIX = "nutrition:catalog"
+VERSION_KEY = f"{KEY_PREFIX}:version"
+# The version is re-read from the database at least this often, which
+# bounds staleness if an invalidation is lost between processes.
+VERSION_TIMEOUT = 30
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+# In-process indexes compare their version with the catalog's at most
+# this often (seconds).
+INDEX_CHECK_INTERVAL = 2
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        from .models import DrugCatalogChange
+
+        version = DrugCatalogChange.objects.aggregate(v=Max("id"))["v"] or 0
+        cache.set(VERSION_KEY, version, VERSION_TIMEOUT)
+    return version
+
+
+class CatalogIndex:
+    """
+    An in-process structure built from the catalog by ``build()``.
+
+    It remembers the catalog version it was built at and is rebuilt once
+    the version moves, so imports and edits made by other processes (a
+    management command, another worker) reach this one within
+    ``INDEX_CHECK_INTERVAL`` seconds. ``invalidate()`` drops it at once,
+    for this process only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = None
+        self._checked_at = 0.0
+
+    def build(self):
+        raise NotImplementedError
+
+    def _loaded(self):
+        built = self._built
+        if built is not None and time.monotonic() - self._checked_at < INDEX_CHECK_INTERVAL:
+            return built[1]
+        with self._lock:
+            # Read before building: a change made meanwhile moves it again.
+            version = current_version()
+            self._checked_at = time.monotonic()
+            if self._built is None or self._built[0] != version:
+                self._built = (version, self.build())
+            return self._built[1]
+
+    def invalidate(self):
+        with self._lock:
+            self._built = None
+
+
+def record_change(kind, object_id, deleted=False):
+    """Bump the catalog version for one changed drug or category."""
+    record_changes([(kind, object_id, deleted)])
+
+
+def record_changes(changes):
+    """Bump the catalog version once for many ``(kind, id, deleted)`` changes."""
+    from .models import DrugCatalogChange
+
+    DrugCatalogChange.objects.bulk_create(
+        DrugCatalogChange(kind=kind, object_id=object_id, deleted=deleted)
+        for kind, object_id, deleted in changes
+    )
+    transaction.on_commit(lambda: cache.delete(VERSION_KEY))
+
+
+def last_modified(drug):
+    """Timestamp of the last recorded change to a drug or its category."""
+    from .models import DrugCatalogChange
+
+    changed = DrugCatalogChange.objects.filter(
+        Q(kind="drug", object_id=drug.pk) | Q(kind="category", object_id=drug.category_id)
+    ).aggregate(at=Max("created_at"))["at"]
+    # Drugs loaded before changes were recorded count from now.
+    return int((changed or timezone.now()).timestamp())
+
+
+def encode(payload):
+    """``{encoding: body}`` for a JSON payload: identity, gzip and brotli."""
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    encoded = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+    if brotli is not None:
+        encoded["br"] = brotli.compress(body, quality=11)
+    return encoded
+
+
+def choose_encoding(accept_encoding, encoded):
+    """The best of brotli/gzip that the client accepts, else identity."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        params = params.strip()
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in encoded and accepted.get(encoding, 0) > 0:
+            return encoding
+    return "identity"
+
+
+def _cached(key, build):
+    encoded = cache.get(key)
+    if encoded is None:
+        encoded = encode(build())
+        cache.set(key, encoded, SNAPSHOT_TIMEOUT)
+    return encoded
+
+
+def snapshot(version):
+    from .models import DrugCategory
+    from .serializers import DrugCategorySerializer
+
+    def build():
+        categories = DrugCategory.objects.prefetch_related("drugs").order_by("id")
+        return {"version": version, "categories": DrugCategorySerializer(categories, many=True).data}
+
+    return _cached(f"{KEY_PREFIX}:snapshot:{version}", build)
+
+
+def delta(since_version, version):
+    """Categories and drugs changed between two versions, plus deleted ids."""
+    from .models import Drug, DrugCatalogChange, DrugCategory
+
+    def build():
+        latest = {}
+        changes = (
+            DrugCatalogChange.objects.filter(id__gt=since_version, id__lte=version)
+            .order_by("id").values_list("kind", "object_id", "deleted")
+        )
+        for kind, object_id, deleted in changes:
+            latest[kind, object_id] = deleted
+
+        def changed(kind):
+            return {pk for (k, pk), deleted in latest.items() if k == kind and not deleted}
+
+        categories = list(DrugCategory.objects.filter(id__in=changed("category")).order_by("id").values("id", "name"))
+        drugs = list(
+            Drug.objects.filter(id__in=changed("drug")).order_by("id")
+            .values("id", "category_id", "name", "drug_effect", "nutritional_implications")
+        )
+        # Rows changed and then deleted again count as deleted.
+        alive = {("category", c["id"]) for c in categories} | {("drug", d["id"]) for d in drugs}
+        deleted = {"categories": [], "drugs": []}
+        for (kind, pk) in sorted(latest):
+            if (kind, pk) not in alive:
+                deleted["categories" if kind == "category" else "drugs"].append(pk)
+        return {
+            "version": version,
+            "since_version": since_version,
+            "categories": categories,
+            "drugs": drugs,
+            "deleted": deleted,
+        }
+
+    return _cached(f"{KEY_PREFIX}:delta:{since_version}:{version}", build)
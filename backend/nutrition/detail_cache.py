@@ -0,0 +1,118 @@
+"""
+Cached drug monograph responses.
+
+``DrugDetailAPIView`` serves the rendered JSON of a drug from a small
+in-process tier in front of the shared Django cache (django-redis in
+production), so a hot monograph costs neither a query nor serialization.
+Entries are dropped when the drug or its category is saved or deleted (see
+``nutrition.signals``) and after bulk imports. Other processes only learn
+about an edit through the shared tier, so local entries expire after
+``LOCAL_TIMEOUT`` seconds, which bounds how stale they can be.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "ALIAS": "default",
+    "MAX_SIZE": 1024,
+    "LOCAL_TIMEOUT": 30,
+    "TIMEOUT": 60 * 60 * 24,
+    "KEY_PREFIX": "nutrition:drug",
+    # Cache-Control max-age sent to clients.
+    "MAX_AGE": 300,
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "NUTRITION_DRUG_DETAIL_CACHE", {})}
+
+
+class DrugDetailCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+
+    @property
+    def max_age(self):
+        return _config()["MAX_AGE"]
+
+    def key(self, drug_id):
+        return f"{_config()['KEY_PREFIX']}:{drug_id}"
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, key):
+        with self._lock:
+            try:
+                expires, entry = self._local[key]
+            except KeyError:
+                return None
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return entry
+
+    def _set_local(self, key, entry, config):
+        with self._lock:
+            self._local[key] = (time.monotonic() + config["LOCAL_TIMEOUT"], entry)
+            self._local.move_to_end(key)
+            while len(self._local) > config["MAX_SIZE"]:
+                self._local.popitem(last=False)
+
+    def get(self, drug_id, build):
+        """``(body, last_modified)`` for a drug; ``build()`` computes it on a miss."""
+        config = _config()
+        if not config["ENABLED"]:
+            return build()
+
+        key = self.key(drug_id)
+        entry = self._get_local(key)
+        if entry is not None:
+            return entry
+
+        shared = caches[config["ALIAS"]]
+        try:
+            entry = shared.get(key)
+        except Exception:
+            logger.warning("Shared drug cache unavailable", exc_info=True)
+        if entry is None:
+            entry = build()
+            try:
+                shared.set(key, entry, config["TIMEOUT"])
+            except Exception:
+                logger.warning("Shared drug cache unavailable", exc_info=True)
+        self._set_local(key, entry, config)
+        return entry
+
+    def invalidate(self, drug_ids):
+        """Drop the given drugs now and again once the current transaction commits."""
+        keys = [self.key(pk) for pk in drug_ids]
+        if not keys:
+            return
+
+        def drop():
+            with self._lock:
+                for key in keys:
+                    self._local.pop(key, None)
+            try:
+                caches[_config()["ALIAS"]].delete_many(keys)
+            except Exception:
+                logger.warning("Shared drug cache unavailable", exc_info=True)
+
+        drop()
+        transaction.on_commit(drop)
+
+
+drug_detail_cache = DrugDetailCache()
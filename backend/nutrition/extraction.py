@@ -0,0 +1,132 @@
+"""
+Structured flags extracted from the prose of a drug.
+
+``drug_effect`` and ``nutritional_implications`` mention nutrients ("binds
+Mg, Ca, Zn, Fe"), quantities ("contains 0.73 mEq of potassium"), foods to
+avoid ("avoid grapefruit") and administration rules ("take with food",
+"hold tube feeds"). The rules below turn them into ``DrugNutrientFlag`` rows,
+refreshed whenever a drug is saved or imported, so "every drug affecting
+potassium" is an index lookup on ``tag`` rather than a scan of the text.
+"""
+import re
+
+NUTRIENT, FOOD, ADMINISTRATION = "nutrient", "food", "administration"
+
+# tag -> (words matched case-insensitively, abbreviations matched as written)
+NUTRIENTS = {
+    "potassium": (["potassium"], ["K"]),
+    "sodium": (["sodium", "salt"], ["Na"]),
+    "magnesium": (["magnesium"], ["Mg"]),
+    "calcium": (["calcium"], ["Ca"]),
+    "zinc": (["zinc"], ["Zn"]),
+    "iron": (["iron"], ["Fe"]),
+    "copper": (["copper"], ["Cu"]),
+    "phosphorus": (["phosphorus", "phosphate"], []),
+    "folate": (["folate", "folic acid"], []),
+    "vitamin_a": (["vitamin a"], []),
+    "vitamin_b6": (["vitamin b6", "pyridoxine"], []),
+    "vitamin_b12": (["vitamin b12", "cobalamin"], []),
+    "niacin": (["niacin", "vitamin b3"], []),
+    "vitamin_c": (["vitamin c"], []),
+    "vitamin_d": (["vitamin d"], []),
+    "vitamin_e": (["vitamin e"], []),
+    "vitamin_k": (["vitamin k"], []),
+    "glucose": (["hypoglycemia", "hyperglycemia", "blood sugar"], []),
+    "lipids": (["cholesterol", "triglycerides", "lipids"], []),
+}
+
+RULES = [
+    (FOOD, "grapefruit", r"grapefruit"),
+    (FOOD, "alcohol", r"alcohol"),
+    (FOOD, "caffeine", r"caffeine"),
+    (FOOD, "tyramine", r"tyramine"),
+    (FOOD, "st_johns_wort", r"st\.? john'?s wort|\bSJW\b"),
+    (FOOD, "fish_oil", r"fish oil"),
+    (FOOD, "cranberry", r"cranberr"),
+    (FOOD, "licorice", r"licorice"),
+    (ADMINISTRATION, "take_with_food", r"take[^.;]{0,40}\bwith (?:food|a meal|meals|a full meal|a high-fat meal)"),
+    (ADMINISTRATION, "empty_stomach",
+     r"empty stomach|\d+ hours? before or \d+ hours? after (?:a )?(?:meal|food)"
+     r"|(?:\d+|an?|one|two) (?:hours?|minutes?|min) before (?:a |the first )?(?:meals?|food|eating|breakfast)"),
+    (ADMINISTRATION, "tube_feed_hold", r"hold (?:the )?tube feed|tube feed(?:ing)?s?[^.;]{0,40}\bhold"),
+    (ADMINISTRATION, "separate_from_minerals", r"\d+ hours? before or \d+ hours? after antacids|take supplements separately"),
+    (ADMINISTRATION, "hydration", r"hydration|\d+ oz (?:of )?(?:fluid|water)"),
+    (ADMINISTRATION, "probiotic", r"probiotic"),
+]
+
+
+def _nutrient_pattern(words, abbreviations):
+    parts = [rf"(?i:\b{re.escape(word)}\b)" for word in words]
+    parts += [rf"\b{re.escape(abbr)}\b" for abbr in abbreviations]
+    return re.compile("|".join(parts))
+
+
+NUTRIENT_RES = {tag: _nutrient_pattern(*names) for tag, names in NUTRIENTS.items()}
+
+# "vitamin K", "fat-soluble vitamins A, D, E, K", "vitamins B6 and B12":
+# tagged per vitamin and blanked out before the nutrient patterns run, so
+# the K is not read as potassium.
+VITAMIN_LIST_RE = re.compile(
+    r"\b(?i:vitamins?)\s+([A-K]\d{0,2}(?:\s*(?:,|/|&|\band\b|\bor\b)\s*(?:and\s+|or\s+)?[A-K]\d{0,2})*)\b"
+)
+VITAMIN_LETTER_RE = re.compile(r"[A-K]\d{0,2}")
+RULE_RES = [(kind, tag, re.compile(pattern, re.IGNORECASE)) for kind, tag, pattern in RULES]
+
+# "0.73 mEq of potassium", "125 mg Na"
+NUTRIENT_NAMES = {word: tag for tag, (words, _) in NUTRIENTS.items() for word in words}
+NUTRIENT_ABBREVIATIONS = {abbr: tag for tag, (_, abbrs) in NUTRIENTS.items() for abbr in abbrs}
+QUANTITY_RE = re.compile(
+    r"(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>mEq|mmol|mg|mcg|g)\s+(?:of\s+)?"
+    r"(?P<nutrient>" + "|".join(
+        [rf"(?i:{re.escape(word)})" for word in sorted(NUTRIENT_NAMES, key=len, reverse=True)]
+        + [re.escape(abbr) for abbr in NUTRIENT_ABBREVIATIONS]
+    ) + r")\b"
+)
+
+
+def extract(*texts):
+    """Sorted ``(kind, tag, quantity, unit)`` flags found in the given texts."""
+    text = "\n".join(t for t in texts if t)
+    flags = set()
+    quantified = set()
+    for match in QUANTITY_RE.finditer(text):
+        nutrient = match["nutrient"]
+        tag = NUTRIENT_ABBREVIATIONS.get(nutrient) or NUTRIENT_NAMES[nutrient.lower()]
+        flags.add((NUTRIENT, tag, float(match["amount"]), match["unit"]))
+        quantified.add(tag)
+    vitamins = set()
+    for match in VITAMIN_LIST_RE.finditer(text):
+        for letter in VITAMIN_LETTER_RE.findall(match[1]):
+            tag = NUTRIENT_NAMES.get(f"vitamin {letter.lower()}")
+            if tag:
+                vitamins.add(tag)
+    unlisted = VITAMIN_LIST_RE.sub(" ", text)
+    for tag, pattern in NUTRIENT_RES.items():
+        if tag not in quantified and (tag in vitamins or pattern.search(unlisted)):
+            flags.add((NUTRIENT, tag, None, ""))
+    for kind, tag, pattern in RULE_RES:
+        if pattern.search(text):
+            flags.add((kind, tag, None, ""))
+    return sorted(flags, key=lambda flag: (flag[0], flag[1], flag[2] or 0))
+
+
+def refresh_flags(drugs):
+    """Replace the stored flags of ``drugs`` with freshly extracted ones.
+
+    Only drugs whose flags differ are rewritten; returns their ids.
+    """
+    from .models import DrugNutrientFlag
+
+    fresh = {drug.pk: set(extract(drug.drug_effect, drug.nutritional_implications)) for drug in drugs}
+    stored = {pk: set() for pk in fresh}
+    rows = DrugNutrientFlag.objects.filter(drug__in=list(fresh)).values_list("drug_id", "kind", "tag", "quantity", "unit")
+    for pk, *flag in rows:
+        stored[pk].add(tuple(flag))
+    changed = [pk for pk, flags in fresh.items() if flags != stored[pk]]
+    DrugNutrientFlag.objects.filter(drug__in=changed).delete()
+    DrugNutrientFlag.objects.bulk_create(
+        DrugNutrientFlag(drug_id=pk, kind=kind, tag=tag, quantity=quantity, unit=unit)
+        for pk in changed
+        for kind, tag, quantity, unit in sorted(fresh[pk], key=lambda flag: (flag[0], flag[1], flag[2] or 0))
+    )
+    return changed
@@ -1,11 +1,37 @@
 from django_filters import rest_framework as filters
-from .models import DrugCategory
+from .models import Drug, DrugCategory, Calculation
 
 class DrugCategoryFilter(filters.FilterSet):
     category_name = filters.CharFilter(field_name='name', lookup_expr='icontains')
-    drug_name = filters.CharFilter(field_name='drugs__name', lookup_expr='icontains')
-    drug_id = filters.NumberFilter(field_name='drugs__id')
+    drug_name = filters.CharFilter(field_name='drugs__name', lookup_expr='icontains', distinct=True)
+    drug_id = filters.NumberFilter(field_name='drugs__id', distinct=True)
+    flag = filters.CharFilter(field_name='drugs__flags__tag', distinct=True)
     
     class Meta:
         model = DrugCategory
-        fields = ['category_name', 'drug_name', 'drug_id']
\ No newline at end of file
+        fields = ['category_name', 'drug_name', 'drug_id', 'flag']
+
+
+class DrugFilter(filters.FilterSet):
+    category = filters.NumberFilter(field_name='category')
+    category_name = filters.CharFilter(field_name='category__name', lookup_expr='icontains')
+    drug_name = filters.CharFilter(field_name='name', lookup_expr='icontains')
+    drug_id = filters.NumberFilter(field_name='id')
+    flag = filters.CharFilter(field_name='flags__tag', distinct=True)
+    flag_kind = filters.CharFilter(field_name='flags__kind', distinct=True)
+
+    class Meta:
+        model = Drug
+        fields = ['category', 'category_name', 'drug_name', 'drug_id', 'flag', 'flag_kind']
+
+
+class CalculationFilter(filters.FilterSet):
+    equation = filters.NumberFilter(field_name='equation')
+    equation_code = filters.CharFilter(field_name='equation__code')
+    created_after = filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+    owner = filters.NumberFilter(field_name='user')
+
+    class Meta:
+        model = Calculation
+        fields = ['equation', 'equation_code', 'created_after', 'created_before', 'owner']
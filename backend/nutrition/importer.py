@@ -0,0 +1,150 @@
+"""
+Bulk, idempotent import of the drug catalog from TSV/CSV.
+
+Rows follow the layout of the ``drug_data`` sheet: a category is named on
+its first row and left blank on the drugs that follow it. Files are read
+row by row, categories and the existing ``(category, name)`` keys are held
+in memory, and only new or changed drugs are written, with
+``bulk_create``/``bulk_update`` in batches inside one transaction.
+Re-importing the same file changes nothing.
+
+Bulk operations do not send model signals, so the nutrient flags, the
+catalog version and the cached drug details are updated here (see
+``nutrition.signals``). The in-memory drug indexes of every process,
+including web workers when this runs as a management command, rebuild
+themselves once they see the new catalog version (``catalog.CatalogIndex``).
+"""
+import csv
+
+from django.db import transaction
+
+from . import catalog, extraction
+from .detail_cache import drug_detail_cache
+from .models import Drug, DrugCategory
+
+# Accepted headers for each column, compared case-insensitively.
+COLUMNS = {
+    "category": ("drug category", "category"),
+    "name": ("drug", "name", "drug name"),
+    "drug_effect": ("drug effect", "drug_effect"),
+    "nutritional_implications": (
+        "nutritional implications and cautions",
+        "nutritional implications",
+        "nutritional_implications",
+    ),
+}
+TEXT_FIELDS = ("drug_effect", "nutritional_implications")
+
+BATCH_SIZE = 1000
+
+
+def delimiter_for(path):
+    return "," if str(path).lower().endswith(".csv") else "\t"
+
+
+def read_rows(lines, delimiter="\t"):
+    """Yield ``(category, name, drug_effect, nutritional_implications)`` per drug.
+
+    A blank category carries the previous one forward; rows without a
+    category yet or without a drug name are skipped.
+    """
+    reader = csv.reader(lines, delimiter=delimiter)
+    header = [column.strip().lower() for column in next(reader, [])]
+    positions = {}
+    for field, names in COLUMNS.items():
+        for name in names:
+            if name in header:
+                positions[field] = header.index(name)
+                break
+    missing = {"category", "name"} - positions.keys()
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(sorted(missing))}")
+
+    def cell(row, field):
+        position = positions.get(field)
+        if position is None or position >= len(row):
+            return ""
+        return row[position].strip()
+
+    category = ""
+    for row in reader:
+        category = cell(row, "category") or category
+        name = cell(row, "name")
+        if category and name:
+            yield category, name, cell(row, "drug_effect"), cell(row, "nutritional_implications")
+
+
+def import_drugs(rows, batch_size=BATCH_SIZE, dry_run=False):
+    """Create or update drugs from ``read_rows`` output; return the counts.
+
+    With ``dry_run`` the work is done and then rolled back.
+    """
+    counts = {"categories_created": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+    changes = []
+
+    with transaction.atomic():
+        categories = dict(DrugCategory.objects.values_list("name", "id"))
+        # (category_id, name) -> Drug holding only the compared fields.
+        existing = {
+            (drug.category_id, drug.name): drug
+            for drug in Drug.objects.only("id", "category_id", "name", *TEXT_FIELDS)
+        }
+        to_create, to_update = [], {}
+
+        def flush():
+            if to_create:
+                Drug.objects.bulk_create(to_create, batch_size=batch_size)
+            if to_update:
+                Drug.objects.bulk_update(to_update.values(), TEXT_FIELDS, batch_size=batch_size)
+            written = to_create + list(to_update.values())
+            extraction.refresh_flags(written)
+            changes.extend(("drug", drug.pk, False) for drug in written)
+            to_create.clear()
+            to_update.clear()
+
+        for category_name, name, drug_effect, nutritional_implications in rows:
+            category_id = categories.get(category_name)
+            if category_id is None:
+                category = DrugCategory.objects.bulk_create([DrugCategory(name=category_name)])[0]
+                category_id = categories[category_name] = category.pk
+                changes.append(("category", category_id, False))
+                counts["categories_created"] += 1
+
+            key = (category_id, name)
+            drug = existing.get(key)
+            if drug is None:
+                drug = existing[key] = Drug(
+                    category_id=category_id,
+                    name=name,
+                    drug_effect=drug_effect,
+                    nutritional_implications=nutritional_implications,
+                )
+                to_create.append(drug)
+                counts["inserted"] += 1
+            elif (drug.drug_effect or "", drug.nutritional_implications or "") != (drug_effect, nutritional_implications):
+                drug.drug_effect = drug_effect
+                drug.nutritional_implications = nutritional_implications
+                # A drug repeated in the file before its insert is flushed
+                # is simply created with the last values.
+                if drug.pk is not None:
+                    if drug.pk not in to_update:
+                        counts["updated"] += 1
+                    to_update[drug.pk] = drug
+            elif drug.pk is not None and drug.pk not in to_update:
+                counts["unchanged"] += 1
+
+            if len(to_create) + len(to_update) >= batch_size:
+                flush()
+        flush()
+
+        if changes:
+            catalog.record_changes(changes)
+            drug_detail_cache.invalidate(pk for kind, pk, deleted in changes if kind == "drug")
+        if dry_run:
+            transaction.set_rollback(True)
+    return counts
+
+
+def import_file(path, delimiter=None, encoding="utf-8-sig", **options):
+    with open(path, newline="", encoding=encoding) as handle:
+        return import_drugs(read_rows(handle, delimiter or delimiter_for(path)), **options)
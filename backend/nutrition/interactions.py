@@ -0,0 +1,154 @@
+"""
+Drug–nutrient screening of free-text medication lists.
+
+``clients.Medication.name`` is whatever the clinician typed ("Augmentin
+625mg tab", "metformin ER 500 mg"). Names are cleaned of strengths and
+dosage forms and looked up in an alias index built from the drug catalog:
+each drug is known by its full name, its generic name, every brand name in
+parentheses and, as a weaker match, each component of a combination. The
+index lives in memory and is rebuilt when the catalog version moves (see
+``catalog.CatalogIndex``), so screening a whole caseload costs one query
+for the medications and one for the matched drugs.
+"""
+import re
+
+from .autocomplete import BRAND_RE, normalize
+from .catalog import CatalogIndex
+
+# Strengths such as "500 mg", "0.5mcg", "250 mg/5 mL", "10%".
+STRENGTH_RE = re.compile(
+    r"\b\d+(?:[.,]\d+)?\s*(?:mg|mcg|µg|ug|g|gm|ml|l|iu|units?|meq|mmol|%)?(?:\s*/\s*\d*(?:[.,]\d+)?\s*(?:ml|l|tab|dose))?\b",
+    re.IGNORECASE,
+)
+# Dosage forms, release modifiers and routes that never name a drug.
+NOISE_WORDS = {
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules",
+    "syrup", "susp", "suspension", "solution", "sol", "inj", "injection", "amp",
+    "drops", "cream", "ointment", "patch", "inhaler", "spray", "sachet",
+    "er", "xr", "sr", "cr", "xl", "la", "dr", "ec", "od", "bid", "tid", "qid", "prn",
+    "po", "iv", "im", "sc", "oral", "daily", "mg", "mcg", "ml", "iu",
+}
+
+# Alias strength, best first.
+EXACT, COMPONENT = 0, 1
+
+# Distinct medication names remembered between index rebuilds.
+MAX_RESOLVED = 20000
+
+
+def clean(name):
+    """Medication name with strengths, dosage forms and punctuation removed."""
+    words = normalize(STRENGTH_RE.sub(" ", name or "")).split()
+    return " ".join(word for word in words if word not in NOISE_WORDS)
+
+
+def drug_aliases(name):
+    """``(alias, strength)`` pairs a catalog drug name is known by."""
+    generic = BRAND_RE.sub(" ", name)
+    aliases = {(clean(name), EXACT), (clean(generic), EXACT)}
+    for brand in BRAND_RE.findall(name):
+        aliases.add((clean(brand), EXACT))
+    components = [clean(part) for part in re.split(r"[/+]| and ", generic)]
+    if len(components) > 1:
+        aliases.update((component, COMPONENT) for component in components)
+    return {(alias, strength) for alias, strength in aliases if alias}
+
+
+def candidates(cleaned):
+    """Phrases of a cleaned medication name to try, longest first."""
+    words = cleaned.split()
+    for size in range(len(words), 0, -1):
+        for start in range(len(words) - size + 1):
+            yield " ".join(words[start:start + size])
+
+
+class DrugAliasIndex(CatalogIndex):
+    def build(self):
+        from .models import Drug
+
+        aliases = {}
+        for pk, name in Drug.objects.values_list("id", "name"):
+            for alias, strength in drug_aliases(name):
+                best = aliases.get(alias)
+                # Exact aliases win over combination components; ties keep all.
+                if best is None or strength < best[0]:
+                    aliases[alias] = (strength, {pk})
+                elif strength == best[0]:
+                    best[1].add(pk)
+        aliases = {alias: frozenset(pks) for alias, (strength, pks) in aliases.items()}
+        # Resolved medication names, filled as they are looked up.
+        return aliases, {}
+
+    def resolve(self, medication_name):
+        """``(matched alias, drug ids)`` for a free-text medication name."""
+        aliases, resolved = self._loaded()
+        cleaned = clean(medication_name)
+        try:
+            return resolved[cleaned]
+        except KeyError:
+            pass
+        match = None, frozenset()
+        for phrase in candidates(cleaned):
+            if phrase in aliases:
+                match = phrase, aliases[phrase]
+                break
+        if len(resolved) < MAX_RESOLVED:
+            resolved[cleaned] = match
+        return match
+
+
+alias_index = DrugAliasIndex()
+
+
+def screen(medications_by_owner):
+    """Match medications and aggregate the nutritional implications.
+
+    ``medications_by_owner`` maps any key (client or follow-up id) to
+    ``(id, name, dosage)`` tuples. Returns the same keys mapped to
+    ``{"medications": [...], "unmatched": [...], "implications": [...]}``.
+    """
+    from .models import Drug
+
+    matches, drug_ids = {}, set()
+    for meds in medications_by_owner.values():
+        for med_id, name, dosage in meds:
+            alias, pks = alias_index.resolve(name or "")
+            matches[med_id] = (alias, sorted(pks))
+            drug_ids.update(pks)
+
+    drugs = {
+        drug.id: drug
+        for drug in Drug.objects.filter(id__in=drug_ids).select_related("category").defer("search_vector")
+    }
+
+    report = {}
+    for owner, meds in medications_by_owner.items():
+        medications, unmatched, implications = [], [], {}
+        for med_id, name, dosage in meds:
+            alias, pks = matches[med_id]
+            matched = [drugs[pk] for pk in pks if pk in drugs]
+            medications.append({
+                "id": med_id,
+                "name": name,
+                "dosage": dosage,
+                "matched_alias": alias,
+                "drugs": [{"id": drug.id, "name": drug.name} for drug in matched],
+            })
+            if not matched:
+                unmatched.append(name)
+            for drug in matched:
+                entry = implications.setdefault(drug.id, {
+                    "drug_id": drug.id,
+                    "drug": drug.name,
+                    "category": drug.category.name,
+                    "drug_effect": drug.drug_effect,
+                    "nutritional_implications": drug.nutritional_implications,
+                    "medications": [],
+                })
+                entry["medications"].append(med_id)
+        report[owner] = {
+            "medications": medications,
+            "unmatched": unmatched,
+            "implications": list(implications.values()),
+        }
+    return report
@@ -0,0 +1,143 @@
+import io
+import json
+import os
+import platform
+import sys
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from nutrition import benchmarks, registry
+from nutrition.cache import result_cache
+from nutrition.writer import calculation_writer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every seeded equation (scalar, vectorized, batch endpoint and "
+        "calculation create endpoint) against a throwaway test database, and "
+        "fail if any path is slower than the saved baseline by more than --threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--baseline", default=os.path.join(settings.BASE_DIR, "benchmarks", "equations.json"),
+            help="Baseline JSON file to compare against (and to write with --save).",
+        )
+        parser.add_argument("--save", action="store_true", help="Write this run as the new baseline.")
+        parser.add_argument("--output", help="Also write this run's results to this file.")
+        parser.add_argument(
+            "--threshold", type=float, default=0.25,
+            help="Allowed drop in ops/sec before a path counts as regressed (fraction).",
+        )
+        parser.add_argument("--rows", type=int, default=2000, help="Generated inputs per equation.")
+        parser.add_argument(
+            "--api-rows", type=int, default=100,
+            help="Rows sent through the API paths per equation (0 skips them).",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Repeats of the vectorized and batch paths.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--with-cache", action="store_true",
+                            help="Leave the equation result cache on (off by default).")
+        parser.add_argument("equations", nargs="*", help="Only benchmark these equation codes.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            cache_config = {"ENABLED": options["with_cache"]}
+            with override_settings(NUTRITION_RESULT_CACHE=cache_config):
+                results = self.run_benchmarks(options)
+        finally:
+            calculation_writer.flush()
+            result_cache.clear()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "python": sys.version.split()[0],
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "rows": options["rows"],
+                "api_rows": options["api_rows"],
+                "repeat": options["repeat"],
+                "seed": options["seed"],
+                "result_cache": options["with_cache"],
+                "api_create_writes": "durable",
+            },
+            "results": results,
+        }
+        if options["output"]:
+            self.write(options["output"], report)
+
+        baseline = None
+        if os.path.exists(options["baseline"]):
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+        if options["save"]:
+            self.write(options["baseline"], report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+        if baseline is None:
+            if not options["save"]:
+                self.stdout.write(f"No baseline at {options['baseline']}; run with --save to record one.")
+            return
+
+        regressions = benchmarks.compare(results, baseline["results"], options["threshold"])
+        for code, path, before, after in regressions:
+            self.stderr.write(
+                f"{code} [{path}]: {before:.1f} -> {after:.1f} ops/sec "
+                f"({(after - before) / before:+.0%})"
+            )
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} path(s) regressed by more than {options['threshold']:.0%}"
+            )
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def run_benchmarks(self, options):
+        call_command("equations", stdout=io.StringIO())
+        registry.invalidate()
+        if options["equations"]:
+            unknown = set(options["equations"]) - {e.code for e in registry.all_equations()}
+            if unknown:
+                raise CommandError(f"Unknown equation code(s): {', '.join(sorted(unknown))}")
+
+        user = get_user_model().objects.create(email="benchmark@example.com")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        self.stdout.write(f"{'equation':<45} {'path':<11} {'ops/sec':>12} {'p50 us':>10} {'p99 us':>10}")
+
+        def log(code, paths):
+            for path, stats in paths.items():
+                self.stdout.write(
+                    f"{code:<45} {path:<11} {stats['ops_per_sec']:>12.1f} "
+                    f"{stats['p50_us']:>10.2f} {stats['p99_us']:>10.2f}"
+                )
+
+        return benchmarks.run(
+            client,
+            codes=set(options["equations"]),
+            rows=options["rows"],
+            api_rows=options["api_rows"],
+            repeat=options["repeat"],
+            seed=options["seed"],
+            log=log,
+        )
+
+    def write(self, path, report):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from nutrition import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the monthly partitions of nutrition_calculation: "
+        "'ensure' creates upcoming months, 'archive' moves old months to "
+        "gzipped JSONL files and drops them, 'list' shows what exists."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["ensure", "archive", "list"])
+        parser.add_argument(
+            "--months-ahead", type=int, default=3,
+            help="ensure: how many months after the current one to create.",
+        )
+        parser.add_argument(
+            "--keep-months", type=int, default=12,
+            help="archive: months (including the current one) that stay in the database.",
+        )
+        parser.add_argument(
+            "--output-dir", default=getattr(settings, "CALCULATION_ARCHIVE_DIR", None),
+            help="archive: directory for the .jsonl.gz files.",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Calculation partitioning requires PostgreSQL.")
+        with connection.cursor() as cursor:
+            if not partitions.is_partitioned(cursor):
+                raise CommandError("nutrition_calculation is not partitioned; run migrate first.")
+
+        this_month = partitions.month_start(timezone.now())
+        getattr(self, f"handle_{options['action']}")(this_month, **options)
+
+    def handle_list(self, this_month, **options):
+        with connection.cursor() as cursor:
+            for name in partitions.list_partitions(cursor):
+                cursor.execute(f"SELECT count(*) FROM {name}")
+                self.stdout.write(f"{name}\t{cursor.fetchone()[0]} rows")
+
+    def handle_ensure(self, this_month, months_ahead, dry_run, **options):
+        last = partitions.add_months(this_month, months_ahead)
+        if dry_run:
+            self.stdout.write(f"Would ensure partitions up to {partitions.partition_name(last)}")
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            created = partitions.ensure_partitions(cursor, this_month, last)
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partition(s) created"))
+
+    def handle_archive(self, this_month, keep_months, output_dir, dry_run, **options):
+        if keep_months < 1:
+            raise CommandError("--keep-months must be at least 1.")
+        if not output_dir:
+            raise CommandError("Set CALCULATION_ARCHIVE_DIR or pass --output-dir.")
+        cutoff = partitions.add_months(this_month, -(keep_months - 1))
+        with connection.cursor() as cursor:
+            cold = [
+                name for name in partitions.list_partitions(cursor)
+                if partitions.partition_month(name) < cutoff
+            ]
+        if not cold:
+            self.stdout.write("Nothing to archive")
+            return
+        for name in cold:
+            if dry_run:
+                self.stdout.write(f"Would archive {name}")
+                continue
+            path, count = partitions.archive_partition(connection, name, output_dir)
+            self.stdout.write(f"Archived {name}: {count} rows -> {path}")
+        self.stdout.write(self.style.SUCCESS("Archive complete"))
@@ -1,7 +1,6 @@
 # management/commands/import_drug_data.py
-import csv
 from django.core.management.base import BaseCommand
-from nutrition.models import DrugCategory, Drug
+from nutrition.importer import import_drugs, read_rows
 from io import StringIO
 
 class Command(BaseCommand):
@@ -286,40 +285,8 @@ Selected Immunosuppressants	 tacrolimus (Prograf, Envarsus XR)	Inhibits calcineu
 	sirolimus (Rapamune)	mTOR inhibitor that halts cell-cycle progression. Antiproliferative. Causes hypercholesterolemia, increased blood sugars, stomatitis, diarrhea, and constipation. Impairs wound healing.	Avoid grapefruit. Check lipids and blood sugars at regular intervals.
 """  # Paste your CSV data
         
-        # Use StringIO to treat the string as a file
-        csv_file = StringIO(csv_data)
-        reader = csv.DictReader(csv_file, delimiter='\t')
-        
-        current_category = None
-        
-        for row in reader:
-            # Check if this row has a category (first column has value)
-            if row['Drug Category']:
-                current_category_name = row['Drug Category'].strip()
-                current_category, created = DrugCategory.objects.get_or_create(
-                    name=current_category_name
-                )
-                if created:
-                    self.stdout.write(f"Created category: {current_category_name}")
-            
-            # Only create drug if we have a category and drug name
-            if current_category and row['Drug']:
-                drug_name = row['Drug'].strip()
-                drug_effect = row['Drug Effect'].strip() if row['Drug Effect'] else ''
-                nutritional_implications = row['Nutritional Implications and Cautions'].strip() if row['Nutritional Implications and Cautions'] else ''
-                
-                drug, created = Drug.objects.get_or_create(
-                    category=current_category,
-                    name=drug_name,
-                    defaults={
-                        'drug_effect': drug_effect,
-                        'nutritional_implications': nutritional_implications
-                    }
-                )
-                
-                if created:
-                    self.stdout.write(f"Created drug: {drug_name}")
-                else:
-                    self.stdout.write(f"Drug already exists: {drug_name}")
-        
-        self.stdout.write(self.style.SUCCESS('Successfully imported drug data'))
\ No newline at end of file
+        counts = import_drugs(read_rows(StringIO(csv_data), delimiter='\t'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['inserted']} drugs created, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['categories_created']} categories created"
+        ))
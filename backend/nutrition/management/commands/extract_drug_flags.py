@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from nutrition import catalog
+from nutrition.detail_cache import drug_detail_cache
+from nutrition.extraction import refresh_flags
+from nutrition.models import Drug, DrugNutrientFlag
+
+
+class Command(BaseCommand):
+    help = "Re-extract the nutrient flags of every drug, e.g. after the extraction rules change."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        drugs = Drug.objects.only("id", "drug_effect", "nutritional_implications").order_by("id")
+        changed = []
+        with transaction.atomic():
+            batch = []
+            for drug in drugs.iterator(chunk_size=batch_size):
+                batch.append(drug)
+                if len(batch) >= batch_size:
+                    changed += refresh_flags(batch)
+                    batch = []
+            changed += refresh_flags(batch)
+            # Flags are part of the drug detail; bulk writes send no signals.
+            if changed:
+                catalog.record_changes(("drug", pk, False) for pk in changed)
+                drug_detail_cache.invalidate(changed)
+        self.stdout.write(self.style.SUCCESS(
+            f"{DrugNutrientFlag.objects.count()} flags extracted, {len(changed)} drug(s) changed"
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from nutrition import importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Import or refresh the drug catalog from TSV/CSV files. New drugs are "
+        "inserted, changed effects/implications updated, identical rows left alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="TSV (.tsv/.txt) or CSV (.csv) files.")
+        parser.add_argument(
+            "--delimiter",
+            help="Column delimiter; by default a tab, or a comma for .csv files.",
+        )
+        parser.add_argument("--encoding", default="utf-8-sig")
+        parser.add_argument("--batch-size", type=int, default=importer.BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes and roll them back.")
+
+    def handle(self, *args, paths, delimiter, encoding, batch_size, dry_run, **options):
+        if delimiter == "\\t":
+            delimiter = "\t"
+        for path in paths:
+            try:
+                counts = importer.import_file(
+                    path, delimiter=delimiter, encoding=encoding,
+                    batch_size=batch_size, dry_run=dry_run,
+                )
+            except (OSError, UnicodeDecodeError, ValueError) as exc:
+                raise CommandError(f"{path}: {exc}")
+            summary = ", ".join(f"{value} {key.replace('_', ' ')}" for key, value in counts.items())
+            self.stdout.write(self.style.SUCCESS(f"{path}: {summary}{' (dry run)' if dry_run else ''}"))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def assign_single_user(apps, schema_editor):
+    # Calculations saved before this migration have no owner, and nothing
+    # on the row says who ran them. On a single-user install they can only
+    # be that user's; otherwise they stay unowned and only staff see them
+    # (see CalculationViewSet.get_queryset).
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Calculation = apps.get_model('nutrition', 'Calculation')
+    users = list(User.objects.values_list('id', flat=True)[:2])
+    if len(users) == 1:
+        Calculation.objects.filter(user__isnull=True).update(user_id=users[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0003_categoryequations_equation_category'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculation',
+            name='user',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='calculations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(assign_single_user, migrations.RunPython.noop),
+        # calc_equation_created_idx below starts with equation_id, so the
+        # FK's own single-column index is redundant.
+        migrations.AlterField(
+            model_name='calculation',
+            name='equation',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='nutrition.equation'),
+        ),
+        migrations.AddIndex(
+            model_name='calculation',
+            index=models.Index(fields=['-created_at', '-id'], name='calc_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calculation',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='calc_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calculation',
+            index=models.Index(fields=['equation', '-created_at', '-id'], name='calc_equation_created_idx'),
+        ),
+    ]
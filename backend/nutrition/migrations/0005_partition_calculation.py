@@ -0,0 +1,103 @@
+"""
+Convert nutrition_calculation into a table range-partitioned by month on
+created_at (PostgreSQL only; other backends keep the plain table).
+
+PostgreSQL requires the partition key in the primary key, so the table's
+primary key becomes (id, created_at); ids still come from one sequence and
+stay unique. Django's model state is unchanged.
+"""
+import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+CREATE_PARTITIONED = """
+ALTER TABLE nutrition_calculation RENAME TO nutrition_calculation_legacy;
+CREATE SEQUENCE nutrition_calculation_part_id_seq;
+CREATE TABLE nutrition_calculation (
+    id bigint NOT NULL DEFAULT nextval('nutrition_calculation_part_id_seq'),
+    inputs jsonb NOT NULL,
+    result jsonb NULL,
+    created_at timestamp with time zone NOT NULL,
+    equation_id bigint NOT NULL
+        REFERENCES nutrition_equation (id) DEFERRABLE INITIALLY DEFERRED,
+    user_id bigint NULL
+        REFERENCES users_customuser (id) DEFERRABLE INITIALLY DEFERRED,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE nutrition_calculation_part_id_seq OWNED BY nutrition_calculation.id;
+CREATE TABLE nutrition_calculation_default PARTITION OF nutrition_calculation DEFAULT;
+"""
+
+COPY_AND_SWAP = """
+INSERT INTO nutrition_calculation (id, inputs, result, created_at, equation_id, user_id)
+SELECT id, inputs, result, created_at, equation_id, user_id FROM nutrition_calculation_legacy;
+SET CONSTRAINTS ALL IMMEDIATE;
+SELECT setval('nutrition_calculation_part_id_seq',
+              COALESCE((SELECT max(id) FROM nutrition_calculation), 0) + 1, false);
+DROP TABLE nutrition_calculation_legacy;
+ALTER SEQUENCE nutrition_calculation_part_id_seq RENAME TO nutrition_calculation_id_seq;
+CREATE INDEX calc_created_id_idx ON nutrition_calculation (created_at DESC, id DESC);
+CREATE INDEX calc_user_created_idx ON nutrition_calculation (user_id, created_at DESC, id DESC);
+CREATE INDEX calc_equation_created_idx ON nutrition_calculation (equation_id, created_at DESC, id DESC);
+"""
+
+
+# Frozen copies of the nutrition.partitions helpers this migration needs,
+# so later edits to that module cannot change what it does. The DEFAULT
+# partition is still empty here, so no rows need moving out of it.
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'nutrition_calculation'")
+    row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def create_monthly_partitions(cursor, first_month, last_month):
+    month = month_start(first_month)
+    while month <= last_month:
+        start, end = month.isoformat(), add_months(month, 1).isoformat()
+        cursor.execute(
+            f"CREATE TABLE nutrition_calculation_y{month.year:04d}m{month.month:02d} "
+            f"PARTITION OF nutrition_calculation "
+            f"FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00')"
+        )
+        month = add_months(month, 1)
+
+
+def partition_calculation(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return
+        cursor.execute("SELECT min(created_at) FROM nutrition_calculation")
+        first = cursor.fetchone()[0]
+        cursor.execute(CREATE_PARTITIONED)
+        this_month = month_start(timezone.now())
+        create_monthly_partitions(cursor, month_start(first) if first else this_month, add_months(this_month, 3))
+        cursor.execute(COPY_AND_SWAP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0004_calculation_user_and_history_indexes'),
+        ('users', '0006_customuser_birth_date_customuser_created_at_and_more'),
+    ]
+
+    operations = [
+        # The reverse is a no-op: a partitioned table is schema-compatible
+        # with the model, and re-applying is skipped once partitioned.
+        migrations.RunPython(partition_calculation, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Drug names are matched unstemmed ('simple'), the free text in English.
+CREATE_TRIGGER = """
+CREATE FUNCTION nutrition_drug_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.drug_effect, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.nutritional_implications, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER nutrition_drug_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, drug_effect, nutritional_implications
+ON nutrition_drug FOR EACH ROW EXECUTE FUNCTION nutrition_drug_search_vector_update();
+
+UPDATE nutrition_drug SET name = name;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS nutrition_drug_search_vector_trigger ON nutrition_drug;
+DROP FUNCTION IF EXISTS nutrition_drug_search_vector_update();
+"""
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0005_partition_calculation'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='drug',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+        migrations.AddIndex(
+            model_name='drug',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='drug_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='drug',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='drug_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,146 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:48
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# A frozen copy of the rules in nutrition.extraction, so this migration
+# keeps producing the same flags when the live rules change. Re-extract
+# with ``manage.py extract_drug_flags`` after changing them.
+
+NUTRIENT, FOOD, ADMINISTRATION = "nutrient", "food", "administration"
+
+# tag -> (words matched case-insensitively, abbreviations matched as written)
+NUTRIENTS = {
+    "potassium": (["potassium"], ["K"]),
+    "sodium": (["sodium", "salt"], ["Na"]),
+    "magnesium": (["magnesium"], ["Mg"]),
+    "calcium": (["calcium"], ["Ca"]),
+    "zinc": (["zinc"], ["Zn"]),
+    "iron": (["iron"], ["Fe"]),
+    "copper": (["copper"], ["Cu"]),
+    "phosphorus": (["phosphorus", "phosphate"], []),
+    "folate": (["folate", "folic acid"], []),
+    "vitamin_a": (["vitamin a"], []),
+    "vitamin_b6": (["vitamin b6", "pyridoxine"], []),
+    "vitamin_b12": (["vitamin b12", "cobalamin"], []),
+    "niacin": (["niacin", "vitamin b3"], []),
+    "vitamin_c": (["vitamin c"], []),
+    "vitamin_d": (["vitamin d"], []),
+    "vitamin_e": (["vitamin e"], []),
+    "vitamin_k": (["vitamin k"], []),
+    "glucose": (["hypoglycemia", "hyperglycemia", "blood sugar"], []),
+    "lipids": (["cholesterol", "triglycerides", "lipids"], []),
+}
+
+RULES = [
+    (FOOD, "grapefruit", r"grapefruit"),
+    (FOOD, "alcohol", r"alcohol"),
+    (FOOD, "caffeine", r"caffeine"),
+    (FOOD, "tyramine", r"tyramine"),
+    (FOOD, "st_johns_wort", r"st\.? john'?s wort|\bSJW\b"),
+    (FOOD, "fish_oil", r"fish oil"),
+    (FOOD, "cranberry", r"cranberr"),
+    (FOOD, "licorice", r"licorice"),
+    (ADMINISTRATION, "take_with_food", r"take[^.;]{0,40}\bwith (?:food|a meal|meals|a full meal|a high-fat meal)"),
+    (ADMINISTRATION, "empty_stomach",
+     r"empty stomach|\d+ hours? before or \d+ hours? after (?:a )?(?:meal|food)"
+     r"|(?:\d+|an?|one|two) (?:hours?|minutes?|min) before (?:a |the first )?(?:meals?|food|eating|breakfast)"),
+    (ADMINISTRATION, "tube_feed_hold", r"hold (?:the )?tube feed|tube feed(?:ing)?s?[^.;]{0,40}\bhold"),
+    (ADMINISTRATION, "separate_from_minerals", r"\d+ hours? before or \d+ hours? after antacids|take supplements separately"),
+    (ADMINISTRATION, "hydration", r"hydration|\d+ oz (?:of )?(?:fluid|water)"),
+    (ADMINISTRATION, "probiotic", r"probiotic"),
+]
+
+
+def _nutrient_pattern(words, abbreviations):
+    parts = [rf"(?i:\b{re.escape(word)}\b)" for word in words]
+    parts += [rf"\b{re.escape(abbr)}\b" for abbr in abbreviations]
+    return re.compile("|".join(parts))
+
+
+NUTRIENT_RES = {tag: _nutrient_pattern(*names) for tag, names in NUTRIENTS.items()}
+
+# "vitamin K", "fat-soluble vitamins A, D, E, K", "vitamins B6 and B12":
+# tagged per vitamin and blanked out before the nutrient patterns run, so
+# the K is not read as potassium.
+VITAMIN_LIST_RE = re.compile(
+    r"\b(?i:vitamins?)\s+([A-K]\d{0,2}(?:\s*(?:,|/|&|\band\b|\bor\b)\s*(?:and\s+|or\s+)?[A-K]\d{0,2})*)\b"
+)
+VITAMIN_LETTER_RE = re.compile(r"[A-K]\d{0,2}")
+RULE_RES = [(kind, tag, re.compile(pattern, re.IGNORECASE)) for kind, tag, pattern in RULES]
+
+# "0.73 mEq of potassium", "125 mg Na"
+NUTRIENT_NAMES = {word: tag for tag, (words, _) in NUTRIENTS.items() for word in words}
+NUTRIENT_ABBREVIATIONS = {abbr: tag for tag, (_, abbrs) in NUTRIENTS.items() for abbr in abbrs}
+QUANTITY_RE = re.compile(
+    r"(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>mEq|mmol|mg|mcg|g)\s+(?:of\s+)?"
+    r"(?P<nutrient>" + "|".join(
+        [rf"(?i:{re.escape(word)})" for word in sorted(NUTRIENT_NAMES, key=len, reverse=True)]
+        + [re.escape(abbr) for abbr in NUTRIENT_ABBREVIATIONS]
+    ) + r")\b"
+)
+
+
+def extract(*texts):
+    """Sorted ``(kind, tag, quantity, unit)`` flags found in the given texts."""
+    text = "\n".join(t for t in texts if t)
+    flags = set()
+    quantified = set()
+    for match in QUANTITY_RE.finditer(text):
+        nutrient = match["nutrient"]
+        tag = NUTRIENT_ABBREVIATIONS.get(nutrient) or NUTRIENT_NAMES[nutrient.lower()]
+        flags.add((NUTRIENT, tag, float(match["amount"]), match["unit"]))
+        quantified.add(tag)
+    vitamins = set()
+    for match in VITAMIN_LIST_RE.finditer(text):
+        for letter in VITAMIN_LETTER_RE.findall(match[1]):
+            tag = NUTRIENT_NAMES.get(f"vitamin {letter.lower()}")
+            if tag:
+                vitamins.add(tag)
+    unlisted = VITAMIN_LIST_RE.sub(" ", text)
+    for tag, pattern in NUTRIENT_RES.items():
+        if tag not in quantified and (tag in vitamins or pattern.search(unlisted)):
+            flags.add((NUTRIENT, tag, None, ""))
+    for kind, tag, pattern in RULE_RES:
+        if pattern.search(text):
+            flags.add((kind, tag, None, ""))
+    return sorted(flags, key=lambda flag: (flag[0], flag[1], flag[2] or 0))
+
+
+def extract_flags(apps, schema_editor):
+    Drug = apps.get_model('nutrition', 'Drug')
+    DrugNutrientFlag = apps.get_model('nutrition', 'DrugNutrientFlag')
+    DrugNutrientFlag.objects.bulk_create(
+        (
+            DrugNutrientFlag(drug_id=pk, kind=kind, tag=tag, quantity=quantity, unit=unit)
+            for pk, drug_effect, implications in Drug.objects.values_list('id', 'drug_effect', 'nutritional_implications').iterator()
+            for kind, tag, quantity, unit in extract(drug_effect, implications)
+        ),
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0007_drugcatalogchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DrugNutrientFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('nutrient', 'Nutrient'), ('food', 'Food or substance'), ('administration', 'Administration')], max_length=20)),
+                ('tag', models.CharField(max_length=50)),
+                ('quantity', models.FloatField(blank=True, null=True)),
+                ('unit', models.CharField(blank=True, max_length=10)),
+                ('drug', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flags', to='nutrition.drug')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', 'drug'], name='drug_flag_tag_idx')],
+            },
+        ),
+        migrations.RunPython(extract_flags, migrations.RunPython.noop),
+    ]
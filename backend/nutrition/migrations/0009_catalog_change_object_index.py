@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0008_drugnutrientflag'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='drugcatalogchange',
+            index=models.Index(fields=['kind', 'object_id'], name='catalog_change_object_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 20:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nutrition', '0009_catalog_change_object_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='calculation',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -1,6 +1,12 @@
 from django.db import models
+from django.conf import settings
+from django.utils import timezone
 from django.contrib.postgres.fields import JSONField
-from django.utils.module_loading import import_string
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+from . import registry
+from .cache import result_cache
 
 
 class CategoryEquations(models.Model):
@@ -26,7 +32,7 @@ class Equation(models.Model):
 
     def get_function(self):
         """يحاول يجيب الفنكشن من الـ path"""
-        return import_string(self.function_path)
+        return registry.get_function(self.function_path)[0]
 
     def __str__(self):
         return f"{self.name} ({self.code})"
@@ -36,14 +42,32 @@ class Calculation(models.Model):
     """
     تخزين العمليات اللي اتعملت
     """
-    equation = models.ForeignKey(Equation, on_delete=models.CASCADE)
+    # Indexed by calc_equation_created_idx, which starts with equation_id.
+    equation = models.ForeignKey(Equation, on_delete=models.CASCADE, db_index=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, related_name='calculations', null=True, blank=True, db_index=False)
     inputs = models.JSONField()
     result = models.JSONField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the calculation is made rather than when it is written, so a
+    # row stored by the write-behind buffer keeps the time it was returned with.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        # Composite indexes backing the (created_at, id) keyset pagination,
+        # overall and per user / per equation.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='calc_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='calc_user_created_idx'),
+            models.Index(fields=['equation', '-created_at', '-id'], name='calc_equation_created_idx'),
+        ]
+
+    def compute(self):
+        """Fill in ``result`` without touching the database."""
+        entry = registry.get(self.equation_id)
+        self.result = result_cache.evaluate(entry, self.inputs)
+        return self.result
 
     def run(self):
-        func = self.equation.get_function()
-        self.result = func(**self.inputs)
+        self.compute()
         self.save()
         return self.result
 
@@ -63,12 +87,61 @@ class Drug(models.Model):
     name = models.CharField(max_length=200)
     drug_effect = models.TextField(blank=True, null=True)
     nutritional_implications = models.TextField(blank=True, null=True)
+    # Kept up to date by a database trigger on PostgreSQL (migration 0006).
+    search_vector = SearchVectorField(null=True, editable=False)
     
     class Meta:
         unique_together = ['category', 'name']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='drug_search_vector_idx'),
+            GinIndex(fields=['name'], name='drug_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.category.name})"
+
+
+class DrugNutrientFlag(models.Model):
+    """A fact extracted from a drug's text (see ``nutrition.extraction``), e.g. potassium 0.73 mEq."""
+    KIND_CHOICES = [
+        ('nutrient', 'Nutrient'),
+        ('food', 'Food or substance'),
+        ('administration', 'Administration'),
+    ]
+    drug = models.ForeignKey(Drug, on_delete=models.CASCADE, related_name='flags')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    tag = models.CharField(max_length=50)
+    quantity = models.FloatField(null=True, blank=True)
+    unit = models.CharField(max_length=10, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tag', 'drug'], name='drug_flag_tag_idx'),
+        ]
+
+    def __str__(self):
+        amount = f" {self.quantity:g} {self.unit}" if self.quantity is not None else ""
+        return f"{self.tag}{amount}"
+
+
+class DrugCatalogChange(models.Model):
+    """One saved or deleted drug or category; the newest id is the catalog version."""
+    KIND_CHOICES = [
+        ('drug', 'Drug'),
+        ('category', 'Drug category'),
+    ]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id'], name='catalog_change_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"v{self.id} {self.kind} {self.object_id}{' (deleted)' if self.deleted else ''}"
     
 
 
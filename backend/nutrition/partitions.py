@@ -0,0 +1,163 @@
+"""
+Monthly range partitions of ``nutrition_calculation`` (PostgreSQL only).
+
+The table is partitioned on ``created_at`` by migration 0005. A DEFAULT
+partition catches rows that fall outside every monthly partition, so an
+insert never fails. ``manage.py calculation_partitions`` keeps partitions
+created ahead of time and archives old ones.
+"""
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+
+TABLE = "nutrition_calculation"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_RE = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name):
+    match = PARTITION_RE.match(name)
+    if not match:
+        return None
+    try:
+        return datetime.date(int(match.group(1)), int(match.group(2)), 1)
+    except ValueError:  # "..._y2025m13" is no month's partition
+        return None
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+    row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def list_partitions(cursor):
+    """Names of the monthly partitions currently attached, oldest first."""
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        """,
+        [TABLE],
+    )
+    names = [row[0] for row in cursor.fetchall() if partition_month(row[0])]
+    return sorted(names, key=partition_month)
+
+
+def create_partition(cursor, month):
+    """Create the partition for ``month`` unless it exists.
+
+    Rows that already landed in the DEFAULT partition for that month are
+    moved into the new partition, otherwise PostgreSQL refuses to create it.
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+        f"WHERE created_at >= %s AND created_at < %s)",
+        [start, end],
+    )
+    if cursor.fetchone()[0]:
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00')"
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+    else:
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00')"
+        )
+    return True
+
+
+def ensure_partitions(cursor, first_month, last_month):
+    """Create every monthly partition from ``first_month`` to ``last_month``."""
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        if create_partition(cursor, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def _json(value):
+    # Django hands jsonb columns back as text on raw cursors.
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def archive_partition(connection, name, directory):
+    """Write the rows of partition ``name`` to gzipped JSONL, then drop it.
+
+    Returns ``(path, row_count)``. The file is written under a temporary
+    name and renamed only once it is complete and synced to disk, so the
+    partition is never dropped without a finished archive. ``created_at``
+    is the time the calculation was made (``default=timezone.now`` since
+    migration 0010), and the write-behind buffer holds rows for seconds,
+    so a month that is over takes no new rows and nothing is lost between
+    the dump and the drop. Rows inserted with an explicit older
+    ``created_at`` would be; nothing in the app does that.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.jsonl.gz")
+    tmp_path = f"{path}.part"
+
+    count = 0
+    with open(tmp_path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz, io.TextIOWrapper(gz, encoding="utf-8") as out:
+            with connection.chunked_cursor() as cursor:
+                cursor.execute(
+                    f"SELECT id, equation_id, user_id, inputs, result, created_at "
+                    f"FROM {name} ORDER BY created_at, id"
+                )
+                while True:
+                    rows = cursor.fetchmany(2000)
+                    if not rows:
+                        break
+                    for pk, equation_id, user_id, inputs, result, created_at in rows:
+                        out.write(json.dumps({
+                            "id": pk,
+                            "equation_id": equation_id,
+                            "user_id": user_id,
+                            "inputs": _json(inputs),
+                            "result": _json(result),
+                            "created_at": created_at.isoformat(),
+                        }) + "\n")
+                        count += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {name}")
+    return path, count
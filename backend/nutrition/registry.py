@@ -0,0 +1,286 @@
+"""
+Process-wide registry of the equations seeded by the ``equations`` command.
+
+The callables in ``nutrition.utils`` are resolved once when the app starts,
+and the ``Equation`` rows are loaded on first use. After that a calculation
+finds its function with a single dict lookup instead of going through
+``import_string``. Saving or deleting an ``Equation`` row (see
+``nutrition.signals``) stores a new version stamp in the shared cache; every
+process compares its table with that stamp at most every
+``VERSION_CHECK_INTERVAL`` seconds and rebuilds it when the stamp moved.
+"""
+import hashlib
+import inspect
+import logging
+import sys
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import schemas, utils
+from .vectorized import KERNELS
+
+logger = logging.getLogger(__name__)
+
+# What a bad set of inputs can raise from an equation; reported to the
+# caller instead of surfacing as a 500. ArithmeticError covers division by
+# zero and overflow (e.g. ``math.exp`` of a huge value).
+EVALUATION_ERRORS = (TypeError, ValueError, AttributeError, KeyError, ArithmeticError)
+
+VERSION_KEY = "nutrition:equations:version"
+VERSION_CHECK_INTERVAL = 2
+
+# Unit of the headline value each function returns. Functions that return
+# several quantities with different units are mapped to None.
+UNITS = {
+    "bmi": "kg/m^2",
+    "ibw_hamwi": "kg",
+    "ibw_lemmens": "kg",
+    "percent_ibw": "%",
+    "adjusted_body_weight": "kg",
+    "dry_weight": "kg",
+    "ibw_amputation": "kg",
+    "waist_height_ratio": "ratio",
+    "percent_ubw": "%",
+    "percent_weight_change": "%",
+    "ibw_spinal_cord_injury": "kg",
+    "demi_span_height": "cm",
+    "knee_height_estimate": "cm",
+    "harris_benedict": "kcal/day",
+    "mifflin_st_jeor": "kcal/day",
+    "total_energy_expenditure": "kcal/day",
+    "penn_state": "kcal/day",
+    "cunningham": "kcal/day",
+    "baseline_fluid_bsa": "mL/day",
+    "baseline_fluid_standard": "mL/day",
+    "insulin_to_carb_ratio": "g_carbs_per_1U",
+    "insulin_sensitivity": "mg/dL_drop_per_1U",
+    "insulin_initial_dose": "U",
+    "free_water_deficit": "L",
+    "nitrogen_balance": "gN/day",
+    "nutrition_risk_index": "index",
+    "total_lymphocyte_count": "cells/uL",
+    "growth_velocity": None,
+    "quick_method": "kcal/day",
+    "macronutrient_distribution": "g",
+    "rda_calories": "kcal/day",
+    "rda_protein": "g/day",
+    "schofield_bmr": "kcal/day",
+    "catchup_growth": "kcal/kg/day",
+    "gestation_adjusted_age": "months",
+    "preterm_estimated_requirement": None,
+    "ireton_jones_ventilator": "kcal/day",
+    "ireton_jones_spontaneous": "kcal/day",
+    "curreri_burn": "kcal/day",
+    "pregnancy_energy_needs": "kcal/day",
+    "pregnancy_simple_addition": "kcal/day",
+    "lactation_energy_needs": "kcal/day",
+    "down_syndrome_calorie": "kcal/day",
+    "cerebral_palsy_calorie": "kcal/day",
+    "prader_willi_calorie": "kcal/day",
+    "prognostic_nutrition_index": "index",
+    "prognostic_inflammatory_nutrition_index": "index",
+}
+
+
+class RegisteredEquation:
+    """An ``Equation`` row together with its resolved function."""
+
+    __slots__ = (
+        "id", "code", "name", "function_path", "func", "signature", "unit", "kernel", "version", "schema",
+    )
+
+    def __init__(self, id, code, name, function_path, func, signature, unit, kernel=None, version="",
+                 schema=None):
+        self.id = id
+        self.code = code
+        self.name = name
+        self.function_path = function_path
+        self.func = func
+        self.signature = signature
+        self.unit = unit
+        # Array-in/array-out counterpart from nutrition.vectorized, if any.
+        self.kernel = kernel
+        # Changes whenever the source of the function's module changes, so
+        # cached results never outlive the code that produced them.
+        self.version = version
+        # Compiled inputs contract, see nutrition.schemas.
+        self.schema = schema or schemas.get_schema(function_path, func, signature)
+
+    @property
+    def parameters(self):
+        return list(self.signature.parameters)
+
+    def validate(self, inputs):
+        return self.schema.validate(inputs)
+
+    def __call__(self, **inputs):
+        return self.func(**inputs)
+
+    def __repr__(self):
+        return f"<RegisteredEquation {self.code} -> {self.function_path}>"
+
+
+_lock = threading.Lock()
+_functions = {}
+_versions = {}
+_tables = None
+# Shared stamp the tables were built for, and when it was last compared.
+_stamp = None
+_checked_at = 0.0
+# Ids and codes looked up in vain since the last build.
+_misses = set()
+
+
+def load_functions():
+    """Resolve every public function defined in ``nutrition.utils``."""
+    for name, obj in vars(utils).items():
+        if name.startswith("_") or not inspect.isfunction(obj):
+            continue
+        if obj.__module__ != utils.__name__:
+            continue
+        _functions[f"{utils.__name__}.{name}"] = (obj, inspect.signature(obj))
+
+
+def registered_functions():
+    """``{function_path: (func, signature)}`` of every resolved function."""
+    return dict(_functions)
+
+
+def get_function(function_path):
+    """Return ``(func, signature)`` for a dotted path, importing it only once."""
+    try:
+        return _functions[function_path]
+    except KeyError:
+        func = import_string(function_path)
+        resolved = _functions[function_path] = (func, inspect.signature(func))
+        return resolved
+
+
+def get_version(func):
+    """Short content hash of the module that defines ``func``."""
+    module = func.__module__
+    try:
+        return _versions[module]
+    except KeyError:
+        try:
+            source = inspect.getsource(sys.modules[module])
+        except (OSError, TypeError, KeyError):
+            source = module
+        version = _versions[module] = hashlib.sha1(source.encode()).hexdigest()[:12]
+        return version
+
+
+def _build():
+    from .models import Equation
+
+    by_id, by_code = {}, {}
+    rows = Equation.objects.values_list("id", "code", "name", "function_path")
+    for pk, code, name, function_path in rows:
+        try:
+            func, signature = get_function(function_path)
+        except (ImportError, AttributeError, TypeError, ValueError):
+            # One broken row must not take every other equation down with it.
+            logger.exception("Skipping equation %s (%s): cannot load %s", pk, code, function_path)
+            continue
+        func_name = function_path.rsplit(".", 1)[-1]
+        entry = RegisteredEquation(
+            pk, code, name, function_path, func, signature,
+            UNITS.get(func_name), KERNELS.get(func_name), get_version(func),
+        )
+        by_id[pk] = entry
+        by_code[code] = entry
+    return by_id, by_code
+
+
+def _shared_stamp():
+    try:
+        stamp = cache.get(VERSION_KEY)
+        if stamp is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            stamp = cache.get(VERSION_KEY)
+        return stamp
+    except Exception:
+        logger.warning("Shared equation version unavailable", exc_info=True)
+        return _stamp
+
+
+def _loaded(force_check=False):
+    global _tables, _stamp, _checked_at
+    tables = _tables
+    if tables is not None and not force_check and time.monotonic() - _checked_at < VERSION_CHECK_INTERVAL:
+        return tables
+    with _lock:
+        stamp = _shared_stamp()
+        _checked_at = time.monotonic()
+        if _tables is None or stamp != _stamp:
+            _tables = _build()
+            _stamp = stamp
+            _misses.clear()
+        return _tables
+
+
+def _lookup(index, key):
+    tables = _loaded()
+    try:
+        return tables[index][key]
+    except KeyError:
+        if (index, key) in _misses:
+            raise
+    # The row may have been added by another process since we loaded;
+    # reload only if the shared stamp says so, and remember the miss.
+    tables = _loaded(force_check=True)
+    try:
+        return tables[index][key]
+    except KeyError:
+        _misses.add((index, key))
+        raise
+
+
+def get(equation_id):
+    """Look up a registered equation by primary key."""
+    return _lookup(0, equation_id)
+
+
+def get_by_code(code):
+    """Look up a registered equation by its ``code``."""
+    return _lookup(1, code)
+
+
+def get_many(equation_ids):
+    """Look up several equations at once; unknown ids are left out."""
+    found = {}
+    for pk in equation_ids:
+        try:
+            found[pk] = get(pk)
+        except KeyError:
+            pass
+    return found
+
+
+def all_equations():
+    return list(_loaded()[0].values())
+
+
+def invalidate():
+    """Forget this process's rows; the next lookup rebuilds them."""
+    global _tables
+    with _lock:
+        _tables = None
+
+
+def changed():
+    """Make every process rebuild its table, once the current transaction commits."""
+    def bump():
+        try:
+            cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        except Exception:
+            logger.warning("Shared equation version unavailable", exc_info=True)
+        invalidate()
+
+    invalidate()
+    transaction.on_commit(bump)
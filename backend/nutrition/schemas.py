@@ -0,0 +1,249 @@
+"""
+Input schemas for the equations in ``nutrition.utils``.
+
+A schema is compiled once per function from its signature: annotated
+parameters take their type from the hint, unannotated ones from
+``PARAMETER_TYPES`` (by name), defaulting to a number. ``DECLARED`` adds
+what a signature cannot express, such as the accepted values of a string
+option. A compiled schema validates and coerces an ``inputs`` payload
+before the function is called, and renders itself as JSON Schema for the
+API docs.
+"""
+import inspect
+import math
+import typing
+
+from drf_spectacular.extensions import OpenApiSerializerFieldExtension
+
+NUMBER = "number"
+INTEGER = "integer"
+STRING = "string"
+BOOLEAN = "boolean"
+
+HINT_TYPES = {float: NUMBER, int: INTEGER, str: STRING, bool: BOOLEAN}
+
+# Unannotated parameters that are not numbers.
+PARAMETER_TYPES = {
+    "gender": STRING,
+    "physical_activity": STRING,
+    "stress_factor": STRING,
+    "trauma": STRING,
+    "burn": STRING,
+    "trimester": STRING,
+    "lactation_period": STRING,
+    "goal": STRING,
+    "preterm": BOOLEAN,
+    "has_il_6": BOOLEAN,
+}
+
+# Per-function declarations, merged over what the signature gives.
+DECLARED = {
+    "dry_weight": {
+        "edema_or_ascites": {"choices": [
+            "ascites_minimal", "ascites_moderate", "ascites_severe",
+            "edema_minimal", "edema_moderate", "edema_severe",
+        ]},
+    },
+    "ireton_jones_ventilator": {
+        "trauma": {"choices": ["present", "absent"]},
+        "burn": {"choices": ["present", "absent"]},
+    },
+    "pregnancy_energy_needs": {
+        "trimester": {"choices": ["first", "second", "third"]},
+        "physical_activity": {"choices": ["inactive", "low_active", "active", "very_active"]},
+    },
+    "pregnancy_simple_addition": {
+        "trimester": {"choices": ["first", "second", "third"]},
+    },
+    "lactation_energy_needs": {
+        "lactation_period": {"choices": ["first_6_months", "second_6_months"]},
+    },
+    "cerebral_palsy_calorie": {
+        "physical_activity": {"choices": [
+            "mild_to_moderate", "severe_physical_restriction",
+            "severe_restricted_activity", "athetoid_cerebral_palsy",
+        ]},
+    },
+    "prader_willi_calorie": {
+        "goal": {"choices": ["weight_maintenance", "weight_loss"]},
+    },
+}
+
+
+def _number(value):
+    if isinstance(value, bool):
+        raise ValueError("A valid number is required.")
+    if isinstance(value, str):
+        value = float(value.strip())
+    elif not isinstance(value, (int, float)):
+        raise ValueError("A valid number is required.")
+    if not math.isfinite(value):
+        raise ValueError("A finite number is required.")
+    return value
+
+
+def _integer(value):
+    value = _number(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError("A valid integer is required.")
+        value = int(value)
+    return value
+
+
+def _string(value):
+    if not isinstance(value, str):
+        raise ValueError("Not a valid string.")
+    return value
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ValueError("Must be a valid boolean.")
+
+
+COERCERS = {NUMBER: _number, INTEGER: _integer, STRING: _string, BOOLEAN: _boolean}
+
+
+class InputField:
+    __slots__ = ("name", "type", "required", "nullable", "default", "choices", "coerce")
+
+    def __init__(self, name, type, required=True, nullable=False, default=None, choices=None):
+        self.name = name
+        self.type = type
+        self.required = required
+        self.nullable = nullable
+        self.default = default
+        self.choices = choices
+        self.coerce = COERCERS[type]
+
+    def clean(self, value):
+        if value is None:
+            if self.nullable:
+                return None
+            raise ValueError("This field may not be null.")
+        try:
+            value = self.coerce(value)
+        except (TypeError, ValueError) as e:
+            # float("abc") and friends have messages meant for developers.
+            message = str(e) if str(e).endswith(".") else f"A valid {self.type} is required."
+            raise ValueError(message)
+        if self.choices:
+            # Stored and cached as the canonical choice, whatever the case sent.
+            value = value.lower()
+            if value not in self.choices:
+                raise ValueError(f"Must be one of: {', '.join(self.choices)}.")
+        return value
+
+    def json_schema(self):
+        schema = {"type": self.type}
+        if self.choices:
+            schema["enum"] = list(self.choices)
+        if self.nullable:
+            schema["nullable"] = True
+        if not self.required and self.default is not None:
+            schema["default"] = self.default
+        return schema
+
+
+class InputSchema:
+    """The compiled inputs contract of one equation function."""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = {field.name: field for field in fields}
+
+    def validate(self, inputs):
+        """Return coerced ``inputs`` or raise ``ValueError`` with a dict of errors."""
+        if not isinstance(inputs, dict):
+            raise ValueError({"non_field_errors": ["Expected an object of inputs."]})
+        errors, cleaned = {}, {}
+        for key in inputs.keys() - self.fields.keys():
+            errors[key] = ["Unexpected input."]
+        for name, field in self.fields.items():
+            if name not in inputs:
+                if field.required:
+                    errors[name] = ["This field is required."]
+                continue
+            try:
+                cleaned[name] = field.clean(inputs[name])
+            except ValueError as e:
+                errors[name] = [str(e)]
+        if errors:
+            raise ValueError(errors)
+        return cleaned
+
+    def json_schema(self):
+        return {
+            "title": self.name,
+            "type": "object",
+            "properties": {name: field.json_schema() for name, field in self.fields.items()},
+            "required": [name for name, field in self.fields.items() if field.required],
+            "additionalProperties": False,
+        }
+
+
+def _hint_type(annotation):
+    """Schema type and nullability of a type hint, or ``(None, False)``."""
+    nullable = False
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        nullable = len(args) < len(typing.get_args(annotation))
+        annotation = args[0] if len(args) == 1 else None
+    return HINT_TYPES.get(annotation), nullable
+
+
+def compile_schema(func, signature=None):
+    signature = signature or inspect.signature(func)
+    declared = DECLARED.get(func.__name__, {})
+    fields = []
+    for param in signature.parameters.values():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        type_, nullable = _hint_type(param.annotation)
+        if type_ is None:
+            type_ = PARAMETER_TYPES.get(param.name, NUMBER)
+        required = param.default is param.empty
+        options = {
+            "type": type_,
+            "required": required,
+            "nullable": nullable or (not required and param.default is None),
+            "default": None if required else param.default,
+            **declared.get(param.name, {}),
+        }
+        fields.append(InputField(param.name, **options))
+    return InputSchema(func.__name__, fields)
+
+
+_schemas = {}
+
+
+def get_schema(function_path, func, signature=None):
+    """Compiled schema for ``function_path``, compiled on first use."""
+    try:
+        return _schemas[function_path]
+    except KeyError:
+        schema = _schemas[function_path] = compile_schema(func, signature)
+        return schema
+
+
+class EquationInputsFieldExtension(OpenApiSerializerFieldExtension):
+    """Documents ``inputs`` as one of the compiled equation schemas."""
+    target_class = "nutrition.serializers.EquationInputsField"
+
+    def map_serializer_field(self, auto_schema, direction):
+        from . import registry
+
+        variants = [
+            get_schema(path, func, signature).json_schema()
+            for path, (func, signature) in sorted(registry.registered_functions().items())
+        ]
+        return {
+            "type": "object",
+            "description": "Keyword arguments of the equation's function; "
+                           "see the equation's input_schema.",
+            "oneOf": variants,
+        }
@@ -0,0 +1,54 @@
+"""
+Ranked, typo-tolerant search over the drug catalog.
+
+On PostgreSQL a drug matches when its ``search_vector`` (name, effect and
+nutritional implications, weighted in that order) matches the query words
+as prefixes, or when the query is trigram-similar to a word of its name, so
+"cipro" finds ciprofloxacin and "augmentn" still finds Augmentin. Both
+conditions are served by GIN indexes (see migration 0006). Other databases
+fall back to ``icontains``.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+from .models import Drug
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def prefix_query(term):
+    """``to_tsquery`` text matching every word of ``term`` as a prefix."""
+    words = WORD_RE.findall(term.lower())
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def search_drugs(term, limit=20):
+    term = term.strip()
+    queryset = Drug.objects.select_related("category").defer("search_vector")
+    if not term:
+        return queryset.none()
+
+    if connection.vendor != "postgresql":
+        return queryset.filter(
+            Q(name__icontains=term)
+            | Q(drug_effect__icontains=term)
+            | Q(nutritional_implications__icontains=term)
+        ).annotate(score=Value(0.0)).order_by("name")[:limit]
+
+    query = SearchQuery(term, config="english")
+    prefixes = prefix_query(term)
+    if prefixes:
+        query |= SearchQuery(prefixes, config="simple", search_type="raw")
+    return (
+        queryset
+        .filter(Q(search_vector=query) | Q(name__trigram_word_similar=term))
+        .annotate(score=Greatest(
+            SearchRank(F("search_vector"), query),
+            TrigramWordSimilarity(term, "name"),
+        ))
+        .order_by("-score", "name")[:limit]
+    )
@@ -1,11 +1,31 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from .models import *
+from . import registry, schemas
+from .writer import calculation_writer
 
 
 class EquationSerializer(serializers.ModelSerializer):
+    input_schema = serializers.SerializerMethodField()
+
     class Meta:
         model = Equation
-        fields = ["id", "name", "code", "function_path", "description"]
+        fields = ["id", "name", "code", "function_path", "description", "input_schema"]
+
+    def validate_function_path(self, value):
+        if value not in registry.registered_functions():
+            raise serializers.ValidationError("Must name a function defined in nutrition.utils.")
+        return value
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_input_schema(self, obj):
+        """JSON Schema of the inputs the equation accepts."""
+        try:
+            func, signature = registry.get_function(obj.function_path)
+        except ImportError:
+            return None
+        return schemas.get_schema(obj.function_path, func, signature).json_schema()
 
 class CategoryEquationSerializer(serializers.ModelSerializer):
     equations = EquationSerializer(many=True, read_only=True)
@@ -15,31 +35,118 @@ class CategoryEquationSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'equations']
 
 
+class EquationInputsField(serializers.JSONField):
+    """
+    Keyword arguments for the equation. A plain JSONField with its own class
+    so ``schemas.EquationInputsFieldExtension`` can document it as the
+    compiled input schemas; the inputs are checked against the equation's
+    schema in ``CalculationSerializer.validate``.
+    """
+
+
 class CalculationSerializer(serializers.ModelSerializer):
+    inputs = EquationInputsField()
     result = serializers.JSONField(read_only=True)
 
     class Meta:
         model = Calculation
         fields = ["id", "equation", "inputs", "result", "created_at"]
 
+    def validate(self, attrs):
+        equation = attrs.get("equation", getattr(self.instance, "equation", None))
+        inputs = attrs.get("inputs", getattr(self.instance, "inputs", None))
+        try:
+            entry = registry.get(equation.id)
+        except KeyError:
+            # Deleted, or not yet seen by this process's registry.
+            raise serializers.ValidationError({"equation": ["This equation is not available."]})
+        try:
+            attrs["inputs"] = entry.validate(inputs)
+        except ValueError as e:
+            raise serializers.ValidationError({"inputs": e.args[0]})
+        return attrs
+
     def create(self, validated_data):
-        calc = Calculation.objects.create(**validated_data)
-        calc.run()  # يشغّل المعادلة أوتوماتيك
+        # Compute first; a failing equation writes nothing. The row is then
+        # stored now or by the write-behind buffer, see nutrition.writer.
+        calc = Calculation(**validated_data)
+        try:
+            calc.compute()  # يشغّل المعادلة أوتوماتيك
+        except registry.EVALUATION_ERRORS as e:
+            raise serializers.ValidationError({"inputs": [str(e)]})
+        calculation_writer.save(calc)
         return calc
 
 
-class DrugSerializer(serializers.ModelSerializer):
+class CalculationBatchItemSerializer(serializers.Serializer):
+    equation = serializers.IntegerField()
+    inputs = serializers.DictField()
+
+
+class CalculationBatchSerializer(serializers.Serializer):
+    items = CalculationBatchItemSerializer(many=True, allow_empty=False, max_length=1000)
+
+
+class SparseFieldsMixin:
+    """Drops every field not named in the ``fields`` constructor argument."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class DrugSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Drug
         fields = ['id', 'name', 'drug_effect', 'nutritional_implications']
 
 
+class DrugNutrientFlagSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DrugNutrientFlag
+        fields = ['kind', 'tag', 'quantity', 'unit']
+
+
+class DrugDetailSerializer(DrugSerializer):
+    flags = DrugNutrientFlagSerializer(many=True, read_only=True)
+
+    class Meta(DrugSerializer.Meta):
+        fields = DrugSerializer.Meta.fields + ['flags']
+
+
+class DrugListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Flat drug row; ``category`` is the category id."""
+    class Meta:
+        model = Drug
+        fields = ['id', 'name', 'category', 'drug_effect', 'nutritional_implications']
+
+
+class DrugSearchSerializer(serializers.ModelSerializer):
+    category = serializers.SerializerMethodField()
+    score = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Drug
+        fields = ['id', 'name', 'category', 'drug_effect', 'nutritional_implications', 'score']
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_category(self, obj):
+        return {'id': obj.category_id, 'name': obj.category.name}
+
+
 class DrugCategorySerializer(serializers.ModelSerializer):
     drugs = DrugSerializer(many=True, read_only=True)
     class Meta:
         model = DrugCategory
         fields = ['id', 'name','drugs']
 
+    def __init__(self, *args, drug_fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if drug_fields is not None:
+            self.fields['drugs'] = DrugSerializer(many=True, read_only=True, fields=drug_fields)
+
 
 
 
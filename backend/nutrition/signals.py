@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog, extraction, registry
+from .autocomplete import drug_index
+from .detail_cache import drug_detail_cache
+from .interactions import alias_index
+from .models import Drug, DrugCategory, Equation
+
+
+@receiver(post_save, sender=Equation)
+@receiver(post_delete, sender=Equation)
+def invalidate_equation_registry(sender, **kwargs):
+    registry.changed()
+
+
+@receiver(post_save, sender=Drug)
+@receiver(post_delete, sender=Drug)
+def invalidate_drug_index(sender, **kwargs):
+    drug_index.invalidate()
+    alias_index.invalidate()
+
+
+@receiver(post_save, sender=Drug)
+def extract_drug_flags(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {"drug_effect", "nutritional_implications"} & set(update_fields):
+        extraction.refresh_flags([instance])
+
+
+@receiver(post_save, sender=Drug)
+@receiver(post_delete, sender=Drug)
+def invalidate_drug_detail(sender, instance, **kwargs):
+    drug_detail_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=DrugCategory)
+@receiver(post_delete, sender=DrugCategory)
+def invalidate_category_drug_details(sender, instance, **kwargs):
+    # Deleting a category deletes (and so invalidates) its drugs first.
+    if kwargs["signal"] is post_save:
+        drug_detail_cache.invalidate(instance.drugs.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Drug)
+@receiver(post_delete, sender=Drug)
+def record_drug_change(sender, instance, **kwargs):
+    catalog.record_change("drug", instance.pk, deleted=kwargs["signal"] is post_delete)
+
+
+@receiver(post_save, sender=DrugCategory)
+@receiver(post_delete, sender=DrugCategory)
+def record_category_change(sender, instance, **kwargs):
+    catalog.record_change("category", instance.pk, deleted=kwargs["signal"] is post_delete)
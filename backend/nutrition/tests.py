@@ -1,3 +1,825 @@
-from django.test import TestCase
+import gzip
+import io
+import itertools
+import json
+import math
+import time
+from datetime import date, datetime, timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from clients.models import Client
+
+from . import assessment, benchmarks, catalog, extraction, partitions, registry, schemas, search, utils, vectorized
+from .autocomplete import drug_index
+from .cache import result_cache
+from .importer import import_drugs
+from .interactions import alias_index, screen
+from .writer import CalculationWriter
+from .detail_cache import drug_detail_cache
+from .models import Calculation, Drug, DrugCatalogChange, DrugCategory, DrugNutrientFlag, Equation
+
+
+class RegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.invalidate()
+        self.equation = Equation.objects.create(name="BMI", code="bmi", function_path="nutrition.utils.bmi")
+
+    def tearDown(self):
+        registry.invalidate()
+
+    def expire_check(self):
+        registry._checked_at = 0.0
+
+    def test_save_moves_the_shared_stamp_for_other_processes(self):
+        self.assertEqual(registry.get(self.equation.id).function_path, "nutrition.utils.bmi")
+        stamp = cache.get(registry.VERSION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.equation.function_path = "nutrition.utils.ibw_hamwi"
+            self.equation.save()
+        self.assertNotEqual(cache.get(registry.VERSION_KEY), stamp)
+        self.assertEqual(registry.get(self.equation.id).function_path, "nutrition.utils.ibw_hamwi")
+
+    def test_table_is_rebuilt_when_another_process_moves_the_stamp(self):
+        registry.get(self.equation.id)
+        # Another process edits the row: no signal here, only the stamp.
+        Equation.objects.filter(id=self.equation.id).update(function_path="nutrition.utils.ibw_hamwi")
+        cache.set(registry.VERSION_KEY, "moved", None)
+
+        self.assertEqual(registry.get(self.equation.id).function_path, "nutrition.utils.bmi")
+        self.expire_check()
+        self.assertEqual(registry.get(self.equation.id).function_path, "nutrition.utils.ibw_hamwi")
+
+    def test_unknown_ids_are_not_reloaded_on_every_lookup(self):
+        registry.get(self.equation.id)
+        with self.assertRaises(KeyError):
+            registry.get(10 ** 6)
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                with self.assertRaises(KeyError):
+                    registry.get(10 ** 6)
+        self.assertEqual(registry.get_many({self.equation.id, 10 ** 6}).keys(), {self.equation.id})
+
+
+class BrokenEquationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.invalidate()
+        self.good = Equation.objects.create(name="BMI", code="bmi", function_path="nutrition.utils.bmi")
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create(email="dietitian@example.com"))
+
+    def tearDown(self):
+        registry.invalidate()
+
+    def test_an_unimportable_row_is_skipped_and_the_rest_still_work(self):
+        # Written before function_path was validated, or straight to the table.
+        bad = Equation.objects.create(name="Gone", code="gone", function_path="nutrition.nowhere.gone")
+        with self.assertLogs("nutrition.registry", "ERROR"):
+            self.assertEqual([entry.code for entry in registry.all_equations()], ["bmi"])
+
+        inputs = {"weight_kg": 70, "height_m": 1.75}
+        response = self.api.post("/api/nutritions/calculations/", {"equation": self.good.id, "inputs": inputs}, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        response = self.api.post("/api/nutritions/calculations/", {"equation": bad.id, "inputs": inputs}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("equation", response.data)
+
+    def test_function_path_must_name_a_utils_function(self):
+        for path in ["nutrition.nowhere.gone", "os.system", "nutrition.utils._private", "bmi"]:
+            response = self.api.post("/api/nutritions/equations/", {"name": "X", "code": "x", "function_path": path})
+            self.assertEqual(response.status_code, 400, path)
+            self.assertIn("function_path", response.data)
+        response = self.api.post("/api/nutritions/equations/", {"name": "IBW", "code": "ibw", "function_path": "nutrition.utils.ibw_hamwi"})
+        self.assertEqual(response.status_code, 201, response.data)
+
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        result_cache.clear()
+        registry.invalidate()
+
+    def test_repointed_equation_does_not_serve_the_old_results(self):
+        equation = Equation.objects.create(name="IBW", code="ibw", function_path="nutrition.utils.ibw_hamwi")
+        inputs = {"gender": "female", "height_cm": 165}
+        before = registry.get(equation.id)
+        self.assertEqual(result_cache.evaluate(before, inputs)["unit"], "kg")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            equation.function_path = "nutrition.utils.ibw_lemmens"
+            equation.save()
+        after = registry.get(equation.id)
+        # Same code, same module version, same inputs: only the path differs.
+        self.assertEqual((after.code, after.version), (before.code, before.version))
+        self.assertNotEqual(result_cache.key(after, inputs), result_cache.key(before, inputs))
+
+
+class CalculationBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.invalidate()
+        self.equation = Equation.objects.create(name="BMI", code="bmi", function_path="nutrition.utils.bmi")
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create(email="dietitian@example.com"))
+
+    def batch(self, *items):
+        return self.api.post("/api/nutritions/calculations/batch/", {"items": list(items)}, format="json")
+
+    def test_status_reflects_how_many_items_were_created(self):
+        good = {"equation": self.equation.id, "inputs": {"weight_kg": 70, "height_m": 1.75}}
+        bad = {"equation": self.equation.id, "inputs": {}}
+        unknown = {"equation": 10 ** 6, "inputs": {}}
+
+        self.assertEqual(self.batch(good, good).status_code, 201)
+        response = self.batch(good, bad)
+        self.assertEqual(response.status_code, 207)
+        self.assertIn("error", response.data["results"][1])
+        self.assertEqual(self.batch(bad, unknown).status_code, 400)
+
+
+class VectorizedParityTests(SimpleTestCase):
+    """
+    Each kernel gives, row for row, what the scalar function returns: text
+    exactly, rounded numbers to within one unit of the last kept digit
+    (``np.round`` and ``round`` part ways near ties, see ``vectorized._round``).
+    """
+    GRIDS = [
+        ("bmi", {"weight_kg": [0, 0.5, 45, 70.3, 130], "height_m": [-1.6, 0, 1.234, 1.75, 2.05]}),
+        ("bmi", {"weight_lb": [0, 154.3, 300], "height_in": [0, 60, 71.5]}),
+        ("ibw_hamwi", {"gender": ["female", "Male", "x"], "height_cm": [-5, 0, 140, 152.4, 175.3, 201]}),
+        ("harris_benedict", {
+            "gender": ["female", "male", "other"], "weight_kg": [3, 70, 88.8],
+            "height_cm": [50, 172.5], "age": [0, 34, 81.5],
+        }),
+        ("mifflin_st_jeor", {
+            "gender": ["Female", "male", "other"], "weight_kg": [3, 70, 88.8],
+            "height_cm": [50, 172.5], "age": [0, 34, 81.5],
+        }),
+        ("schofield_bmr", {
+            "age": [1, 3, 7, 10, 12, 13, 16, 18, 40], "gender": ["male", "female"],
+            "weight_kg": [10, 62.5], "height_cm": [80, 165.2],
+            "physical_activity": [None, "sedentary", "unknown"], "stress_factor": [None, "major_surgery"],
+        }),
+        ("baseline_fluid_bsa", {"weight_kg": [0.5, 4.99, 5, 7.3, 10, 10.01, 20, 33.3, 40, 77.7]}),
+        ("nutrition_risk_index", {
+            "albumin_g_dl": [2.1, 3.5, 4.4], "weight_kg": [40, 70, 95.5],
+            "gender": ["female", "male"], "height_cm": [-1, 150, 170.2, 190],
+        }),
+    ]
+
+    def assertRejected(self, row):
+        values = row.values() if isinstance(row, dict) else [row]
+        for value in values:
+            self.assertTrue(value == "" or (isinstance(value, float) and math.isnan(value)), row)
+
+    def test_kernels_match_the_scalar_functions(self):
+        for name, grid in self.GRIDS:
+            rows = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+            columns = {key: [row[key] for row in rows] for key in grid}
+            out = vectorized.KERNELS[name](**columns)
+            for i, row in enumerate(rows):
+                if isinstance(out, dict):
+                    got = {key: value if key == "unit" else value.tolist()[i] for key, value in out.items()}
+                else:
+                    got = out.tolist()[i]
+                with self.subTest(equation=name, **row):
+                    try:
+                        expected = getattr(utils, name)(**row)
+                    except (ValueError, TypeError):
+                        if isinstance(got, dict):
+                            got.pop("unit")
+                        self.assertRejected(got)
+                    else:
+                        self.assertMatches(got, expected)
+
+    def assertMatches(self, got, expected):
+        if isinstance(expected, dict):
+            self.assertEqual(got.keys(), expected.keys())
+            for key in expected:
+                self.assertMatches(got[key], expected[key])
+        elif isinstance(expected, float):
+            digits = max(len(repr(value).partition(".")[2]) for value in (got, expected))
+            self.assertTrue(np.isclose(got, expected, rtol=0, atol=10 ** -digits * (1 + 1e-9)), (got, expected))
+        else:
+            self.assertEqual(got, expected)
+
+
+class BenchmarkTests(SimpleTestCase):
+    def test_summarize(self):
+        stats = benchmarks.summarize([4000, 1000, 3000, 2000], ops=8)
+        self.assertEqual(stats, {"ops_per_sec": 8e5, "p50_us": 3.0, "p99_us": 4.0, "samples": 4})
+        self.assertEqual(benchmarks.summarize([0], ops=1)["ops_per_sec"], 1e9)
+
+    def test_compare_flags_drops_beyond_the_threshold(self):
+        baseline = {
+            "bmi": {"scalar": {"ops_per_sec": 1000.0}, "vectorized": {"ops_per_sec": 1000.0}},
+            "ibw_hamwi": {"scalar": {"ops_per_sec": 1000.0}},
+        }
+        results = {
+            "bmi": {"scalar": {"ops_per_sec": 749.0}, "vectorized": {"ops_per_sec": 750.0}},
+            "ibw_hamwi": {"scalar": {"ops_per_sec": 5000.0}},
+        }
+        self.assertEqual(benchmarks.compare(results, baseline, 0.25), [("bmi", "scalar", 1000.0, 749.0)])
+        self.assertEqual(benchmarks.compare(results, baseline, 0.5), [])
+
+    def test_compare_skips_paths_it_cannot_compare(self):
+        baseline = {
+            "bmi": {"scalar": {"ops_per_sec": 0}, "api_create": {"ops_per_sec": 1000.0}},
+            "ibw_hamwi": {"batch": {"ops_per_sec": 1000.0}},
+        }
+        results = {
+            "bmi": {
+                "scalar": {"ops_per_sec": 1.0},
+                "vectorized": {"ops_per_sec": 1.0},
+                "api_create": {"ops_per_sec": 1.0, "mode": "durable"},
+            },
+            "new_equation": {"scalar": {"ops_per_sec": 1.0}},
+        }
+        self.assertEqual(benchmarks.compare(results, baseline, 0.25), [])
+
+    def test_failed_batch_raises_command_error(self):
+        entry = mock.Mock(id=1, code="bmi")
+        client = mock.Mock()
+        client.post.return_value = mock.Mock(status_code=400, content=b'{"items": ["bad"]}')
+        with self.assertRaisesMessage(CommandError, "bmi: batch endpoint returned 400"):
+            benchmarks.bench_batch(client, entry, [{"weight_kg": 70}], repeat=1)
+
+        client.post.return_value = mock.Mock(status_code=207)
+        self.assertEqual(benchmarks.bench_batch(client, entry, [{"weight_kg": 70}], repeat=2)["samples"], 2)
+
+
+class CalculationHistoryTests(TestCase):
+    def test_unowned_calculations_are_staff_only(self):
+        equation = Equation.objects.create(name="BMI", code="bmi", function_path="nutrition.utils.bmi")
+        User = get_user_model()
+        user = User.objects.create(email="dietitian@example.com")
+        staff = User.objects.create(email="staff@example.com", is_staff=True)
+        mine = Calculation.objects.create(equation=equation, user=user, inputs={})
+        legacy = Calculation.objects.create(equation=equation, inputs={})
+
+        api = APIClient()
+        for who, expected in [(user, [mine.id]), (staff, [legacy.id, mine.id])]:
+            api.force_authenticate(who)
+            response = api.get("/api/nutritions/calculations/")
+            self.assertEqual([row["id"] for row in response.data["results"]], expected)
+
+
+BUFFERED = {"DURABLE": False, "BATCH_SIZE": 2, "FLUSH_INTERVAL": 60, "MAX_PENDING": 3}
+
+
+class CalculationWriterTests(TestCase):
+    def setUp(self):
+        self.equation = Equation.objects.create(name="BMI", code="bmi", function_path="nutrition.utils.bmi")
+        self.writer = CalculationWriter()
+        # No background thread: these tests flush by hand.
+        self.writer._thread = mock.Mock(is_alive=lambda: True)
+
+    def calculation(self, **fields):
+        return Calculation(**{"equation": self.equation, "inputs": {}, **fields})
+
+    def test_durable_by_default(self):
+        self.assertTrue(self.writer.save(self.calculation()))
+        self.assertEqual((Calculation.objects.count(), self.writer.pending), (1, 0))
+
+    @override_settings(NUTRITION_CALCULATION_WRITER=BUFFERED)
+    def test_buffered_rows_keep_the_time_they_were_made(self):
+        made_at = timezone.now() - timedelta(minutes=5)
+        self.assertFalse(self.writer.save(self.calculation(created_at=made_at)))
+        self.assertEqual(Calculation.objects.count(), 0)
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual(Calculation.objects.get().created_at, made_at)
+
+    @override_settings(NUTRITION_CALCULATION_WRITER=BUFFERED)
+    def test_connection_errors_are_retried_and_a_full_buffer_saves_in_the_request(self):
+        for _ in range(3):
+            self.writer.save(self.calculation())
+        with mock.patch.object(Calculation.objects, "bulk_create", side_effect=OperationalError), \
+                self.assertLogs("nutrition.writer", "ERROR"):
+            self.assertEqual(self.writer.flush(), 0)
+        self.assertEqual((self.writer.pending, self.writer.dropped), (3, 0))
+
+        self.assertTrue(self.writer.save(self.calculation()))
+        self.assertEqual(Calculation.objects.count(), 1)
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(Calculation.objects.count(), 4)
+
+    @override_settings(NUTRITION_CALCULATION_WRITER=BUFFERED)
+    def test_rows_that_can_never_be_stored_are_logged_and_dropped(self):
+        self.writer.save(self.calculation())
+        self.writer.save(self.calculation(inputs=None))
+        with self.assertLogs("nutrition.writer", "ERROR") as logs:
+            self.assertEqual(self.writer.flush(), 1)
+        self.assertEqual((Calculation.objects.count(), self.writer.pending, self.writer.dropped), (1, 0, 1))
+        self.assertTrue(any("Dropped calculation: equation=%d" % self.equation.id in line for line in logs.output))
+
+    @override_settings(NUTRITION_CALCULATION_WRITER=BUFFERED)
+    def test_requeue_beyond_the_cap_logs_each_dropped_row(self):
+        self.writer.save(self.calculation())
+        with self.assertLogs("nutrition.writer", "ERROR") as logs:
+            self.writer._requeue([self.calculation(), self.calculation(), self.calculation()], 3)
+        self.assertEqual((self.writer.pending, self.writer.dropped), (3, 1))
+        self.assertEqual(sum("Dropped calculation" in line for line in logs.output), 1)
+
+    @override_settings(NUTRITION_CALCULATION_WRITER=BUFFERED)
+    def test_cache_stats_reports_the_writer(self):
+        self.writer.save(self.calculation())
+        api = APIClient()
+        api.force_authenticate(get_user_model().objects.create(email="admin@example.com", is_staff=True))
+        with mock.patch("nutrition.views.calculation_writer", self.writer):
+            response = api.get("/api/nutritions/calculations/cache-stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hit_ratio", response.data)
+        self.assertEqual(response.data["writer"], {"durable": False, "pending": 1, "written": 0, "dropped": 0})
+
+        self.writer.flush()
+        self.assertEqual(self.writer.stats(), {"durable": False, "pending": 0, "written": 1, "dropped": 0})
+
+
+class CalculationWriterThreadTests(TransactionTestCase):
+    @override_settings(NUTRITION_CALCULATION_WRITER={**BUFFERED, "FLUSH_INTERVAL": 0.05})
+    def test_background_thread_flushes_the_buffer(self):
+        equation = Equation.objects.create(name="BMI", code="bmi", function_path="nutrition.utils.bmi")
+        writer = CalculationWriter()
+        writer.save(Calculation(equation=equation, inputs={}))
+        deadline = time.monotonic() + 5
+        while writer.written < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual((writer.written, writer.pending, Calculation.objects.count()), (1, 0, 1))
+
+
+class DrugNameIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = DrugCategory.objects.create(name="Antidiabetics")
+        Drug.objects.create(category=self.category, name="Metformin (Glucophage)")
+
+    def tearDown(self):
+        drug_index.invalidate()
+
+    def test_import_in_another_process_reaches_the_index(self):
+        self.assertEqual([name for _, name in drug_index.search("glu")], ["Metformin (Glucophage)"])
+        # What a separate import command leaves behind: rows and a change, no signal here.
+        drug = Drug.objects.bulk_create([Drug(category=self.category, name="Glimepiride (Amaryl)")])[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            catalog.record_change("drug", drug.pk)
+
+        self.assertEqual(len(drug_index.search("gl")), 1)
+        drug_index._checked_at = 0.0
+        self.assertEqual(len(drug_index.search("gl")), 2)
+
+    def test_every_match_of_a_short_prefix_is_ranked(self):
+        # 600 word-start matches sort before the one name-start match.
+        Drug.objects.bulk_create([Drug(category=self.category, name=f"Zinc mea{i:03}") for i in range(600)])
+        Drug.objects.create(category=self.category, name="Metoprolol")
+        matches = drug_index.search("me", limit=3)
+        self.assertEqual([name for _, name in matches], ["Metoprolol", "Metformin (Glucophage)", "Zinc mea000"])
+        self.assertEqual(len(drug_index.search("me", limit=1000)), 602)
+        self.assertEqual(drug_index.search("mez"), [])
+
+
+class DrugScreeningTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = DrugCategory.objects.create(name="Antibiotics")
+        self.augmentin = Drug.objects.create(
+            category=category, name="Amoxicillin/Clavulanic acid (Augmentin)",
+            nutritional_implications="Take with food.",
+        )
+        self.amoxicillin = Drug.objects.create(category=category, name="Amoxicillin")
+
+    def tearDown(self):
+        alias_index.invalidate()
+
+    def test_free_text_names_are_matched_and_implications_grouped_per_drug(self):
+        report = screen({
+            "a": [(1, "Augmentin 625mg tab", "bid"), (2, "amoxicillin 500 mg caps", None)],
+            "b": [(3, "clavulanic acid", None), (4, "vitamin C", None), (5, None, None)],
+            "c": [],
+        })
+        a, b, c = report["a"], report["b"], report["c"]
+        self.assertEqual(
+            [(m["matched_alias"], [d["id"] for d in m["drugs"]]) for m in a["medications"]],
+            [("augmentin", [self.augmentin.id]), ("amoxicillin", [self.amoxicillin.id])],
+        )
+        self.assertEqual(
+            [(i["drug"], i["medications"]) for i in a["implications"]],
+            [(self.augmentin.name, [1]), ("Amoxicillin", [2])],
+        )
+        # A combination component is a weaker match, used when nothing exact is.
+        self.assertEqual(b["medications"][0]["drugs"], [{"id": self.augmentin.id, "name": self.augmentin.name}])
+        self.assertEqual(b["unmatched"], ["vitamin C", None])
+        self.assertEqual(c, {"medications": [], "unmatched": [], "implications": []})
+
+    def test_screening_costs_one_query_once_the_index_is_built(self):
+        screen({"a": [(1, "augmentin", None)]})
+        with self.assertNumQueries(1):
+            screen({"a": [(1, "augmentin", None)], "b": [(2, "amoxicillin", None)]})
+
+    def test_index_follows_catalog_changes_from_other_processes(self):
+        self.assertEqual(alias_index.resolve("Flagyl")[1], frozenset())
+        drug = Drug.objects.bulk_create([Drug(category=self.augmentin.category, name="Metronidazole (Flagyl)")])[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            catalog.record_change("drug", drug.pk)
+        alias_index._checked_at = 0.0
+        self.assertEqual(alias_index.resolve("Flagyl")[1], frozenset({drug.pk}))
+
+
+class DrugImportTests(TestCase):
+    ROWS = [
+        ("Antidiabetics", "Metformin (Glucophage)", "Lowers glucose", "Take with meals."),
+        ("Antidiabetics", "Glimepiride (Amaryl)", "", ""),
+    ]
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        drug_index.invalidate()
+
+    def test_import_moves_the_catalog_version_the_indexes_follow(self):
+        self.assertEqual(drug_index.search("gl"), [])
+        version = catalog.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            import_drugs(self.ROWS, dry_run=True)
+        self.assertEqual(catalog.current_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = import_drugs(self.ROWS)
+        self.assertEqual((counts["inserted"], counts["categories_created"]), (2, 1))
+        self.assertGreater(catalog.current_version(), version)
+        drug_index._checked_at = 0.0
+        self.assertEqual(len(drug_index.search("gl")), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = import_drugs(self.ROWS)
+        self.assertEqual((counts["inserted"], counts["unchanged"]), (0, 2))
+
+
+class DrugCatalogTests(TestCase):
+    URL = "/api/nutritions/drugs/catalog/"
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create(email="dietitian@example.com"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = DrugCategory.objects.create(name="Antidiabetics")
+            self.metformin = Drug.objects.create(category=self.category, name="Metformin")
+            self.insulin = Drug.objects.create(category=self.category, name="Insulin")
+
+    def get(self, **params):
+        headers = {"HTTP_" + key.upper().replace("-", "_"): value for key, value in params.pop("headers", {}).items()}
+        return self.api.get(self.URL, params, **headers)
+
+    def test_snapshot_is_versioned_compressed_and_cached(self):
+        response = self.get(headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        version = int(response["X-Catalog-Version"])
+        self.assertEqual(response["ETag"], f'W/"catalog-{version}"')
+        body = json.loads(gzip.decompress(response.content))
+        self.assertEqual(body["version"], version)
+        self.assertEqual([d["name"] for d in body["categories"][0]["drugs"]], ["Metformin", "Insulin"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(json.loads(self.get().content), body)
+
+    def test_matching_etag_is_not_modified_until_the_catalog_changes(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(headers={"If-None-Match": etag}).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.insulin.name = "Insulin glargine"
+            self.insulin.save()
+        response = self.get(headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_since_version_returns_only_the_changes(self):
+        version, deleted_id = catalog.current_version(), self.metformin.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.insulin.name = "Insulin glargine"
+            self.insulin.save()
+            self.metformin.delete()
+        response = self.get(since_version=version)
+        latest = int(response["X-Catalog-Version"])
+        self.assertEqual(response["ETag"], f'W/"catalog-{version}-{latest}"')
+        body = json.loads(response.content)
+        self.assertEqual((body["since_version"], body["version"]), (version, latest))
+        self.assertEqual([d["name"] for d in body["drugs"]], ["Insulin glargine"])
+        self.assertEqual(body["deleted"], {"categories": [], "drugs": [deleted_id]})
+        self.assertEqual(self.get(since_version=version, headers={"If-None-Match": response["ETag"]}).status_code, 304)
+
+        up_to_date = json.loads(self.get(since_version=latest).content)
+        self.assertEqual((up_to_date["drugs"], up_to_date["deleted"]), ([], {"categories": [], "drugs": []}))
+
+    def test_since_version_must_be_a_known_version(self):
+        for value in ("abc", "-1", str(catalog.current_version() + 1)):
+            self.assertEqual(self.get(since_version=value).status_code, 400, value)
+
+
+class DrugListTests(TestCase):
+    URL = "/api/nutritions/drugs/"
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create(email="dietitian@example.com"))
+        self.category = DrugCategory.objects.create(name="Antidiabetics")
+        self.metformin = Drug.objects.create(
+            category=self.category, name="Metformin", drug_effect="Lowers glucose", nutritional_implications="B12",
+        )
+
+    def get(self, **params):
+        response = self.api.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_default_listing_is_paginated_categories_with_nested_drugs(self):
+        body = self.get()
+        self.assertEqual(set(body), {"count", "next", "previous", "results"})
+        self.assertEqual((body["count"], body["next"], body["previous"]), (1, None, None))
+        self.assertEqual(body["results"], [{
+            "id": self.category.id,
+            "name": "Antidiabetics",
+            "drugs": [{
+                "id": self.metformin.id,
+                "name": "Metformin",
+                "drug_effect": "Lowers glucose",
+                "nutritional_implications": "B12",
+            }],
+        }])
+
+    def test_page_size_is_honoured(self):
+        DrugCategory.objects.create(name="Diuretics")
+        body = self.get(page_size=1)
+        self.assertEqual((body["count"], len(body["results"])), (2, 1))
+        self.assertIsNotNone(body["next"])
+
+    def test_fields_narrows_the_nested_drugs(self):
+        body = self.get(fields="id,name")
+        self.assertEqual(body["results"][0]["drugs"], [{"id": self.metformin.id, "name": "Metformin"}])
+
+    def test_flat_listing_returns_drugs(self):
+        body = self.get(flat="true")
+        self.assertEqual(body["count"], 1)
+        self.assertEqual(body["results"], [{
+            "id": self.metformin.id,
+            "name": "Metformin",
+            "category": self.category.id,
+            "drug_effect": "Lowers glucose",
+            "nutritional_implications": "B12",
+        }])
+
+        body = self.get(flat="true", fields="id,name,category")
+        self.assertEqual(body["results"], [{"id": self.metformin.id, "name": "Metformin", "category": self.category.id}])
+
+    def test_unknown_field_is_rejected(self):
+        for params in ({"fields": "bogus"}, {"fields": "id,category"}, {"flat": "true", "fields": "id,bogus"}):
+            response = self.api.get(self.URL, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("fields", response.json())
+
+
+class DrugSearchTests(TestCase):
+    URL = "/api/nutritions/drugs/search/"
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create(email="dietitian@example.com"))
+        self.antibiotics = DrugCategory.objects.create(name="Antibiotics")
+        self.cipro = Drug.objects.create(category=self.antibiotics, name="Ciprofloxacin")
+        self.augmentin = Drug.objects.create(
+            category=self.antibiotics, name="Augmentin", nutritional_implications="Take with food",
+        )
+        Drug.objects.create(category=self.antibiotics, name="Doxycycline")
+
+    def test_prefix_query(self):
+        self.assertEqual(search.prefix_query("Cipro  500-mg"), "cipro:* & 500:* & mg:*")
+        self.assertEqual(search.prefix_query(" -- "), "")
+
+    def test_fallback_matches_any_text_field_by_icontains(self):
+        self.assertEqual(connection.vendor, "sqlite")
+        self.assertEqual(list(search.search_drugs("CIPRO")), [self.cipro])
+        self.assertEqual(list(search.search_drugs("food")), [self.augmentin])
+        self.assertEqual([d.name for d in search.search_drugs("in")], ["Augmentin", "Ciprofloxacin", "Doxycycline"])
+        self.assertEqual([d.name for d in search.search_drugs("in", limit=2)], ["Augmentin", "Ciprofloxacin"])
+        self.assertEqual(list(search.search_drugs("   ")), [])
+
+    def test_endpoint_returns_hits_with_category_and_score(self):
+        response = self.api.get(self.URL, {"q": "cipro"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{
+            "id": self.cipro.id,
+            "name": "Ciprofloxacin",
+            "category": {"id": self.antibiotics.id, "name": "Antibiotics"},
+            "drug_effect": None,
+            "nutritional_implications": None,
+            "score": 0.0,
+        }])
+        self.assertEqual(len(self.api.get(self.URL, {"q": "in", "limit": "x"}).json()), 3)
+        self.assertEqual(len(self.api.get(self.URL, {"q": "in", "limit": 0}).json()), 1)
+
+    def test_category_filters_do_not_repeat_a_category(self):
+        for drug in Drug.objects.all():
+            DrugNutrientFlag.objects.create(drug=drug, kind="nutrient", tag="potassium")
+        for params in ({"drug_name": "in"}, {"flag": "potassium"}):
+            body = self.api.get("/api/nutritions/drugs/", params).json()
+            self.assertEqual([c["name"] for c in body["results"]], ["Antibiotics"], params)
+            self.assertEqual(body["count"], 1, params)
+
+    def test_migration_trigger_only_runs_on_postgresql(self):
+        migration = import_module("nutrition.migrations.0006_drug_search")
+        for vendor, calls in (("sqlite", []), ("postgresql", [mock.call(migration.CREATE_TRIGGER)])):
+            editor = mock.Mock(connection=mock.Mock(vendor=vendor))
+            migration.create_trigger(None, editor)
+            self.assertEqual(editor.execute.call_args_list, calls, vendor)
+        editor = mock.Mock(connection=mock.Mock(vendor="postgresql"))
+        migration.drop_trigger(None, editor)
+        editor.execute.assert_called_once_with(migration.DROP_TRIGGER)
+
+
+class ExtractionTests(SimpleTestCase):
+    def tags(self, text):
+        return {tag for kind, tag, quantity, unit in extraction.extract(text)}
+
+    def test_vitamin_letters_are_not_read_as_minerals(self):
+        self.assertEqual(self.tags("Deficiency of fat-soluble vitamins A, D, E, K may occur."),
+                         {"vitamin_a", "vitamin_d", "vitamin_e", "vitamin_k"})
+        self.assertEqual(self.tags("Vitamin K antagonist; binds Mg, Ca."), {"vitamin_k", "magnesium", "calcium"})
+        self.assertEqual(self.tags("vitamins B6 and B12"), {"vitamin_b6", "vitamin_b12"})
+        self.assertEqual(self.tags("Monitor serum K and Na."), {"potassium", "sodium"})
+
+    def test_quantities_are_kept(self):
+        self.assertEqual(extraction.extract("Contains 0.73 mEq of potassium and 100 mcg vitamin K"), [
+            ("nutrient", "potassium", 0.73, "mEq"),
+            ("nutrient", "vitamin_k", 100.0, "mcg"),
+        ])
+
+    def test_timing_before_meals_means_an_empty_stomach(self):
+        for text in ["Take at least 1 hour before meals.", "Take 30 minutes before breakfast",
+                     "on an empty stomach", "1 hour before or 2 hours after a meal"]:
+            self.assertIn("empty_stomach", self.tags(text), text)
+        self.assertEqual(self.tags("2 hours before or 4 hours after antacids"), {"separate_from_minerals"})
+
+
+class ExtractDrugFlagsCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        drug_detail_cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create(email="dietitian@example.com"))
+        category = DrugCategory.objects.create(name="Diuretics")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drug = Drug.objects.create(category=category, name="Furosemide", nutritional_implications="Monitor K.")
+            self.other = Drug.objects.create(category=category, name="Mannitol")
+
+    def run_command(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("extract_drug_flags", stdout=io.StringIO())
+
+    def test_changed_flags_reach_the_detail_cache_and_the_catalog_version(self):
+        # Flags written by older rules, already served and cached.
+        DrugNutrientFlag.objects.filter(drug=self.drug).delete()
+        url = f"/api/nutritions/drug-details/{self.drug.id}"
+        self.assertEqual(self.api.get(url).json()["flags"], [])
+        version = catalog.current_version()
+
+        self.run_command()
+        self.assertEqual([flag["tag"] for flag in self.api.get(url).json()["flags"]], ["potassium"])
+        # Only the drug whose flags changed is recorded.
+        version, latest = catalog.current_version(), version
+        self.assertEqual(list(DrugCatalogChange.objects.filter(id__gt=latest).values_list("object_id", flat=True)),
+                         [self.drug.id])
+
+        self.run_command()
+        self.assertEqual(catalog.current_version(), version)
+
+
+class AssessmentPanelTests(TestCase):
+    INPUTS = {
+        "gender": "female", "age": 40, "weight_kg": 70, "height_m": 1.65, "albumin_g_dl": 3.5,
+        "physical_factor": 1.2, "stress_factor": 1.0,
+    }
+
+    def test_nodes_run_after_their_dependencies_once_each(self):
+        calls = []
+        nodes = [
+            assessment.Node("c", lambda a, b: calls.append("c") or a + b, ["a", "b"]),
+            assessment.Node("b", lambda a: calls.append("b") or a * 10, ["a"]),
+            assessment.Node("a", lambda x: calls.append("a") or x + 1, ["x"]),
+        ]
+        results = assessment.evaluate(nodes, {"x": 1})
+        self.assertEqual(calls, ["a", "b", "c"])
+        # Reported in the order the nodes were given.
+        self.assertEqual(list(results.items()), [("c", 22), ("b", 20), ("a", 2)])
+
+    def test_panel_shares_the_ibw(self):
+        results = assessment.evaluate(assessment.PANEL, self.INPUTS)
+        self.assertEqual(list(results), [node.name for node in assessment.PANEL])
+        ibw = results["ibw"]["value"]
+        self.assertEqual(ibw, utils.ibw_hamwi(gender="female", height_cm=165.0)["value"])
+        self.assertEqual(results["percent_ibw"], utils.percent_ibw_from_ibw(weight_kg=70, ibw=ibw))
+        self.assertFalse(any("skipped" in r or "error" in r for r in results.values() if isinstance(r, dict)))
+
+    def test_nodes_with_missing_inputs_are_skipped_with_their_dependents(self):
+        results = assessment.evaluate(assessment.PANEL, {**self.INPUTS, "gender": None, "albumin_g_dl": None})
+        self.assertEqual(results["ibw"], {"skipped": "Missing gender"})
+        self.assertEqual(results["percent_ibw"], {"skipped": "Missing ibw"})
+        self.assertEqual(results["nutrition_risk_index"], {"skipped": "Missing albumin_g_dl, ibw"})
+        self.assertEqual(results["energy"], {"skipped": "Missing bmr"})
+        self.assertIn("value", results["fluids"])
+
+    def test_endpoint_rejects_non_finite_overrides(self):
+        user = get_user_model().objects.create(email="dietitian@example.com")
+        client = Client.objects.create(user=user, name="panel", gender="female", weight=70, height=1.65)
+        api = APIClient()
+        api.force_authenticate(user)
+        url = f"/api/nutritions/assessment/{client.id}/"
+
+        response = api.get(url, {"weight_kg": "72.5"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["inputs"]["weight_kg"], 72.5)
+        # No date of birth on file.
+        self.assertEqual(response.data["results"]["bmr"], {"skipped": "Missing age"})
+        for value in ("nan", "inf", "-Infinity", "heavy"):
+            response = api.get(url, {"weight_kg": value})
+            self.assertEqual(response.status_code, 400, value)
+
+
+
+class InputSchemaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.invalidate()
+        self.bmi = Equation.objects.create(name="BMI", code="bmi", function_path="nutrition.utils.bmi")
+        self.ireton = Equation.objects.create(
+            name="Ireton-Jones", code="ireton_jones_ventilator", function_path="nutrition.utils.ireton_jones_ventilator",
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create(email="dietitian@example.com"))
+
+    def tearDown(self):
+        registry.invalidate()
+
+    def post(self, equation, inputs):
+        return self.api.post("/api/nutritions/calculations/", {"equation": equation.id, "inputs": inputs}, format="json")
+
+    def test_bad_payloads_get_field_keyed_errors_and_write_nothing(self):
+        ireton = {"age": 60, "gender": "male", "weight_kg": 80, "trauma": "present", "burn": "absent"}
+        cases = [
+            (self.bmi, {"weight_kg": 70, "height_m": 1.75, "height": 2}, "height", "Unexpected input."),
+            (self.bmi, {"weight_kg": True, "height_m": 1.75}, "weight_kg", "A valid number is required."),
+            (self.bmi, {"weight_kg": "NaN", "height_m": 1.75}, "weight_kg", "A finite number is required."),
+            (self.bmi, {"weight_kg": "heavy", "height_m": 1.75}, "weight_kg", "A valid number is required."),
+            (self.ireton, {**ireton, "burn": "maybe"}, "burn", "Must be one of: present, absent."),
+            (self.ireton, {key: value for key, value in ireton.items() if key != "age"}, "age", "This field is required."),
+        ]
+        with mock.patch("nutrition.serializers.calculation_writer") as writer:
+            for equation, inputs, field, message in cases:
+                with self.subTest(field=field, inputs=inputs):
+                    response = self.post(equation, inputs)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.data["inputs"], {field: [message]})
+        writer.save.assert_not_called()
+        self.assertEqual(Calculation.objects.count(), 0)
+
+    def test_choices_are_stored_in_canonical_case(self):
+        response = self.post(self.ireton, {"age": 60, "gender": "male", "weight_kg": 80, "trauma": "Present", "burn": "ABSENT"})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data["inputs"]["trauma"], response.data["inputs"]["burn"]), ("present", "absent"))
+
+    def test_compiled_schema_types(self):
+        schema = schemas.compile_schema(utils.bmi)
+        self.assertEqual(schema.json_schema()["required"], [])
+        self.assertEqual(schema.validate({"weight_kg": "70", "height_m": 1.75}), {"weight_kg": 70.0, "height_m": 1.75})
+        with self.assertRaises(ValueError) as raised:
+            schema.validate({"weight_kg": float("inf")})
+        self.assertEqual(raised.exception.args[0], {"weight_kg": ["A finite number is required."]})
+
+
+class PartitionNamingTests(SimpleTestCase):
+    def test_months_wrap_across_years(self):
+        self.assertEqual(partitions.month_start(datetime(2025, 3, 31, 23, 59)), date(2025, 3, 1))
+        self.assertEqual(partitions.add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(partitions.add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+        self.assertEqual(partitions.add_months(date(2025, 1, 1), -13), date(2023, 12, 1))
+
+    def test_names_round_trip_and_others_are_ignored(self):
+        self.assertEqual(partitions.partition_name(date(2025, 7, 1)), "nutrition_calculation_y2025m07")
+        for month in (date(1999, 12, 1), date(2025, 1, 1), date(2025, 10, 1)):
+            self.assertEqual(partitions.partition_month(partitions.partition_name(month)), month)
+        for name in (partitions.DEFAULT_PARTITION, "nutrition_calculation", "nutrition_calculation_y2025m7",
+                     "other_y2025m07", "nutrition_calculation_y2025m07_old", "nutrition_calculation_y2025m13"):
+            self.assertIsNone(partitions.partition_month(name), name)
@@ -11,7 +11,11 @@ urlpatterns = [
     path("", include(router.urls)),
     
     path("drugs/", views.DrugCategoryListAPIView.as_view(), name="DrugListAPIView"),
+    path("drugs/search/", views.DrugSearchAPIView.as_view(), name="DrugSearchAPIView"),
+    path("drugs/autocomplete/", views.DrugAutocompleteAPIView.as_view(), name="DrugAutocompleteAPIView"),
+    path("drugs/catalog/", views.DrugCatalogAPIView.as_view(), name="DrugCatalogAPIView"),
     path("drug-details/<int:id>", views.DrugDetailAPIView.as_view(), name="DrugDetailAPIView"),
+    path("assessment/<int:client_id>/", views.AssessmentBundleAPIView.as_view(), name="AssessmentBundleAPIView"),
  
   
 
@@ -63,6 +63,10 @@ def ibw_lemmens(height_m: float, factor: float) -> Dict:
 
 def percent_ibw(weight_kg: float, gender: str, height_cm: float) -> Dict:
     ibw = ibw_hamwi(gender, height_cm)["value"]
+    return percent_ibw_from_ibw(weight_kg, ibw)
+
+def percent_ibw_from_ibw(weight_kg: float, ibw: float) -> Dict:
+    """percent_ibw for an IBW (kg) that was already computed."""
     pct = (weight_kg / ibw) * 100 if ibw>0 else None
     # interpretation per user table
     if pct is None:
@@ -84,6 +88,10 @@ def percent_ibw(weight_kg: float, gender: str, height_cm: float) -> Dict:
 
 def adjusted_body_weight(weight_kg: float, gender: str, height_cm: float) -> Dict:
     ibw = ibw_hamwi(gender, height_cm)["value"]
+    return adjusted_body_weight_from_ibw(weight_kg, ibw)
+
+def adjusted_body_weight_from_ibw(weight_kg: float, ibw: float) -> Dict:
+    """adjusted_body_weight for an IBW (kg) that was already computed."""
     adj = ibw + 0.4 * (weight_kg - ibw)
     return {"value": round(adj,2), "unit":"kg", "ibw_kg": ibw}
 
@@ -101,6 +109,10 @@ def dry_weight(weight_kg: float, edema_or_ascites: str) -> Dict:
 
 def ibw_amputation(gender: str, height_cm: float, percent_amputation: float) -> Dict:
     ibw = ibw_hamwi(gender, height_cm)["value"]
+    return ibw_amputation_from_ibw(ibw, percent_amputation)
+
+def ibw_amputation_from_ibw(ibw: float, percent_amputation: float) -> Dict:
+    """ibw_amputation for an IBW (kg) that was already computed."""
     val = ((100 - percent_amputation) / 100.0) * ibw
     return {"value": round(val,2), "unit":"kg", "ibw_kg": ibw, "percent_amputation": percent_amputation}
 
@@ -259,6 +271,10 @@ def nitrogen_balance(protein_intake_g:float, urine_urea_n_g:float) -> Dict:
 
 def nutrition_risk_index(albumin_g_dl:float, weight_kg:float, gender:str, height_cm:float) -> Dict:
     ibw = ibw_hamwi(gender, height_cm)["value"]
+    return nutrition_risk_index_from_ibw(albumin_g_dl, weight_kg, ibw)
+
+def nutrition_risk_index_from_ibw(albumin_g_dl:float, weight_kg:float, ibw:float) -> Dict:
+    """nutrition_risk_index for an IBW (kg) that was already computed."""
     pct_ibw = (weight_kg / ibw) * 100 if ibw>0 else 0
     nri = (1.519 * albumin_g_dl) + (41.7 * (pct_ibw/100.0))
     # interpretation
@@ -491,10 +507,15 @@ def mifflin_st_jeor(gender, weight_kg, height_cm, age):
     Mifflin-St Jeor Equation
     height_cm in cm, weight_kg in kg, age in years
     """
+    return f"{mifflin_st_jeor_kcal(gender, weight_kg, height_cm, age)} Kcal/d"
+
+
+def mifflin_st_jeor_kcal(gender, weight_kg, height_cm, age):
+    """Mifflin-St Jeor as a number of kcal/d."""
     if gender.lower() == "male":
-        return f"{(10 * weight_kg) + (6.25 * height_cm) - (5 * age) + 5} Kcal/d"
+        return (10 * weight_kg) + (6.25 * height_cm) - (5 * age) + 5
     elif gender.lower() == "female":
-        return f"{(10 * weight_kg) + (6.25 * height_cm) - (5 * age) - 161} Kcal/d"
+        return (10 * weight_kg) + (6.25 * height_cm) - (5 * age) - 161
     else:
         raise ValueError("Gender must be 'male' or 'female'.")
 
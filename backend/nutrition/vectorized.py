@@ -0,0 +1,235 @@
+"""
+Array-in/array-out counterparts of the scalar equations in ``nutrition.utils``.
+
+Every kernel accepts scalars, lists or NumPy arrays for each input (they are
+broadcast against each other) and returns what the scalar function returns,
+with an array in place of every per-row value: a dict of arrays, or a
+``TextColumn`` of strings for the equations that return text. Interpretation ladders
+are expressed as ``np.digitize``/``np.select`` lookups over threshold
+tables, so a whole column is categorised in one pass.
+
+The scalar functions stay the reference implementation. The kernels follow
+the definitions ``nutrition.utils`` actually exports (e.g. the later,
+height-in-cm ``harris_benedict``) and give the same value for every row,
+up to the last rounded digit near ties (see ``_round``); text results are
+identical. Rows a scalar function would reject come back as NaN with an
+empty interpretation, or as ``""`` for text.
+"""
+import numpy as np
+
+from .utils import ACTIVITY_FACTORS, STRESS_FACTORS
+
+
+def _floats(value):
+    return np.asarray(value, dtype=float)
+
+
+def _genders(value):
+    value = np.asarray(value, dtype=str)
+    if value.ndim == 0:
+        return np.char.lower(value)
+    # A handful of distinct spellings: lower those, not every row.
+    uniques, inverse = np.unique(value, return_inverse=True)
+    return np.char.lower(uniques)[inverse].reshape(value.shape)
+
+
+def _round(values, ndigits):
+    """
+    ``np.round``. It agrees with Python's ``round`` except for values within
+    float error of a tie (2.675 is stored as 2.67499...), where the two can
+    differ by one unit in the last kept digit, ``10 ** -ndigits``.
+    """
+    return np.round(np.asarray(values, dtype=float), ndigits)
+
+
+class TextColumn:
+    """
+    The ``f"{value}{suffix}"`` strings of a column, formatted as rows are
+    read. Turning a float into its shortest repr costs as much as the whole
+    scalar equation, so the kernel itself stays in NumPy and only the rows a
+    caller actually reads are formatted; rejected rows read as ``""``.
+    """
+
+    def __init__(self, values, suffix, valid):
+        self.values = np.where(valid, np.asarray(values, dtype=float), np.nan)
+        self.suffix = suffix
+        self.valid = np.broadcast_to(valid, self.values.shape)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return f"{self.values[index]}{self.suffix}" if self.valid[index] else ""
+
+    def tolist(self):
+        if self.values.ndim == 0:
+            return self[()]
+        suffix = self.suffix
+        return [f"{v}{suffix}" if ok else "" for v, ok in zip(self.values.tolist(), self.valid.tolist())]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.tolist(), dtype=dtype or str)
+
+
+def _labels(labels, index, valid):
+    out = np.asarray(labels)[index]
+    return np.where(valid, out, "")
+
+
+def _lookup(mapping, keys, default, fallback):
+    """Map an array of keys through ``mapping`` the way ``dict.get`` would."""
+    keys = np.asarray(keys)
+    if keys.ndim == 0:
+        key = keys.item()
+        return np.asarray(mapping.get(key, default) if key else fallback, dtype=float)
+    if keys.dtype.kind != "U":
+        # Columns holding None come in as objects; None reads as "None".
+        keys = keys.astype(str)
+    uniques, inverse = np.unique(keys, return_inverse=True)
+    values = np.array([mapping.get(k, default) if k not in ("", "None") else fallback for k in uniques])
+    return values[inverse].reshape(keys.shape)
+
+
+# ---------- Weight & Body ----------
+
+BMI_BINS = [18.5, 25, 30, 35, 40]
+BMI_LABELS = [
+    "Underweight", "Healthy weight", "Overweight",
+    "Obese class I", "Obese class II", "Obese class III",
+]
+
+
+def bmi(weight_kg=None, height_m=None, weight_lb=None, height_in=None):
+    if (weight_kg is None or height_m is None) and (weight_lb is None or height_in is None):
+        raise ValueError("Provide either (weight_kg & height_m) or (weight_lb & height_in)")
+    wk, hm, wl, hi = np.broadcast_arrays(*(
+        _floats(0.0 if column is None else column) for column in (weight_kg, height_m, weight_lb, height_in)
+    ))
+    # Per row, like the scalar function: metric when both metric inputs are
+    # non-zero, else imperial when both imperial ones are, else rejected.
+    metric = (wk != 0) & (hm != 0)
+    imperial = ~metric & (wl != 0) & (hi != 0)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        val = np.where(
+            metric,
+            np.where(hm > 0, wk / hm**2, np.nan),
+            np.where(imperial, (wl / hi**2) * 703, np.nan),
+        )
+    valid = np.isfinite(val)
+    val = np.where(valid, val, np.nan)
+    interp = _labels(BMI_LABELS, np.digitize(val, BMI_BINS), valid)
+    return {"value": _round(val, 2), "unit": "kg/m^2", "interpretation": interp}
+
+
+def _ibw_hamwi(gender, height_cm):
+    g, h = np.broadcast_arrays(_genders(gender), _floats(height_cm))
+    female = np.char.startswith(g, "f")
+    base_lb = np.where(female, 100, 106)
+    per_in = np.where(female, 5, 6)
+    extra = np.maximum(h / 2.54 - 60, 0) * per_in
+    ibw_kg = (base_lb + extra) * 0.45359237
+    return _round(np.where(h > 0, ibw_kg, np.nan), 2)
+
+
+def ibw_hamwi(gender, height_cm):
+    return {"value": _ibw_hamwi(gender, height_cm), "unit": "kg"}
+
+
+# ---------- Energy & BMR ----------
+
+def harris_benedict(gender, weight_kg, height_cm, age):
+    g, w, h, a = np.broadcast_arrays(
+        _genders(gender), _floats(weight_kg), _floats(height_cm), _floats(age)
+    )
+    val = np.select(
+        [g == "female", g == "male"],
+        [655.1 + (9.6 * w) + (1.9 * h) - (4.7 * a),
+         66.5 + (13.8 * w) + (5.0 * h) - (6.8 * a)],
+        np.nan,
+    )
+    return TextColumn(val, " Kcal/d", (g == "female") | (g == "male"))
+
+
+def mifflin_st_jeor(gender, weight_kg, height_cm, age):
+    g, w, h, a = np.broadcast_arrays(
+        _genders(gender), _floats(weight_kg), _floats(height_cm), _floats(age)
+    )
+    base = (10 * w) + (6.25 * h) - (5 * a)
+    val = np.select([g == "male", g == "female"], [base + 5, base - 161], np.nan)
+    return TextColumn(val, " Kcal/d", (g == "male") | (g == "female"))
+
+
+# Schofield coefficients per age band (<=3, <=10, <=13, <=18, >18):
+# bmr = a * weight_kg + b * height_cm + c, first row female, second male.
+SCHOFIELD_AGE_BINS = [3, 10, 13, 18]
+SCHOFIELD_COEFFICIENTS = np.array([
+    [[16.252, 10.23, -413.5], [0.167, 15.174, -617.6]],
+    [[16.969, 1.618, 371.2], [19.59, 1.303, 414.9]],
+    [[8.365, 4.65, 200], [16.25, 1.372, 515.5]],
+    [[8.365, 4.65, 200], [16.25, 1.372, 515.5]],
+    [[13.623, 2.83, 98.2], [15.057, -1.004, 705.8]],
+])
+
+
+def schofield_bmr(age, gender, weight_kg, height_cm, physical_activity=None, stress_factor=None):
+    a, g, w, h = np.broadcast_arrays(
+        _floats(age), _genders(gender), _floats(weight_kg), _floats(height_cm)
+    )
+    band = np.digitize(a, SCHOFIELD_AGE_BINS, right=True)
+    coef = SCHOFIELD_COEFFICIENTS[band, (g == "male").astype(int)]
+    bmr = coef[..., 0] * w + coef[..., 1] * h + coef[..., 2]
+    pa_factor = _lookup(ACTIVITY_FACTORS, physical_activity, 1.2, 1.2)
+    stress = _lookup(STRESS_FACTORS, stress_factor, 1.0, 1.0)
+    total = bmr * pa_factor * stress
+    return {
+        "bmr": _round(bmr, 2),
+        "total_calories": _round(total, 2),
+        "physical_activity_factor": np.broadcast_to(pa_factor, bmr.shape),
+        "stress_factor": np.broadcast_to(stress, bmr.shape),
+        "unit": "kcal/d",
+    }
+
+
+# ---------- Fluids ----------
+
+def baseline_fluid_bsa(weight_kg):
+    w = _floats(weight_kg)
+    slope = np.select([w < 5, w <= 10, w <= 20, w <= 40], [0.05, 0.04, 0.03, 0.02], 0.01)
+    offset = np.select([w < 5, w <= 10, w <= 20, w <= 40], [0.05, 0.1, 0.2, 0.4], 0.8)
+    return {"value": _round((w * slope + offset) * 1500, 1), "unit": "mL/day"}
+
+
+# ---------- Nutrition Risk ----------
+
+NRI_LABELS = ["No risk", "Mild risk", "Moderate risk", "Severe risk"]
+
+
+def nutrition_risk_index(albumin_g_dl, weight_kg, gender, height_cm):
+    alb, w = np.broadcast_arrays(_floats(albumin_g_dl), _floats(weight_kg))
+    ibw = _ibw_hamwi(gender, height_cm)
+    pct_ibw = (w / ibw) * 100
+    nri = (1.519 * alb) + (41.7 * (pct_ibw / 100.0))
+    index = np.select([nri > 100, nri >= 97.5, nri >= 83.5], [0, 1, 2], 3)
+    return {
+        "value": _round(nri, 2),
+        "unit": "index",
+        "interpretation": _labels(NRI_LABELS, index, np.isfinite(nri)),
+        "pct_ibw": _round(pct_ibw, 1),
+        "ibw_kg": ibw,
+    }
+
+
+# Kernels keyed by the name of the scalar function they mirror.
+KERNELS = {
+    "bmi": bmi,
+    "ibw_hamwi": ibw_hamwi,
+    "harris_benedict": harris_benedict,
+    "mifflin_st_jeor": mifflin_st_jeor,
+    "schofield_bmr": schofield_bmr,
+    "baseline_fluid_bsa": baseline_fluid_bsa,
+    "nutrition_risk_index": nutrition_risk_index,
+}
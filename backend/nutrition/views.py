@@ -1,12 +1,29 @@
 from django_filters import rest_framework as filters
 from rest_framework import viewsets,status,generics
+from rest_framework.decorators import action
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.authentication import TokenAuthentication
-from drf_spectacular.utils import extend_schema
-from rest_framework.permissions import IsAuthenticated
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.http import HttpResponse, HttpResponseNotModified
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from clients.models import Client
 from .models import *
-from .filters import DrugCategoryFilter
+from .filters import DrugCategoryFilter, DrugFilter, CalculationFilter
+from .pagination import DrugPagination, KeysetPagination
+from . import assessment, catalog, registry, schemas
+from .cache import result_cache
+from .detail_cache import drug_detail_cache
+from .search import search_drugs
+from .writer import calculation_writer
+from .autocomplete import drug_index
 
 from .serializers import *
 
@@ -32,29 +49,291 @@ class EquationViewSet(viewsets.ModelViewSet):
 class CalculationViewSet(viewsets.ModelViewSet):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Calculation.objects.all().order_by("-created_at")
+    queryset = Calculation.objects.all().order_by("-created_at", "-id")
     serializer_class = CalculationSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [filters.DjangoFilterBackend]
+    filterset_class = CalculationFilter
+
+    def get_queryset(self):
+        # Staff see every user's history (filterable by ?owner=), everyone
+        # else only their own. Rows without an owner (saved before
+        # calculations had one, or whose user was deleted) are staff-only:
+        # their owner cannot be told, so showing them to everyone would
+        # expose other clinicians' history.
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if response.data.get("id") is None:
+            # Computed, and queued for the write-behind buffer.
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    @extend_schema(
+        request=CalculationBatchSerializer,
+        description="Run many (equation, inputs) pairs in one request. "
+                    "Each item gets its own result or error.",
+    )
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch(self, request):
+        serializer = CalculationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["items"]
+
+        equations = registry.get_many({item["equation"] for item in items})
+        calculations, slots, results = [], [], []
+        for index, item in enumerate(items):
+            entry = equations.get(item["equation"])
+            if entry is None:
+                results.append({"index": index, "error": f"Unknown equation {item['equation']}"})
+                continue
+            try:
+                inputs = entry.validate(item["inputs"])
+            except ValueError as e:
+                results.append({"index": index, "error": e.args[0]})
+                continue
+            try:
+                result = result_cache.evaluate(entry, inputs)
+            except registry.EVALUATION_ERRORS as e:
+                results.append({"index": index, "error": str(e)})
+                continue
+            calculations.append(Calculation(
+                equation_id=entry.id, user=request.user, inputs=inputs, result=result,
+            ))
+            slots.append(len(results))
+            results.append({"index": index})
 
+        Calculation.objects.bulk_create(calculations)
+        for slot, calc in zip(slots, CalculationSerializer(calculations, many=True).data):
+            results[slot].update(calc)
+
+        # All created: 201. Some failed: 207 with the per-item errors. None
+        # created: 400, so clients that only check the status notice.
+        if not calculations:
+            code = status.HTTP_400_BAD_REQUEST
+        elif len(calculations) < len(items):
+            code = status.HTTP_207_MULTI_STATUS
+        else:
+            code = status.HTTP_201_CREATED
+        return Response({"results": results}, status=code)
+
+    @action(detail=False, methods=["get"], url_path="cache-stats", permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """
+        Hit/miss counters of this worker's equation result cache, and under
+        ``writer`` the state of its calculation writer.
+        """
+        return Response({**result_cache.stats(), "writer": calculation_writer.stats()})
+
+
+
+class AssessmentBundleAPIView(APIView):
+    """
+    IBW, %IBW, adjusted body weight, NRI, energy and fluid needs for one
+    client, evaluated as a single dependency graph.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    # Numeric inputs that may be overridden through the query string.
+    overridable = ("weight_kg", "height_m", "age", "albumin_g_dl")
+
+    def get(self, request, client_id):
+        client = get_object_or_404(Client, id=client_id, user=request.user)
+        inputs = assessment.client_inputs(client)
+        for key in self.overridable:
+            if key in request.query_params:
+                try:
+                    # Finite only: NaN and infinity cannot be rendered as JSON.
+                    inputs[key] = schemas._number(request.query_params[key])
+                except ValueError:
+                    return Response({"error": f"{key} must be a finite number"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "client": client.id,
+            "inputs": inputs,
+            "results": assessment.evaluate(assessment.PANEL, inputs),
+        })
 
 
 class DrugCategoryListAPIView(generics.ListAPIView):
+    """
+    Drug categories with their drugs, a page at a time, or with
+    ``?flat=true`` the drugs alone. ``?fields=id,name`` returns only those
+    drug fields and leaves the other columns unloaded.
+    """
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = DrugCategory.objects.prefetch_related('drugs').all()
-    serializer_class = DrugCategorySerializer
+    pagination_class = DrugPagination
     filter_backends = [filters.DjangoFilterBackend]
-    filterset_class = DrugCategoryFilter
+
+    @extend_schema(parameters=[
+        OpenApiParameter("flat", bool, description="List drugs instead of categories"),
+        OpenApiParameter("fields", str, description="Comma-separated drug fields to return, e.g. id,name"),
+    ])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @cached_property
+    def flat(self):
+        return self.request.query_params.get("flat", "").lower() in ("1", "true", "yes")
+
+    @property
+    def filterset_class(self):
+        return DrugFilter if self.flat else DrugCategoryFilter
+
+    def get_serializer_class(self):
+        return DrugListSerializer if self.flat else DrugCategorySerializer
+
+    @cached_property
+    def drug_fields(self):
+        """The requested drug fields, or ``None`` for all of them."""
+        requested = self.request.query_params.get("fields")
+        if not requested:
+            return None
+        allowed = (DrugListSerializer if self.flat else DrugSerializer).Meta.fields
+        fields = [name.strip() for name in requested.split(",") if name.strip()]
+        unknown = [name for name in fields if name not in allowed]
+        if unknown or not fields:
+            raise ValidationError({"fields": f"Choose from {', '.join(allowed)}; got {requested!r}."})
+        return fields
+
+    def get_queryset(self):
+        drugs = Drug.objects.defer("search_vector")
+        if self.drug_fields is not None:
+            # The category id is needed to attach prefetched drugs to their category.
+            drugs = Drug.objects.only(*self.drug_fields, *([] if self.flat else ["category"]))
+        if self.flat:
+            return drugs.order_by("category_id", "id")
+        return DrugCategory.objects.prefetch_related(
+            Prefetch("drugs", queryset=drugs.order_by("id"))
+        ).order_by("id")
+
+    def get_serializer(self, *args, **kwargs):
+        if self.drug_fields is not None:
+            kwargs["fields" if self.flat else "drug_fields"] = self.drug_fields
+        return super().get_serializer(*args, **kwargs)
     
 
 
 
 
+class DrugSearchAPIView(generics.ListAPIView):
+    """Ranked drug hits for ``?q=``, tolerant of prefixes and typos."""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    serializer_class = DrugSearchSerializer
+    max_limit = 100
+
+    @extend_schema(parameters=[
+        OpenApiParameter("q", str, required=True, description="Drug name or text to search for"),
+        OpenApiParameter("limit", int, description="Maximum hits (default 20, max 100)"),
+    ])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        try:
+            limit = int(self.request.query_params.get("limit", 20))
+        except ValueError:
+            limit = 20
+        limit = max(1, min(limit, self.max_limit))
+        return search_drugs(self.request.query_params.get("q", ""), limit)
+
+
+class DrugAutocompleteAPIView(APIView):
+    """Top drug names starting with ``?q=``, served from an in-memory index."""
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    max_limit = 50
+
+    @extend_schema(parameters=[
+        OpenApiParameter("q", str, required=True, description="Start of a drug or brand name"),
+        OpenApiParameter("limit", int, description="Maximum suggestions (default 10, max 50)"),
+    ])
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 10
+        limit = max(1, min(limit, self.max_limit))
+        matches = drug_index.search(request.query_params.get("q", ""), limit)
+        return Response([{"id": pk, "name": name} for pk, name in matches])
+
+
+class DrugCatalogAPIView(APIView):
+    """
+    The whole drug catalog as one versioned, pre-compressed snapshot, or
+    with ``?since_version=N`` only what changed after version N.
+    Send the ETag back in ``If-None-Match`` to get a 304 when nothing changed.
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[OpenApiParameter("since_version", int, description="Catalog version the client already has")],
+        responses={200: OpenApiTypes.OBJECT, 304: None},
+    )
+    def get(self, request):
+        version = catalog.current_version()
+        since = request.query_params.get("since_version")
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({"error": "since_version must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            if not 0 <= since <= version:
+                return Response({"error": f"since_version must be between 0 and {version}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            etag = f'W/"catalog-{since}-{version}"'
+        else:
+            etag = f'W/"catalog-{version}"'
+
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "private, no-cache",
+                   "X-Catalog-Version": str(version)}
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return HttpResponseNotModified(headers=headers)
+
+        encoded = catalog.snapshot(version) if since is None else catalog.delta(since, version)
+        encoding = catalog.choose_encoding(request.headers.get("Accept-Encoding", ""), encoded)
+        response = HttpResponse(encoded[encoding], content_type="application/json", headers=headers)
+        if encoding != "identity":
+            response["Content-Encoding"] = encoding
+        return response
+
+
 class DrugDetailAPIView(generics.RetrieveAPIView):
+    """
+    One drug monograph, rendered once and then served from the drug detail
+    cache. Honours ``If-Modified-Since``.
+    """
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Drug.objects.select_related('category').all()
-    serializer_class = DrugSerializer
+    queryset = Drug.objects.select_related('category').prefetch_related('flags').defer('search_vector')
+    serializer_class = DrugDetailSerializer
     lookup_field = 'id'
+
+    def render_drug(self):
+        drug = self.get_object()
+        body = JSONRenderer().render(self.get_serializer(drug).data)
+        return body, catalog.last_modified(drug)
+
+    def retrieve(self, request, *args, **kwargs):
+        body, last_modified = drug_detail_cache.get(kwargs[self.lookup_field], self.render_drug)
+        headers = {
+            "Cache-Control": f"private, max-age={drug_detail_cache.max_age}",
+            "Last-Modified": http_date(last_modified),
+        }
+        since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        if since is not None and last_modified <= since:
+            return HttpResponseNotModified(headers=headers)
+        return HttpResponse(body, content_type="application/json", headers=headers)
       
 
 
@@ -0,0 +1,158 @@
+"""
+Write-behind persistence of single calculations.
+
+By default (``DURABLE``) a calculation is saved in the request like any
+other row. With ``DURABLE`` off it is handed to ``calculation_writer`` and
+returned to the client straight away; a background thread inserts the
+buffered rows with one ``bulk_create`` whenever ``BATCH_SIZE`` rows are
+waiting or ``FLUSH_INTERVAL`` seconds have passed, so a request costs no
+write at all. Rows still buffered when the process dies are lost, which is
+why this is opt-in.
+
+Only connection-level failures (``OperationalError``, ``InterfaceError``)
+are retried. Any other database error means some row can never be stored
+(e.g. its equation or user was deleted): the batch is then inserted row by
+row and the rows that still fail are logged and dropped. While
+``MAX_PENDING`` rows are waiting, new calculations are saved in the
+request, so the API never acknowledges more than the buffer can hold.
+"""
+import atexit
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "DURABLE": True,
+    "BATCH_SIZE": 200,
+    "FLUSH_INTERVAL": 1.0,
+    # Rows buffered at most, including those kept for retry while the
+    # database is unavailable.
+    "MAX_PENDING": 10000,
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, "NUTRITION_CALCULATION_WRITER", {})}
+
+
+class CalculationWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = []
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def stats(self):
+        """Buffer size and counters of this worker's writer, for ``cache-stats``."""
+        durable = _config()["DURABLE"]
+        with self._lock:
+            pending, written, dropped = len(self._pending), self.written, self.dropped
+        return {"durable": durable, "pending": pending, "written": written, "dropped": dropped}
+
+    def save(self, calculation):
+        """Persist ``calculation``; returns True once it is stored."""
+        config = _config()
+        with self._lock:
+            buffered = not config["DURABLE"] and len(self._pending) < config["MAX_PENDING"]
+            if buffered:
+                self._pending.append(calculation)
+                full = len(self._pending) >= config["BATCH_SIZE"]
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._run, name="calculation-writer", daemon=True
+                    )
+                    self._thread.start()
+        if not buffered:
+            # Durable mode, or the buffer is full: store it now, and let a
+            # database error reach the client.
+            calculation.save()
+            return True
+        if full:
+            self._wakeup.set()
+        return False
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(_config()["FLUSH_INTERVAL"])
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Calculation writer flush failed")
+
+    def flush(self):
+        """Insert everything buffered so far; returns the number of rows written."""
+        from .models import Calculation
+
+        config = _config()
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                with transaction.atomic():
+                    Calculation.objects.bulk_create(batch, batch_size=config["BATCH_SIZE"])
+                written = len(batch)
+            except (OperationalError, InterfaceError):
+                logger.exception("Could not write %d buffered calculations, will retry", len(batch))
+                self._requeue(batch, config["MAX_PENDING"])
+                return 0
+            except DatabaseError:
+                logger.exception("Batch of %d calculations rejected, writing them one by one", len(batch))
+                written = self._write_each(batch)
+            with self._lock:
+                self.written += written
+            return written
+
+    def _write_each(self, batch):
+        written = 0
+        for index, calculation in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    calculation.save(force_insert=True)
+            except (OperationalError, InterfaceError):
+                logger.exception("Could not write %d buffered calculations, will retry", len(batch) - index)
+                self._requeue(batch[index:], _config()["MAX_PENDING"])
+                break
+            except DatabaseError:
+                logger.exception("Dropping calculation that cannot be stored")
+                self._drop([calculation])
+            else:
+                written += 1
+        return written
+
+    def _requeue(self, batch, max_pending):
+        with self._lock:
+            # Keep the oldest rows for the next attempt, up to the cap.
+            self._pending[:0] = batch
+            overflow = self._pending[max_pending:]
+            del self._pending[max_pending:]
+        self._drop(overflow)
+
+    def _drop(self, calculations):
+        for calculation in calculations:
+            logger.error(
+                "Dropped calculation: equation=%s user=%s created_at=%s inputs=%s result=%s",
+                calculation.equation_id, calculation.user_id, calculation.created_at.isoformat(),
+                json.dumps(calculation.inputs, default=str), json.dumps(calculation.result, default=str),
+            )
+        with self._lock:
+            self.dropped += len(calculations)
+
+
+calculation_writer = CalculationWriter()
+atexit.register(calculation_writer.flush)
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'rest_framework',
     'rest_framework.authtoken',
@@ -165,6 +166,9 @@ STATICFILES_DIRS = [
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR,'media')
 
+# Where `manage.py calculation_partitions archive` writes cold months.
+CALCULATION_ARCHIVE_DIR = os.environ.get('CALCULATION_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -260,6 +264,35 @@ CACHES = {
     }
 }
 
+# Memoized equation results (nutrition.cache): in-process LRU in front of
+# the cache alias below.
+NUTRITION_RESULT_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'MAX_SIZE': 4096,
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+# Rendered drug monographs (nutrition.detail_cache): in-process tier with a
+# short TTL in front of the cache alias below, dropped on every drug edit.
+NUTRITION_DRUG_DETAIL_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'MAX_SIZE': 1024,
+    'LOCAL_TIMEOUT': 30,
+    'TIMEOUT': 60 * 60 * 24,
+    'MAX_AGE': 300,
+}
+
+# Single calculations are saved in the request. Set
+# CALCULATION_WRITES_DURABLE=0 to hand them to the write-behind buffer
+# (nutrition.writer) instead; rows still buffered when a worker dies are lost.
+NUTRITION_CALCULATION_WRITER = {
+    'DURABLE': os.environ.get('CALCULATION_WRITES_DURABLE', '1') == '1',
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 1.0,
+}
+
 
 CHANNEL_LAYERS = {
     "default": {
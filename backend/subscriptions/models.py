@@ -209,6 +209,19 @@ class SubscriptionUsage(models.Model):
     def __str__(self):
         return f"Usage for {self.subscription.user.username} on {self.date}"
     
+    @classmethod
+    def increment(cls, user, field, amount=1):
+        """Add ``amount`` to today's ``field`` counter for the user's subscription, if any."""
+        if not amount:
+            return
+        try:
+            # One subscription per user (``UserSubscription.user`` is one-to-one).
+            subscription = UserSubscription.objects.get(user=user)
+        except UserSubscription.DoesNotExist:
+            return
+        usage, _ = cls.objects.get_or_create(subscription=subscription, date=timezone.localdate())
+        cls.objects.filter(pk=usage.pk).update(**{field: models.F(field) + amount})
+
     @property
     def meals_remaining(self):
         return max(0, self.subscription.plan.max_meals - self.meals_used)
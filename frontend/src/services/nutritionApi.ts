@@ -56,7 +56,10 @@ export const nutritionApi = {
   // Get all drug categories with their drugs - using the drugs endpoint
   getDrugCategories: async (): Promise<DrugCategory[]> => {
     try {
-      const response = await HttpClient.get('/nutritions/drugs/');
+      // Names only, every category on one page; details come from drug-details.
+      const response = await HttpClient.get('/nutritions/drugs/', {
+        params: { fields: 'id,name', page_size: 500 },
+      });
       console.log('📂 API Response for drugs (categories):', response.data);
       
       // The API returns categories with nested drugs